@@ -0,0 +1,48 @@
+#!/bin/bash
+#
+# patch_0.0.14.sh
+#
+# This patch includes the following features: 
+#
+# - Indexes on frequently accessed columns
+#
+
+# Include functions
+. ./patch_functions.sh
+
+PATCH="0.0.14"
+PATCH_DESC="Indexes"
+check_patch $PATCH
+
+# Create a temporary SQL file
+SQLTMP=$(mktemp /tmp/patch_${PATCH}_XXXXXX)
+
+#
+# Alter columns/tables
+#
+
+cat >$SQLTMP <<EOF
+-- Tokens are looked up at each API call
+create index idx_fg_token_token on fg_token(token(255));
+-- Task lists filter on user and status ordering by id
+create index idx_task_user_status on task(user,status,id);
+-- Tasks belonging to an application
+create index idx_task_app on task(app_id);
+-- Task files are looked up by their path and name (see /file endpoint)
+create index idx_task_input_file_path on task_input_file(path,file);
+create index idx_task_output_file_path on task_output_file(path,file);
+-- User group memberships are looked up by user
+create index idx_fg_user_group_user on fg_user_group(user_id);
+EOF
+asdb_file $SQLTMP
+
+out "Database changed"
+out ""
+
+# Removing SQL file
+rm -f $SQLTMP
+
+out "registering patch $PATCH"
+register_patch "$PATCH" "patch_${PATCH}.sh" "$PATCH_DESC"
+out "patch registered"
+
@@ -0,0 +1,39 @@
+#!/bin/bash
+#
+# patch_0.0.15.sh
+#
+# This patch includes the following features:
+#
+# - Application record version (application ETags)
+#
+
+# Include functions
+. ./patch_functions.sh
+
+PATCH="0.0.15"
+PATCH_DESC="Application version"
+check_patch $PATCH
+
+# Create a temporary SQL file
+SQLTMP=$(mktemp /tmp/patch_${PATCH}_XXXXXX)
+
+#
+# Alter columns/tables
+#
+
+cat >$SQLTMP <<EOF
+-- Increased each time the application record changes
+alter table application add column version int unsigned not null default 0;
+EOF
+asdb_file $SQLTMP
+
+out "Database changed"
+out ""
+
+# Removing SQL file
+rm -f $SQLTMP
+
+out "registering patch $PATCH"
+register_patch "$PATCH" "patch_${PATCH}.sh" "$PATCH_DESC"
+out "patch registered"
+
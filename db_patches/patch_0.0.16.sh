@@ -0,0 +1,47 @@
+#!/bin/bash
+#
+# patch_0.0.16.sh
+#
+# This patch includes the following features:
+#
+# - Index on token creation time used by the token sweeper
+# - Revoked signed tokens shared by every API server front-end
+#
+
+# Include functions
+. ./patch_functions.sh
+
+PATCH="0.0.16"
+PATCH_DESC="Token sweep and revocations"
+check_patch $PATCH
+
+# Create a temporary SQL file
+SQLTMP=$(mktemp /tmp/patch_${PATCH}_XXXXXX)
+
+#
+# Alter columns/tables
+#
+
+cat >$SQLTMP <<EOF
+-- Expired tokens are removed in batches by their creation time
+create index idx_fg_token_creation on fg_token(creation);
+-- Revocations are kept until tokens expiration
+create table fg_token_revoked (
+    token_id varchar(32)   not null -- signed token id (jti)
+   ,expiry   datetime      not null -- signed token expiration time
+   ,primary key(token_id)
+   ,index idx_fg_token_revoked_expiry (expiry)
+);
+EOF
+asdb_file $SQLTMP
+
+out "Database changed"
+out ""
+
+# Removing SQL file
+rm -f $SQLTMP
+
+out "registering patch $PATCH"
+register_patch "$PATCH" "patch_${PATCH}.sh" "$PATCH_DESC"
+out "patch registered"
+
@@ -21,30 +21,53 @@ from flask import Flask
 from flask import Response
 from flask import abort
 from flask import request
+from flask import send_file
 from flask_login import LoginManager
 from flask_login import login_required
 from flask_login import current_user
 from werkzeug.utils import secure_filename
-from fgapiserver_config import FGApiServerConfig
-from fgapiserverptv import FGAPIServerPTV
+from fgapiserver_config import FGApiServerConfig,\
+    get_config_snapshot,\
+    install_config_reload_handler
+from fgapiserverptv import get_ptv, get_ptv_map
 from fgapiserver_user import User
 from fgapiserver_ugr_apis import ugr_apis
-from fgapiserver_auth import authorize_user
+from fgapiserver_auth import authorize_user, bump_authz_generation
+from fgapiserver_db import begin_db_session, end_db_session
+from fgapiserver_tokensweeper import start_token_sweeper
+from fgapiserver_archive import archive_formats, archive_check,\
+    archive_stream
+from fgapiserver_uploads import upload_create, upload_info, upload_write,\
+    upload_complete, upload_delete
 from fgapiserver_tools import get_fgapiserver_db,\
                               json_bool,\
                               check_api_ver,\
                               check_db_ver,\
                               check_db_reg,\
                               update_db_config,\
+                              get_db_config,\
+                              start_db_config_poller,\
                               paginate_response,\
+                              page_bounds,\
+                              check_paging,\
+                              cursor_links,\
                               get_task_app_id,\
                               create_session_token,\
+                              is_signed_token,\
+                              signed_token_decode,\
+                              signed_token_info,\
+                              revoke_signed_token,\
                               header_links,\
+                              json_dump,\
+                              resource_etag,\
+                              etag_match,\
+                              compress_response,\
                               not_allowed_method
 import os
 import sys
 import json
 import base64
+import urllib
 import logging.config
 
 """
@@ -104,9 +127,7 @@ login_manager.init_app(app)
 @login_manager.request_loader
 def load_user(req):
     logger.debug("LoadUser: begin")
-    fgapirundir = os.path.dirname(os.path.abspath(__file__)) + '/'
-    fgapiserver_config_file = fgapirundir + 'fgapiserver.conf'
-    fg_config = FGApiServerConfig(fgapiserver_config_file)
+    fg_config = get_config_snapshot(fgapiserver_config_file)
     # Login manager could be disabled in conf file
     if fg_config['fgapisrv_notoken']:
         logger.debug("LoadUser: notoken is true")
@@ -151,9 +172,17 @@ def load_user(req):
             else:
                 auth_token = token_fields[0]
             logger.debug("LoadUser: token field is '%s'" % auth_token)
-            ptv = FGAPIServerPTV(endpoint=fg_config['fgapisrv_ptvendpoint'],
-                                 tv_user=fg_config['fgapisrv_ptvuser'],
-                                 tv_password=fg_config['fgapisrv_ptvpass'])
+            ptv = get_ptv(
+                endpoint=fg_config['fgapisrv_ptvendpoint'],
+                tv_user=fg_config['fgapisrv_ptvuser'],
+                tv_password=fg_config['fgapisrv_ptvpass'],
+                cache_ttl=fg_config['fgapisrv_ptvcachettl'],
+                negative_ttl=fg_config['fgapisrv_ptvnegttl'],
+                conn_timeout=fg_config['fgapisrv_ptvconntimeout'],
+                read_timeout=fg_config['fgapisrv_ptvreadtimeout'],
+                retries=fg_config['fgapisrv_ptvretries'],
+                breaker_failures=fg_config['fgapisrv_ptvbreaker'],
+                breaker_reset=fg_config['fgapisrv_ptvbreakerreset'])
             result = ptv.validate_token(auth_token)
             logger.debug("LoadUser: validate_token: '%s'" % result)
             # result: valid/invalid and optionally portal username and/or
@@ -221,80 +250,28 @@ def load_user(req):
                 # mapped, while if no mapping is available or portal_user and
                 # groups are  not available a default user will be used,
                 # see fgapisrv_ptvdefusr in configuration file
+                # The portal user has precedence over the portal group and
+                # the portal groups (see FGAPIServerPTVMap)
                 logger.debug("LoadUser: Mapping user")
-                mapped_userid = 0
-                mapped_username = ''
-                with open(fg_config['fgapisrv_ptvmapfile']) as ptvmap_file:
-                    ptvmap = json.load(ptvmap_file)
-                # portal_user or group must be not null
-                if portal_user != '' \
-                        or portal_group != '' \
-                        or portal_groups != []:
-                    # Scan all futuregateway users in json file
-                    for user in ptvmap:
-                        logger.debug(("LoadUser: Trying mapping "
-                                      "for FG user: '%s'" % user))
-                        # Scan the list of users and groups associated to FG
-                        # users specified in the json file
-                        for ptv_usrgrp in ptvmap[user]:
-                            # The portal_user maps a user in the list
-                            logger.debug(("LoadUser: Verifying "
-                                          "portal_user='%s' "
-                                          "matches user '%s'") %
-                                         (portal_user, ptv_usrgrp))
-                            if ptv_usrgrp == portal_user:
-                                logger.debug("LoadUser: mapped user %s <- %s"
-                                             % (user, portal_user))
-                                mapped_username = user
-                                break
-                            # The portal_group maps a group in the list
-                            logger.debug(("LoadUser: Verifying "
-                                          "portal_group='%s' "
-                                          "matches group '%s'") %
-                                         (ptv_usrgrp, portal_group))
-                            if ptv_usrgrp == portal_group:
-                                logger.debug("LoadUser: mapped group %s <- %s"
-                                             % (user, portal_group))
-                                mapped_username = user
-                                break
-                            # The portal_groups maps a group in the list
-                            logger.debug(("LoadUser: Verifying if "
-                                          "portal_groups='%s' "
-                                          "matches group '%s'") %
-                                         (portal_groups, ptv_usrgrp))
-                            group_found = ''
-                            for group in portal_groups:
-                                logger.debug("LoadUser: group '%s' ? '%s'" %
-                                             (group, ptv_usrgrp))
-                                if group == ptv_usrgrp:
-                                    group_found = group
-                                    break
-                                else:
-                                    logger.debug("  nomatch")
-                            if group_found != '':
-                                logger.debug("LoadUser: mapped group %s <- %s"
-                                             % (user, group_found))
-                                mapped_username = user
-                                break
-                        if mapped_username != '':
-                            user_info = fgapisrv_db.get_user_info_by_name(
-                                mapped_username)
-                            mapped_userid = user_info["id"]
-                            mapped_username = user_info["name"]
-                            logger.debug(
-                                "LoadUser: mapped user %s <- %s (unused)" %
-                                (mapped_userid, mapped_username))
-                            break
-                        logger.debug(("LoadUser: PTV mapped user - "
-                                      "user_rec(0): '%s',user_rec(1): '%s'")
-                                     % (mapped_userid, mapped_username))
-                        fgapisrv_db.register_token(mapped_userid,
-                                                   auth_token,
-                                                   portal_subject)
-                        logger.debug("LoadUser: '%s' - '%s'" %
-                                     (mapped_userid, mapped_username))
-                        logger.debug("LoadUser: (end)")
-                        return User(mapped_userid, mapped_username, auth_token)
+                ptvmap = get_ptv_map(fg_config['fgapisrv_ptvmapfile'])
+                mapped_username = ptvmap.map_user(portal_user,
+                                                  portal_group,
+                                                  portal_groups)
+                user_info = None
+                if mapped_username is not None:
+                    user_info = fgapisrv_db.get_user_info_by_name(
+                        mapped_username)
+                if user_info is not None:
+                    mapped_userid = user_info["id"]
+                    mapped_username = user_info["name"]
+                    logger.debug(("LoadUser: PTV mapped user - "
+                                  "user_id: '%s',user_name: '%s'")
+                                 % (mapped_userid, mapped_username))
+                    fgapisrv_db.register_token(mapped_userid,
+                                               auth_token,
+                                               portal_subject)
+                    logger.debug("LoadUser: (end)")
+                    return User(mapped_userid, mapped_username, auth_token)
                 # No portal user and group are returned or no mapping
                 # is available returning default user
                 user_info = fgapisrv_db. \
@@ -317,6 +294,19 @@ def load_user(req):
                 logger.debug("LoadUser: PTV token '%s' is not valid"
                              % auth_token)
                 return None
+        elif fg_config['fgapisrv_signedtokens'] and \
+                is_signed_token(auth_token):
+            logger.debug("LoadUser: Verifying signed token")
+            payload = signed_token_decode(auth_token)
+            if payload is None:
+                logger.debug("LoadUser: signed token '%s' is not valid"
+                             % auth_token)
+                logger.debug("LoadUser: (end)")
+                return None
+            logger.debug("LoadUser: '%s' - '%s'"
+                         % (payload['uid'], payload['name']))
+            logger.debug("LoadUser: (end)")
+            return User(payload['uid'], payload['name'], auth_token)
         else:
             logger.debug(("LoadUser: Verifying token with "
                           "baseline token management"))
@@ -429,7 +419,10 @@ def auth(apiver=fg_config['fgapiver']):
             message += "Token not created"
     if len(session_token) > 0:
         # Provide user info from session token
-        token_info = fgapisrv_db.get_token_info(session_token)
+        if is_signed_token(session_token):
+            token_info = signed_token_info(session_token)
+        else:
+            token_info = fgapisrv_db.get_token_info(session_token)
         del token_info['token']
         response = {
             "token": session_token,
@@ -445,7 +438,7 @@ def auth(apiver=fg_config['fgapiver']):
                 state = 203
     # include _links part
     response["_links"] = [{"rel": "self", "href": "/auth"}, ]
-    js = json.dumps(response, indent=fg_config['fgjson_indent'])
+    js = json_dump(response)
     resp = Response(js, status=state, mimetype='application/json')
     resp.headers['Content-type'] = 'application/json'
     header_links(request, resp, response)
@@ -485,7 +478,7 @@ def index(apiver=fg_config['fgapiver']):
                         "href": "/"},)
         }
         state = 200
-    js = json.dumps(response, indent=fg_config['fgjson_indent'])
+    js = json_dump(response)
     resp = Response(js, status=state, mimetype='application/json')
     resp.headers['Content-type'] = 'application/json'
     header_links(request, resp, response)
@@ -503,10 +496,11 @@ def redact_secrets():
 
 # token - used to extract token info
 #
-# GET - View token associated info
+# GET    - View token associated info
+# DELETE - Revoke the token
 
 
-@app.route('/<apiver>/token', methods=['GET', ])
+@app.route('/<apiver>/token', methods=['GET', 'DELETE'])
 @login_required
 def token(apiver=fg_config['fgapiver']):
     global fgapisrv_db
@@ -530,11 +524,28 @@ def token(apiver=fg_config['fgapiver']):
                         'expiry': None,
                         'valid': True,
                         'lasting': None}
+        elif is_signed_token(user_token):
+            response = signed_token_info(user_token)
         else:
             response = fgapisrv_db.get_token_info(user_token)
+    elif request.method == 'DELETE':
+        if len(user_token) == 0:
+            state = 400
+            response = {"message": "No token to revoke"}
+        elif (is_signed_token(user_token) and
+              revoke_signed_token(user_token)) or\
+                (not is_signed_token(user_token) and
+                 fgapisrv_db.revoke_session_token(user_token)):
+            state = 204
+            response = {"message": "Token successfully revoked"}
+        else:
+            state = 410
+            response = {
+                "message": ("Unable to revoke token; reason: '%s'"
+                            % fgapisrv_db.get_state()[1])}
     else:
         state, response = not_allowed_method()
-    js = json.dumps(response, indent=fg_config['fgjson_indent'])
+    js = json_dump(response)
     resp = Response(js, status=state, mimetype='application/json')
     resp.headers['Content-type'] = 'application/json'
     header_links(request, resp, response)
@@ -562,13 +573,18 @@ def tasks(apiver=fg_config['fgapiver']):
     logger.debug("user_id: '%s'" % user_id)
     page = request.values.get('page')
     per_page = request.values.get('per_page')
+    after = request.values.get('after')
     status = request.values.get('status', None)
     user = request.values.get('user', user_name)
     appid = request.values.get('application')
     response = {}
     api_support, state, message = check_api_ver(apiver)
+    paging_message = check_paging(page, per_page, after)
     if not api_support:
         response = {"message": message}
+    elif request.method == 'GET' and paging_message is not None:
+        state = 400
+        response = {"message": paging_message}
     elif request.method == 'GET':
         auth_state, auth_msg = authorize_user(
             current_user, appid, user, "task_view")
@@ -583,12 +599,13 @@ def tasks(apiver=fg_config['fgapiver']):
             # Show the whole task list
             # Before call user list check if * means ALL users or group
             # restricted users (@)
-            user_impersonate = fgapisrv_db.verify_user_role(
-                user_id, 'user_impersonate')
+            user_roles = fgapisrv_db.get_user_roles(user_id)
+            user_impersonate = fgapisrv_db.has_user_roles(
+                user_roles, 'user_impersonate')
             logger.debug("user_impersonate: '%s'" % user_impersonate)
-            group_impersonate = fgapisrv_db.same_group(
-                user_name, user) and fgapisrv_db.verify_user_role(
-                user_id, 'group_impersonate')
+            group_impersonate = fgapisrv_db.has_user_roles(
+                user_roles, 'group_impersonate') and fgapisrv_db.same_group(
+                user_name, user)
             logger.debug("group_impersonate: '%s'" % group_impersonate)
             if user == "*" \
                     and user_impersonate is False \
@@ -597,40 +614,68 @@ def tasks(apiver=fg_config['fgapiver']):
             # Add the usernname info in case of * or @ filters
             if user == "*" or user == "@":
                 user = user + user_name
-            # call to get tasks list
-            task_list = fgapisrv_db.get_task_list(user, appid)
+            # call to get tasks list; status and paging are
+            # processed by the database. The 'after' cursor pages
+            # on task ids, the next cursor is available only if
+            # more tasks exist beyond the requested page
+            task_count = None
+            limit = None
+            offset = None
+            next_after = None
+            if after is not None:
+                if per_page is not None:
+                    limit = int(per_page) + 1
+            elif page is not None and per_page is not None:
+                task_count = fgapisrv_db.get_task_count(user, appid, status)
+                pg, limit = page_bounds(page, per_page, task_count)
+                offset = pg * limit
+            task_list = fgapisrv_db.get_task_list(
+                user, appid, status, limit, offset, after or None)
+            if after is not None and \
+                    per_page is not None and \
+                    len(task_list) > int(per_page):
+                task_list = task_list[:int(per_page)]
+                next_after = task_list[-1]
             logger.debug("task_list: '%s'" % task_list)
             # Prepare response
             task_array = []
-            for taskid in task_list:
-                task_record = fgapisrv_db.get_task_record(taskid)
-                db_state = fgapisrv_db.get_state()
-                if db_state[0] != 0:
-                    # DBError getting TaskRecord
-                    # Prepare for 403
-                    state = 403
-                    response = {
-                        "message": db_state[1]
-                    }
-                    break
-                else:
-                    if status is None or task_record['status'] == status:
-                        task_record['_links'] = [
-                            {"rel": "self",
-                             "href": "/%s/tasks/%s" % (apiver, taskid)},
-                            {"rel": "input",
-                             "href": "/%s/tasks/%s/input" % (apiver, taskid)}]
-                        task_array += [task_record, ]
-            if state != 403:
+            task_records = fgapisrv_db.get_task_records(task_list)
+            db_state = fgapisrv_db.get_state()
+            if db_state[0] != 0:
+                # DBError getting TaskRecords
+                # Prepare for 403
+                state = 403
+                response = {
+                    "message": db_state[1]
+                }
+            else:
+                for task_record in task_records:
+                    taskid = task_record['id']
+                    task_record['_links'] = [
+                        {"rel": "self",
+                         "href": "/%s/tasks/%s" % (apiver, taskid)},
+                        {"rel": "input",
+                         "href": "/%s/tasks/%s/input" % (apiver, taskid)}]
+                    task_array += [task_record, ]
+            if state != 403 and after is not None:
+                state = 200
+                response = {"tasks": task_array,
+                            "_links": cursor_links(request.url,
+                                                   per_page,
+                                                   next_after)}
+            elif state != 403:
                 state = 200
                 paged_tasks, paged_links =\
                     paginate_response(
                         task_array,
                         page,
                         per_page,
-                        request.url)
+                        request.url,
+                        task_count)
                 response = {"tasks": paged_tasks,
                             "_links": paged_links}
+                if task_count is not None:
+                    response['total'] = task_count
     elif request.method == 'POST':
         auth_state, auth_msg = authorize_user(
             current_user, appid, user, "app_run")
@@ -696,7 +741,7 @@ def tasks(apiver=fg_config['fgapiver']):
                                 "json input")}
     else:
         state, response = not_allowed_method()
-    js = json.dumps(response, indent=fg_config['fgjson_indent'])
+    js = json_dump(response)
     resp = Response(js, status=state, mimetype='application/json')
     resp.headers['Content-type'] = 'application/json'
     header_links(request, resp, response)
@@ -722,7 +767,16 @@ def task_id(apiver=fg_config['fgapiver'], taskid=None):
                                        request.values.to_dict()))
     user_name = current_user.get_name()
     userid = current_user.get_id()
-    appid = get_task_app_id(taskid)
+    task_etag = None
+    if request.method == 'GET':
+        # A single query provides the task app_id and its version, so that
+        # unchanged tasks are answered without loading their record
+        task_version = fgapisrv_db.get_task_version(taskid)
+        appid = task_version.get('app_id', None)
+        task_etag = resource_etag('task', taskid, task_version.get('version'))
+        matching_etag = etag_match(task_etag)
+    else:
+        appid = get_task_app_id(taskid)
     user = request.values.get('user', user_name)
     api_support, state, message = check_api_ver(apiver)
     if not api_support:
@@ -736,12 +790,20 @@ def task_id(apiver=fg_config['fgapiver'], taskid=None):
                 "message": "Not authorized to perform this request:\n%s" %
                            auth_msg}
         else:
-            # User should be able to see the given app_id
-            if not fgapisrv_db.task_exists(taskid, userid, user):
+            # User should be able to see the given app_id; task owners
+            # do not need the whole task list check
+            if not task_version or (
+                    task_version['user'] not in (user_name, user) and
+                    not fgapisrv_db.task_exists(taskid, userid, user)):
                 state = 404
                 response = {
                     "message": "Unable to find task with id: %s" % taskid
                 }
+            elif matching_etag is not None:
+                # Task did not change; 304 - NOT MODIFIED has no content
+                state = 304
+                response = {}
+                task_etag = matching_etag
             else:
                 # Get task details
                 response = fgapisrv_db.get_task_record(taskid)
@@ -871,10 +933,12 @@ def task_id(apiver=fg_config['fgapiver'], taskid=None):
         }
     else:
         state, response = not_allowed_method()
-    js = json.dumps(response, indent=fg_config['fgjson_indent'])
+    js = json_dump(response)
     resp = Response(js, status=state, mimetype='application/json')
     resp.headers['Content-type'] = 'application/json'
     header_links(request, resp, response)
+    if task_etag is not None and state in (200, 304):
+        resp.set_etag(task_etag)
     return resp
 
 
@@ -917,77 +981,330 @@ def task_id_input(apiver=fg_config['fgapiver'], taskid=None):
                 response = fgapisrv_db.get_task_record(taskid)[
                     'input_files']
     elif request.method == 'POST':
-        auth_state, auth_msg = authorize_user(
-            current_user, appid, user, "app_run")
-        if not auth_state:
-            state = 402
+        state, response, task_sandbox = get_task_input_sandbox(
+            taskid, userid, user, appid)
+        if task_sandbox is not None:
+            # Process default application files
+            fgapisrv_db.setup_default_inputs(taskid, task_sandbox)
+            # Now process files to upload
+            upload_state, upload_response, file_list =\
+                save_task_inputs(task_sandbox)
+            # Uploaded files are registered at once
+            if len(file_list) > 0:
+                fgapisrv_db.update_input_sandbox_files(
+                    taskid, file_list, task_sandbox)
+            if upload_state != 200:
+                state = upload_state
+                response = upload_response
+            # Now get input_sandbox status
+            elif fgapisrv_db.is_input_sandbox_ready(taskid):
+                # The input_sandbox is completed; trigger the GE for
+                # this task
+                if fgapisrv_db.submit_task(taskid):
+                    state = 200
+                    response = {
+                        "task": taskid,
+                        "files": file_list,
+                        "message": "uploaded",
+                        "gestatus": "triggered",
+                        "_links": [{"rel": "task",
+                                    "href": "/%s/tasks/%s" %
+                                            (apiver, taskid)}, ]}
+                else:
+                    state = 412
+                    response = {
+                        "message": fgapisrv_db.get_state()[1]
+                    }
+            else:
+                state = 200
+                response = {
+                    "task": taskid,
+                    "files": file_list,
+                    "message": "uploaded",
+                    "gestatus": "waiting"}
+    else:
+        state, response = not_allowed_method()
+    js = json_dump(response)
+    resp = Response(js, status=state, mimetype='application/json')
+    resp.headers['Content-type'] = 'application/json'
+    header_links(request, resp, response)
+    return resp
+
+
+def get_task_input_sandbox(taskid, userid, user, appid):
+    """
+    Check that the current user can provide input files to the given task
+
+    :param taskid: task id
+    :param userid: current user id
+    :param user: user owning the task
+    :param appid: task application id
+    :return: state, response and the task IO sandbox; the IO sandbox is None
+             when input files cannot be accepted, in this case state and
+             response report the reason
+    """
+    task_sandbox = None
+    state = 200
+    response = {}
+    auth_state, auth_msg = authorize_user(
+        current_user, appid, user, "app_run")
+    if not auth_state:
+        state = 402
+        response = {
+            "message": "Not authorized to perform this request:\n%s" %
+                       auth_msg}
+    # First determine IO Sandbox location for this task
+    elif not fgapisrv_db.task_exists(taskid, userid, user):
+        state = 404
+        response = {
+            "message": "Unable to find task with id: %s" % taskid
+        }
+    elif fgapisrv_db.get_task_record(taskid)['status'] != 'WAITING':
+        state = 404
+        response = {
+            "message": ("Task with id: %s, "
+                        "is no more waiting for inputs") % taskid
+        }
+    else:
+        task_sandbox = fgapisrv_db.get_task_io_sandbox(taskid)
+        if task_sandbox is None:
+            state = 404
             response = {
-                "message": "Not authorized to perform this request:\n%s" %
-                           auth_msg}
-        else:
-            # First determine IO Sandbox location for this task
-            if not fgapisrv_db.task_exists(taskid, userid, user):
+                "message": 'Could not find IO Sandbox dir for task: %s'
+                           % taskid}
+    return state, response, task_sandbox
+
+
+def save_task_inputs(task_sandbox):
+    """
+    Save in the task IO sandbox the files of the current request; files can
+    be sent as multipart 'file[]' fields or as a JSON list of completed
+    upload sessions ({"uploads": [<upload id>, ...]})
+
+    :param task_sandbox: task IO sandbox directory
+    :return: state, response and the list of saved files; files saved
+             before any failure are returned as well
+    """
+    file_list = ()
+    params = request.get_json(silent=True) or {}
+    for upload_id in params.get('uploads', []):
+        try:
+            state, response = upload_complete(task_sandbox, upload_id)
+        except (IOError, OSError) as e:
+            state = 500
+            response = {
+                "message": "Unable to complete upload: '%s'; %s"
+                           % (upload_id, e)}
+        if state != 200:
+            return state, response, file_list
+        file_list += (response['name'],)
+    for f in request.files.getlist('file[]'):
+        filename = secure_filename(f.filename)
+        f.save(os.path.join(task_sandbox, filename))
+        file_list += (filename,)
+    return 200, {}, file_list
+
+
+# Resumable upload of task input files; files are sent in chunks to the
+# upload session and the session ids are then POSTed to the task input
+# endpoint ({"uploads": [<upload id>, ...]})
+#
+# POST   - Create an upload session ({"name":..., "size":..., "checksum":...})
+
+
+@app.route('/<apiver>/tasks/<taskid>/input/uploads', methods=['POST', ])
+@login_required
+def task_id_input_uploads(apiver=fg_config['fgapiver'], taskid=None):
+    logger.debug('task_id_input_uploads(%s): %s'
+                 % (request.method, request.values.to_dict()))
+    user_name = current_user.get_name()
+    userid = current_user.get_id()
+    appid = get_task_app_id(taskid)
+    user = request.values.get('user', user_name)
+    api_support, state, message = check_api_ver(apiver)
+    if not api_support:
+        response = {"message": message}
+    elif request.method == 'POST':
+        state, response, task_sandbox = get_task_input_sandbox(
+            taskid, userid, user, appid)
+        if task_sandbox is not None:
+            params = request.get_json(silent=True) or {}
+            try:
+                state, response = upload_create(task_sandbox,
+                                                params.get('name', None),
+                                                params.get('size', None),
+                                                params.get('checksum', None))
+            except (IOError, OSError) as e:
+                state = 500
+                response = {"message": "Unable to create upload: %s" % e}
+            if state == 201:
+                response['_links'] = [
+                    {"rel": "upload",
+                     "href": "/%s/tasks/%s/input/uploads/%s"
+                             % (apiver, taskid, response['upload'])}, ]
+    else:
+        state, response = not_allowed_method()
+    js = json_dump(response)
+    resp = Response(js, status=state, mimetype='application/json')
+    resp.headers['Content-type'] = 'application/json'
+    header_links(request, resp, response)
+    return resp
+
+
+# Upload session of a task input file
+#
+# GET    - Upload status; the offset field reports the received bytes
+# PUT    - Send data starting from the offset specified by the
+#          Upload-Offset header; data are sent as request body
+# DELETE - Abort the upload
+
+
+@app.route('/<apiver>/tasks/<taskid>/input/uploads/<upload_id>',
+           methods=['GET',
+                    'PUT',
+                    'DELETE'])
+@login_required
+def task_id_input_upload(apiver=fg_config['fgapiver'],
+                         taskid=None,
+                         upload_id=None):
+    logger.debug('task_id_input_upload(%s): %s'
+                 % (request.method, request.args.to_dict()))
+    user_name = current_user.get_name()
+    userid = current_user.get_id()
+    appid = get_task_app_id(taskid)
+    user = request.args.get('user', user_name)
+    api_support, state, message = check_api_ver(apiver)
+    if not api_support:
+        response = {"message": message}
+    elif request.method in ['GET', 'PUT', 'DELETE']:
+        state, response, task_sandbox = get_task_input_sandbox(
+            taskid, userid, user, appid)
+        if task_sandbox is None:
+            pass
+        elif request.method == 'GET':
+            response = upload_info(task_sandbox, upload_id)
+            if response is None:
                 state = 404
                 response = {
-                    "message": "Unable to find task with id: %s" % taskid
-                }
-            elif fgapisrv_db.get_task_record(taskid)['status'] != 'WAITING':
+                    "message": "Unable to find upload: '%s'" % upload_id}
+        elif request.method == 'PUT':
+            try:
+                offset = int(request.headers.get('Upload-Offset',
+                                                 request.args.get('offset')))
+                state, response = upload_write(task_sandbox,
+                                               upload_id,
+                                               offset,
+                                               request.stream)
+            except (TypeError, ValueError):
+                state = 400
+                response = {
+                    "message": "Missing or wrong Upload-Offset header"}
+            except (IOError, OSError) as e:
+                state = 500
+                response = {"message": "Unable to write upload: %s" % e}
+        else:
+            try:
+                state, response = upload_delete(task_sandbox, upload_id)
+            except (IOError, OSError) as e:
+                state = 500
+                response = {"message": "Unable to remove upload: %s" % e}
+    else:
+        state, response = not_allowed_method()
+    js = json_dump(response)
+    resp = Response(js, status=state, mimetype='application/json')
+    resp.headers['Content-type'] = 'application/json'
+    if 'offset' in response:
+        resp.headers['Upload-Offset'] = str(response['offset'])
+    return resp
+
+
+# Task output archive
+#
+# GET - Stream an archive of all available output files of the task; the
+#       'task' parameter adds the output files of further tasks and the
+#       'format' parameter selects the archive format (zip, tar, tgz)
+
+
+@app.route('/<apiver>/tasks/<taskid>/output/archive', methods=['GET', ])
+@login_required
+def task_id_output_archive(apiver=fg_config['fgapiver'], taskid=None):
+    logger.debug('task_id_output_archive(%s): %s'
+                 % (request.method, request.values.to_dict()))
+    user_name = current_user.get_name()
+    userid = current_user.get_id()
+    user = request.values.get('user', user_name)
+    archive_format = request.values.get('format', 'zip')
+    task_ids = [taskid, ]
+    for task_param in request.values.getlist('task'):
+        task_ids += [task_id for task_id in task_param.split(',')
+                     if task_id != '' and task_id not in task_ids]
+    api_support, state, message = check_api_ver(apiver)
+    if not api_support:
+        response = {"message": message}
+    elif request.method == 'GET':
+        state = 200
+        response = {}
+        task_records = fgapisrv_db.get_task_records(task_ids)
+        found_ids = [task_record['id'] for task_record in task_records]
+        app_ids = set([task_record['application']
+                       for task_record in task_records])
+        for task_id in task_ids:
+            if task_id not in found_ids or\
+                    not fgapisrv_db.task_exists(task_id, userid, user):
                 state = 404
                 response = {
-                    "message": ("Task with id: %s, "
-                                "is no more waiting for inputs") % taskid
+                    "message": "Unable to find task with id: %s" % task_id
                 }
+                break
+        # Authorization is verified once for each task application
+        for app_id in app_ids:
+            if state != 200:
+                break
+            auth_state, auth_msg = authorize_user(
+                current_user, app_id, user, "task_view")
+            if not auth_state:
+                state = 402
+                response = {
+                    "message": "Not authorized to perform this request:\n%s"
+                               % auth_msg}
+        if state == 200:
+            archive_files = []
+            for task_id, file_name, file_path in\
+                    fgapisrv_db.get_task_output_paths(task_ids):
+                output_file = os.path.join(file_path, file_name)
+                if not os.path.isfile(output_file):
+                    logger.warning("Output file: '%s' of task: '%s' is "
+                                   "missing" % (output_file, task_id))
+                    continue
+                # Multiple task archives store files in a task directory
+                arcname = file_name
+                if len(task_ids) > 1:
+                    arcname = '%s/%s' % (task_id, file_name)
+                archive_files += [(arcname,
+                                   output_file,
+                                   os.path.getsize(output_file)), ]
+            archive_error = archive_check(archive_files, archive_format)
+            if archive_error is not None:
+                state = 400
+                response = {"message": archive_error}
             else:
-                task_sandbox = fgapisrv_db.get_task_io_sandbox(taskid)
-                if task_sandbox is None:
-                    state = 404
-                    response = {
-                        "message": 'Could not find IO Sandbox dir for task: %s'
-                                   % taskid}
-                else:
-                    # Process default application files
-                    fgapisrv_db.setup_default_inputs(taskid, task_sandbox)
-                    # Now process files to upload
-                    uploaded_files = request.files.getlist('file[]')
-                    file_list = ()
-                    for f in uploaded_files:
-                        filename = secure_filename(f.filename)
-                        f.save(os.path.join(task_sandbox, filename))
-                        fgapisrv_db.update_input_sandbox_file(
-                            taskid, filename, os.path.join(task_sandbox))
-                        file_list += (filename,)
-                    # Now get input_sandbox status
-                    if fgapisrv_db.is_input_sandbox_ready(taskid):
-                        # The input_sandbox is completed; trigger the GE for
-                        # this task
-                        if fgapisrv_db.submit_task(taskid):
-                            state = 200
-                            response = {
-                                "task": taskid,
-                                "files": file_list,
-                                "message": "uploaded",
-                                "gestatus": "triggered",
-                                "_links": [{"rel": "task",
-                                            "href": "/%s/tasks/%s" %
-                                                    (apiver, taskid)}, ]}
-                        else:
-                            state = 412
-                            response = {
-                                "message": fgapisrv_db.get_state()[1]
-                            }
-                    else:
-                        state = 200
-                        response = {
-                            "task": taskid,
-                            "files": file_list,
-                            "message": "uploaded",
-                            "gestatus": "waiting"}
+                mimetype, extension = archive_formats[archive_format]
+                resp = Response(archive_stream(archive_files,
+                                               archive_format),
+                                status=200,
+                                mimetype=mimetype)
+                archive_name = 'task_%s_output' % taskid
+                if len(task_ids) > 1:
+                    archive_name = 'tasks_output'
+                resp.headers.add('Content-Disposition',
+                                 'attachment; filename="%s.%s"'
+                                 % (archive_name, extension))
+                return resp
     else:
         state, response = not_allowed_method()
-    js = json.dumps(response, indent=fg_config['fgjson_indent'])
+    js = json_dump(response)
     resp = Response(js, status=state, mimetype='application/json')
     resp.headers['Content-type'] = 'application/json'
-    header_links(request, resp, response)
     return resp
 
 
@@ -1018,13 +1335,55 @@ def task_callback(apiver=fg_config['fgapiver'], taskid=None):
     else:
         state, response = not_allowed_method()
     logger.debug(response['message'])
-    js = json.dumps(response, indent=fg_config['fgjson_indent'])
+    js = json_dump(response)
     resp = Response(js, status=state, mimetype='application/json')
     resp.headers['Content-type'] = 'application/json'
     header_links(request, resp, response)
     return resp
 
 
+def send_task_file(file_path, file_name):
+    """
+    Send the given file; the file is streamed from the disk in chunks and
+    conditional (ETag/Last-Modified) and range requests are supported.
+    When fgapisrv_xsendfile is set to X-Sendfile or X-Accel-Redirect, the
+    file transfer is delegated to the front-end web server; in the case of
+    X-Accel-Redirect only files inside the IO sandbox can be delegated and
+    their location is fgapisrv_xaccelprefix followed by the file path
+    relative to fgapisrv_iosandbox
+
+    :param file_path: file directory
+    :param file_name: file name
+    :return: the file response
+    """
+    serve_file = os.path.abspath('%s/%s' % (file_path, file_name))
+    if not os.path.isfile(serve_file):
+        raise IOError("No such file: '%s'" % serve_file)
+    xsendfile = fg_config['fgapisrv_xsendfile'].lower()
+    iosandbox = os.path.join(os.path.abspath(fg_config['fgapisrv_iosandbox']),
+                             '')
+    xlocation = None
+    if xsendfile == 'x-sendfile':
+        xlocation = serve_file
+    elif xsendfile == 'x-accel-redirect' and\
+            serve_file.startswith(iosandbox):
+        xlocation = '%s/%s' % (
+            fg_config['fgapisrv_xaccelprefix'].rstrip('/'),
+            urllib.quote(serve_file[len(iosandbox):]))
+    if xlocation is not None:
+        resp = Response(status=200)
+        resp.headers[fg_config['fgapisrv_xsendfile']] = xlocation
+        resp.headers['Content-type'] = 'application/octet-stream'
+        resp.headers.add('Content-Disposition',
+                         'attachment; filename="%s"' % file_name)
+        return resp
+    return send_file(serve_file,
+                     mimetype='application/octet-stream',
+                     as_attachment=True,
+                     attachment_filename=file_name,
+                     conditional=True)
+
+
 # File download endpoint
 
 
@@ -1032,7 +1391,6 @@ def task_callback(apiver=fg_config['fgapiver'], taskid=None):
 @login_required
 def getfile(apiver=fg_config['fgapiver']):
     logger.debug('file(%s): %s' % (request.method, request.values.to_dict()))
-    serve_file = None
     user_name = current_user.get_name()
     user_id = current_user.get_id()
     user = request.values.get('user', user_name)
@@ -1060,24 +1418,15 @@ def getfile(apiver=fg_config['fgapiver']):
                            (auth_msg, user_id)}
         else:
             try:
-                serve_file = open('%s/%s' % (file_path, file_name), 'rb')
-                serve_file_content = serve_file.read()
-                resp = Response(serve_file_content, status=200)
-                resp.headers['Content-type'] = 'application/octet-stream'
-                resp.headers.add('Content-Disposition',
-                                 'attachment; filename="%s"' % file_name)
-                return resp
-            except IOError as e:
+                return send_task_file(file_path, file_name)
+            except (IOError, OSError) as e:
                 response = {
                     "message": "Unable to get file: %s/%s\n%s" %
                                (file_path, file_name, e)}
                 state = 404
-            finally:
-                if serve_file is not None:
-                    serve_file.close()
     else:
         status, response = not_allowed_method()
-    js = json.dumps(response, indent=fg_config['fgjson_indent'])
+    js = json_dump(response)
     resp = Response(js, status=state)
     resp.headers['Content-type'] = 'application/json'
     return resp
@@ -1182,6 +1531,8 @@ def applications(apiver=fg_config['fgapiver']):
                         request.url)
                     response = {"applications": paged_apps,
                                 "_links": paged_links}
+                    if page is not None and per_page is not None:
+                        response['total'] = len(apps)
     elif request.method == 'PUT':
         state = 405
         response = {
@@ -1230,6 +1581,7 @@ def applications(apiver=fg_config['fgapiver']):
                 fgapisrv_db.enable_app_by_userid(
                     user_id,
                     appid)
+                bump_authz_generation()
                 # Prepare response
                 state = 201
                 app_record = fgapisrv_db.get_app_record(appid)
@@ -1246,7 +1598,7 @@ def applications(apiver=fg_config['fgapiver']):
                                         % (apiver, appid)}, ]}
     else:
         state, response = not_allowed_method()
-    js = json.dumps(response, indent=fg_config['fgjson_indent'])
+    js = json_dump(response)
     resp = Response(js, status=state, mimetype='application/json')
     resp.headers['Content-type'] = 'application/json'
     header_links(request, resp, response)
@@ -1273,6 +1625,7 @@ def app_id(apiver=fg_config['fgapiver'], appid=None):
     user_name = current_user.get_name()
     user_id = current_user.get_id()
     user = request.values.get('user', user_name)
+    app_etag = None
     api_support, state, message = check_api_ver(apiver)
     if not api_support:
         response = {"message": message}
@@ -1285,12 +1638,22 @@ def app_id(apiver=fg_config['fgapiver'], appid=None):
                 "message": "Not authorized to perform this request:\n%s (%s)" %
                            (auth_msg, user_id)}
         else:
-            if not fgapisrv_db.app_exists(appid):
+            # The application version is enough to answer unchanged
+            # applications without loading their record
+            app_version = fgapisrv_db.get_app_version(appid)
+            app_etag = resource_etag('application', appid, app_version)
+            matching_etag = etag_match(app_etag)
+            if app_version is None:
                 state = 404
                 response = {
                     "message":
                         "Unable to find application with id: %s"
                         % appid}
+            elif matching_etag is not None:
+                # Application did not change; 304 - NOT MODIFIED
+                state = 304
+                response = {}
+                app_etag = matching_etag
             else:
                 # Get application details
                 response = fgapisrv_db.get_app_record(appid)
@@ -1329,6 +1692,7 @@ def app_id(apiver=fg_config['fgapiver'], appid=None):
                                 "reason: '%s'"
                                 % (appid, fgapisrv_db.get_state()[1]))}
             else:
+                bump_authz_generation()
                 state = 204
                 response = {
                     "message": "Successfully removed application with id: %s" %
@@ -1375,10 +1739,12 @@ def app_id(apiver=fg_config['fgapiver'], appid=None):
                                appid}
     else:
         status, response = not_allowed_method()
-    js = json.dumps(response, indent=fg_config['fgjson_indent'])
+    js = json_dump(response)
     resp = Response(js, status=state, mimetype='application/json')
     resp.headers['Content-type'] = 'application/json'
     header_links(request, resp, response)
+    if app_etag is not None and state in (200, 304):
+        resp.set_etag(app_etag)
     return resp
 
 
@@ -1469,7 +1835,7 @@ def app_id_input(apiver=fg_config['fgapiver'], appid=None):
                         "message": "uploaded successfully"}
     else:
         state, response = not_allowed_method()
-    js = json.dumps(response, indent=fg_config['fgjson_indent'])
+    js = json_dump(response)
     resp = Response(js, status=state, mimetype='application/json')
     resp.headers['Content-type'] = 'application/json'
     header_links(request, resp, response)
@@ -1564,6 +1930,8 @@ def infrastructures(apiver=fg_config['fgapiver']):
                     response = {
                         "infrastructures": paged_infras,
                         "_links": paged_links}
+                    if page is not None and per_page is not None:
+                        response['total'] = len(infras)
     elif request.method == 'PUT':
         state = 405
         response = {
@@ -1622,7 +1990,7 @@ def infrastructures(apiver=fg_config['fgapiver']):
                                      infra_record['id'])}]}
     else:
         state, response = not_allowed_method()
-    js = json.dumps(response, indent=fg_config['fgjson_indent'])
+    js = json_dump(response)
     resp = Response(js, status=state, mimetype='application/json')
     resp.headers['Content-type'] = 'application/json'
     header_links(request, resp, response)
@@ -1761,7 +2129,7 @@ def infra_id(apiver=fg_config['fgapiver'], infraid=None):
                 }
     else:
         state, response = not_allowed_method()
-    js = json.dumps(response, indent=fg_config['fgjson_indent'])
+    js = json_dump(response)
     resp = Response(js, status=state, mimetype='application/json')
     resp.headers['Content-type'] = 'application/json'
     header_links(request, resp, response)
@@ -1779,7 +2147,23 @@ def after_request(response):
                          'GET,PUT,POST,DELETE,PATCH')
     response.headers.add('Access-Control-Allow-Credentials', 'true')
     response.headers.add('Server', fg_config['fgapiserver_name'])
-    return response
+    # Negotiated compression (fgapisrv_compress)
+    return compress_response(response)
+
+
+# Request DB session; any DB call made while serving a request shares
+# the same database connection, released once the request is completed
+@app.before_request
+def open_db_session():
+    global fg_config
+    # Database settings changed in background replace the configuration
+    fg_config = get_db_config(fg_config)
+    begin_db_session(fg_config['fgapisrv_db_reqtransaction'])
+
+
+@app.teardown_request
+def close_db_session(error=None):
+    end_db_session(error)
 
 
 # IP Filtering
@@ -1789,12 +2173,9 @@ filtered_ips = ('193.206.190.155', )
 # Common check for requests
 @app.before_request
 def limit_remote_addr():
-    global fg_config
     # Block blacklisted IPs
     if request.remote_addr in filtered_ips:
         abort(403)  # Forbidden
-    # Override configuration settings from the database
-    fg_config = update_db_config(fg_config)
 
 
 #
@@ -1802,12 +2183,23 @@ def limit_remote_addr():
 #
 
 
+# Reload configuration file settings on SIGHUP
+install_config_reload_handler()
+
 # Get database object and check the DB
 check_db_ver()
 
 # Server registration and configuration from fgdb
 fgapiserver_uuid = check_db_reg(fg_config)
 
+# Override configuration settings from the database; settings are checked
+# again in background each fgapisrv_db_cfgpoll seconds
+fg_config = update_db_config(fg_config, fgapiserver_uuid)
+start_db_config_poller(fg_config, fgapiserver_uuid)
+
+# Remove expired tokens in background (fgapisrv_tokensweep_period)
+start_token_sweeper()
+
 # Now execute accordingly to the app configuration (stand-alone/wsgi)
 if __name__ == "__main__":
     # Inform user about server activity
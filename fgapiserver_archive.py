@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# Copyright (c) 2015:
+# Istituto Nazionale di Fisica Nucleare (INFN), Italy
+#
+# See http://www.infn.it  for details on the copyrigh holder
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import time
+import zlib
+import struct
+import tarfile
+
+"""
+  FutureGateway APIServer streamed archives
+
+  Archives are generated on the fly while they are sent, without any
+  temporary file; the zipfile module cannot be used since it requires a
+  seekable output, so zip entries are written with data descriptors
+  (sizes and CRC follow the compressed data).
+"""
+__author__ = 'Riccardo Bruno'
+__copyright__ = '2019'
+__license__ = 'Apache'
+__version__ = 'v0.0.10.1'
+__maintainer__ = 'Riccardo Bruno'
+__email__ = 'riccardo.bruno@ct.infn.it'
+__status__ = 'devel'
+__update__ = '2019-10-18 15:19:14'
+
+"""
+ Archive settings
+"""
+def_archive_chunk = 64 * 1024  # Bytes read from archived files at once
+zip_max_size = 0xFFFFFFFF      # Zip files without Zip64 extensions are
+zip_max_entries = 0xFFFF       # limited in size and number of entries
+
+# Supported archive formats: format -> (mimetype, file extension)
+archive_formats = {
+    'zip': ('application/zip', 'zip'),
+    'tar': ('application/x-tar', 'tar'),
+    'tgz': ('application/gzip', 'tar.gz')}
+
+
+def archive_check(files, archive_format):
+    """
+    Check that the given files can be stored in an archive of the given
+    format
+
+    :param files: list of (archive name, file path, file size)
+    :param archive_format: one of the archive_formats keys
+    :return: None if the archive can be created or the reason why not
+    """
+    if archive_format not in archive_formats:
+        return ("Unsupported archive format: '%s'; supported formats are: %s"
+                % (archive_format, ', '.join(sorted(archive_formats.keys()))))
+    if archive_format == 'zip':
+        # Deflate may slightly enlarge incompressible data
+        zip_size = sum([file_size + file_size / 1000 + 1024
+                        for _, _, file_size in files])
+        if zip_size > zip_max_size or len(files) > zip_max_entries:
+            return "Too large zip archive; use the tar or tgz format"
+    return None
+
+
+def archive_stream(files, archive_format):
+    """
+    Return a generator of the archive containing the given files
+
+    :param files: list of (archive name, file path, file size)
+    :param archive_format: one of the archive_formats keys
+    :return: archive data generator
+    """
+    if archive_format == 'zip':
+        return zip_stream(files)
+    return tar_stream(files, archive_format == 'tgz')
+
+
+def file_chunks(file_path):
+    """
+    Read the given file in chunks
+    """
+    with open(file_path, 'rb') as archived_file:
+        while True:
+            chunk = archived_file.read(def_archive_chunk)
+            if not chunk:
+                break
+            yield chunk
+
+
+def tar_stream(files, compress=False):
+    """
+    Generate a (gzip compressed) tar archive of the given files
+
+    :param files: list of (archive name, file path, file size)
+    :param compress: gzip compress the archive when True
+    :return: archive data generator
+    """
+    compressor = None
+    if compress:
+        # wbits 16 + MAX_WBITS produces the gzip format
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def tar_data():
+        for arcname, file_path, file_size in files:
+            tarinfo = tarfile.TarInfo(arcname)
+            tarinfo.size = file_size
+            tarinfo.mtime = int(os.path.getmtime(file_path))
+            tarinfo.mode = 0o644
+            yield tarinfo.tobuf(format=tarfile.PAX_FORMAT)
+            # Exactly the declared size is sent, even if the file changes
+            sent_size = 0
+            for chunk in file_chunks(file_path):
+                chunk = chunk[:file_size - sent_size]
+                sent_size += len(chunk)
+                if chunk:
+                    yield chunk
+            if sent_size < file_size:
+                yield tarfile.NUL * (file_size - sent_size)
+            if file_size % tarfile.BLOCKSIZE:
+                yield tarfile.NUL * (tarfile.BLOCKSIZE -
+                                     file_size % tarfile.BLOCKSIZE)
+        yield tarfile.NUL * (2 * tarfile.BLOCKSIZE)
+
+    for data in tar_data():
+        if compressor is not None:
+            data = compressor.compress(data)
+        if data:
+            yield data
+    if compressor is not None:
+        yield compressor.flush()
+
+
+def zip_stream(files):
+    """
+    Generate a zip archive of the given files; entries are deflated
+
+    :param files: list of (archive name, file path, file size)
+    :return: archive data generator
+    """
+    offset = 0
+    central_directory = []
+    for arcname, file_path, _ in files:
+        # Entry names are UTF-8 encoded (flags bit 11)
+        if isinstance(arcname, unicode):
+            arcname = arcname.encode('utf-8')
+        mtime = time.localtime(os.path.getmtime(file_path))
+        dos_time = (mtime[3] << 11) | (mtime[4] << 5) | (mtime[5] // 2)
+        dos_date = ((max(mtime[0], 1980) - 1980) << 9) |\
+            (mtime[1] << 5) | mtime[2]
+        # Local file header; bit 3 of flags: sizes follow the data
+        header = struct.pack('<4s5H3L2H',
+                             'PK\x03\x04', 20, 0x808, zlib.DEFLATED,
+                             dos_time, dos_date, 0, 0, 0,
+                             len(arcname), 0) + arcname
+        yield header
+        crc = 0
+        compressed_size = 0
+        file_size = 0
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        for chunk in file_chunks(file_path):
+            crc = zlib.crc32(chunk, crc)
+            file_size += len(chunk)
+            data = compressor.compress(chunk)
+            compressed_size += len(data)
+            if data:
+                yield data
+        data = compressor.flush()
+        compressed_size += len(data)
+        yield data
+        crc &= 0xFFFFFFFF
+        descriptor = struct.pack('<4s3L', 'PK\x07\x08',
+                                 crc, compressed_size, file_size)
+        yield descriptor
+        central_directory += [
+            struct.pack('<4s6H3L5H2L',
+                        'PK\x01\x02', 20, 20, 0x808, zlib.DEFLATED,
+                        dos_time, dos_date, crc, compressed_size,
+                        file_size, len(arcname), 0, 0, 0, 0,
+                        0o100644 << 16, offset) + arcname, ]
+        offset += len(header) + compressed_size + len(descriptor)
+    central_directory_data = ''.join(central_directory)
+    yield central_directory_data
+    yield struct.pack('<4s4H2LH', 'PK\x05\x06', 0, 0,
+                      len(central_directory), len(central_directory),
+                      len(central_directory_data), offset, 0)
@@ -20,9 +20,11 @@
 
 from fgapiserver_db import FGAPIServerDB
 from fgapiserver_config import FGApiServerConfig
+from fgapiserver_cache import FGAPIServerCache
 
 import os
 import sys
+import threading
 import logging.config
 
 """
@@ -53,6 +55,13 @@ fg_config = FGApiServerConfig(fgapiserver_config_file)
 logging.config.fileConfig(fg_config['fgapisrv_logcfg'])
 logger = logging.getLogger(__name__)
 
+# Per-process cache of authorization decisions; cache keys include the
+# generation of the decision, so that bump_authz_generation makes any
+# previous decision unreachable
+authz_cache = FGAPIServerCache(ttl=fg_config['fgapisrv_authzcache_ttl'])
+authz_generation = [0]
+authz_generation_lock = threading.Lock()
+
 
 def get_fgapiserver_db():
     """
@@ -66,6 +75,8 @@ def get_fgapiserver_db():
     db_user = fg_config['fgapisrv_db_user']
     db_pass = fg_config['fgapisrv_db_pass']
     db_name = fg_config['fgapisrv_db_name']
+    db_pool_size = fg_config['fgapisrv_db_poolsize']
+    db_pool_recycle = fg_config['fgapisrv_db_poolrecycle']
     iosandbbox_dir = fg_config['fgapisrv_iosandbox']
     fgapiserverappid = fg_config['fgapisrv_geappid']
 
@@ -75,6 +86,8 @@ def get_fgapiserver_db():
         db_user=db_user,
         db_pass=db_pass,
         db_name=db_name,
+        db_pool_size=db_pool_size,
+        db_pool_recycle=db_pool_recycle,
         iosandbbox_dir=iosandbbox_dir,
         fgapiserverappid=fgapiserverappid)
     db_state = apiserver_db.get_state()
@@ -94,11 +107,25 @@ def get_fgapiserver_db():
     return apiserver_db
 
 
+def bump_authz_generation():
+    """
+    Invalidate any cached authorization decision; this function has to be
+    called each time users, groups, roles or group applications change
+
+    :return: The new authorization generation
+    """
+    with authz_generation_lock:
+        authz_generation[0] += 1
+        return authz_generation[0]
+
+
 def authorize_user(current_user, app_id, user, reqroles):
     """
     This function returns true if the given user is authorized to process the
     requested action
     The request will be checked against user group roles stored in the database
+    Decisions are cached until users, groups, roles or group applications
+    change (see bump_authz_generation) or their cache TTL expires
 
     :param current_user: The user requesting the action
     :param app_id: The application id (if appliable)
@@ -113,14 +140,41 @@ def authorize_user(current_user, app_id, user, reqroles):
     # if fgapisrv_notoken:
     #     return True, 'Authorization disabled'
 
-    message = ''
     user_id = current_user.get_id()
     user_name = current_user.get_name()
     logger.debug(("AuthUser: user_id: '%s' - "
                   "user_name: '%s'" % (user_id, user_name)))
+    authz_key = (authz_generation[0], user_id, user_name, app_id, user,
+                 reqroles)
+    authz = authz_cache.get(authz_key)
+    if authz is not None:
+        logger.debug("AuthUser: cached decision: %s" % (authz,))
+        return authz
+    auth_z, message = check_user_authz(user_id, user_name, app_id, user,
+                                       reqroles)
+    if fgapisrv_db.get_state()[0] is False:
+        authz_cache.set(authz_key, (auth_z, message))
+    return auth_z, message
+
+
+def check_user_authz(user_id, user_name, app_id, user, reqroles):
+    """
+    Check against the database if the given user is authorized to process
+    the requested action (see authorize_user)
+
+    :param user_id: The id of the user requesting the action
+    :param user_name: The name of the user requesting the action
+    :param app_id: The application id (if appliable)
+    :param user: The user specified by the filter
+    :param reqroles: The requested roles: task_view, app_run, ...
+    :return: authorization flag and message
+    """
+    message = ''
 
-    # Check if requested action is in the user group roles
-    auth_z = fgapisrv_db.verify_user_role(user_id, reqroles)
+    # Check if requested action is in the user group roles; any role check
+    # is answered by the same set of user roles
+    user_roles = fgapisrv_db.get_user_roles(user_id)
+    auth_z = fgapisrv_db.has_user_roles(user_roles, reqroles)
     logger.debug(("AuthUser: Auth for user '%s' "
                   "with roles '%s' is %s")
                  % (user_id, reqroles, auth_z))
@@ -131,15 +185,13 @@ def authorize_user(current_user, app_id, user, reqroles):
     if user_name != user:
         logger.debug("AuthUser: User name '%s' differs from user '%s'"
                      % (user_name, user))
-        user_impersonate = fgapisrv_db.verify_user_role(
-            user_id, 'user_impersonate')
+        user_impersonate = fgapisrv_db.has_user_roles(
+            user_roles, 'user_impersonate')
+        group_impersonate = fgapisrv_db.has_user_roles(
+            user_roles, 'group_impersonate')
         if user != "@":
-            group_impersonate = fgapisrv_db.same_group(
-                user_name, user) and fgapisrv_db.verify_user_role(
-                user_id, 'group_impersonate')
-        else:
-            group_impersonate = fgapisrv_db.verify_user_role(
-                user_id, 'group_impersonate')
+            group_impersonate = group_impersonate and fgapisrv_db.same_group(
+                user_name, user)
         auth_z = auth_z and (user_impersonate or group_impersonate)
         if not auth_z:
             if user == "*":
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# Copyright (c) 2015:
+# Istituto Nazionale di Fisica Nucleare (INFN), Italy
+#
+# See http://www.infn.it  for details on the copyrigh holder
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import threading
+from collections import OrderedDict
+
+"""
+  FutureGateway APIServer in-process caches
+"""
+__author__ = 'Riccardo Bruno'
+__copyright__ = '2019'
+__license__ = 'Apache'
+__version__ = 'v0.0.10.1'
+__maintainer__ = 'Riccardo Bruno'
+__email__ = 'riccardo.bruno@ct.infn.it'
+__status__ = 'devel'
+__update__ = '2019-10-18 15:19:14'
+
+"""
+ Cache default settings
+"""
+def_cache_size = 1024  # Maximum number of entries
+def_cache_ttl = 60     # Entry time to live in seconds
+
+
+"""
+  FGAPIServerCache - Thread safe, bounded LRU cache; each entry expires
+                     after the cache TTL or after its own TTL when given
+"""
+
+
+class FGAPIServerCache:
+
+    max_size = def_cache_size
+    ttl = def_cache_ttl
+
+    def __init__(self, max_size=def_cache_size, ttl=def_cache_ttl):
+        self.max_size = int(max_size)
+        self.ttl = int(ttl)
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.stats = {'hits': 0,
+                      'misses': 0,
+                      'expired': 0,
+                      'evicted': 0}
+
+    """
+      get - Return the value associated to the given key or the default
+            value if the key does not exist or its entry is expired
+    """
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                self.stats['misses'] += 1
+                return default
+            if entry[0] <= time.time():
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return default
+            # Move the entry on top of the most recently used ones
+            self.entries[key] = entry
+            self.stats['hits'] += 1
+            return entry[1]
+
+    """
+      set - Store the given value; the entry lasts the cache TTL or the
+            given ttl (seconds) whichever comes first
+    """
+
+    def set(self, key, value, ttl=None):
+        if ttl is None or ttl > self.ttl:
+            ttl = self.ttl
+        if ttl <= 0 or self.max_size <= 0:
+            return
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (time.time() + ttl, value)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.stats['evicted'] += 1
+
+    """
+      delete - Remove the given key from the cache
+    """
+
+    def delete(self, key):
+        with self.lock:
+            return self.entries.pop(key, None) is not None
+
+    """
+      delete_if - Remove any entry whose value verifies the given function
+                  returning the number of removed entries
+    """
+
+    def delete_if(self, match):
+        with self.lock:
+            keys = [key for key, entry in self.entries.items()
+                    if match(entry[1])]
+            for key in keys:
+                del self.entries[key]
+        return len(keys)
+
+    """
+      clear - Remove any cache entry
+    """
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    """
+      get_stats - Return cache statistics
+    """
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self.entries)
+            stats['max_size'] = self.max_size
+            stats['ttl'] = self.ttl
+        return stats
@@ -18,6 +18,8 @@
 
 import os
 import json
+import signal
+import threading
 import ConfigParser
 import logging
 import logging.config
@@ -64,6 +66,7 @@ class FGApiServerConfig(dict):
             'fgapisrv_debug': 'True',
             'fgapisrv_iosandbox': '/tmp',
             'fgjson_indent': '4',
+            'fgjson_compact': 'True',
             'fgapisrv_key': '',
             'fgapisrv_crt': '',
             'fgapisrv_logcfg': 'fgapiserver_log.conf',
@@ -77,13 +80,37 @@ class FGApiServerConfig(dict):
             'fgapisrv_ptvpass': 'ptvpass',
             'fgapisrv_ptvdefusr': 'futuregateway',
             'fgapisrv_ptvdefgrp': 'administrator',
-            'fgapisrv_ptvmapfile': 'fgapiserver_ptvmap.json'},
+            'fgapisrv_ptvmapfile': 'fgapiserver_ptvmap.json',
+            'fgapisrv_ptvcachettl': '300',
+            'fgapisrv_ptvnegttl': '10',
+            'fgapisrv_ptvconntimeout': '5',
+            'fgapisrv_ptvreadtimeout': '10',
+            'fgapisrv_ptvretries': '2',
+            'fgapisrv_ptvbreaker': '5',
+            'fgapisrv_ptvbreakerreset': '30',
+            'fgapisrv_tokencache_size': '1024',
+            'fgapisrv_tokencache_ttl': '60',
+            'fgapisrv_authzcache_ttl': '60',
+            'fgapisrv_signedtokens': 'False',
+            'fgapisrv_tokenver': '0',
+            'fgapisrv_tokensweep_period': '0',
+            'fgapisrv_tokensweep_batch': '500',
+            'fgapisrv_tokenretention': '604800',
+            'fgapisrv_xsendfile': '',
+            'fgapisrv_xaccelprefix': '/fgapiserver_iosandbox',
+            'fgapisrv_compress': 'True',
+            'fgapisrv_compressminsize': '1024',
+            'fgapisrv_compresslevel': '6'},
         'fgapiserver_db': {
             'fgapisrv_db_host': 'localhost',
             'fgapisrv_db_port': '3306',
             'fgapisrv_db_user': 'localhost',
             'fgapisrv_db_pass': 'fgapiserver_password',
-            'fgapisrv_db_name': 'fgapiserver'},
+            'fgapisrv_db_name': 'fgapiserver',
+            'fgapisrv_db_poolsize': '8',
+            'fgapisrv_db_poolrecycle': '3600',
+            'fgapisrv_db_reqtransaction': 'False',
+            'fgapisrv_db_cfgpoll': '30'},
         'gridengine_ei': {
             'utdb_host': 'localhost',
             'utdb_port': '3306',
@@ -100,8 +127,31 @@ class FGApiServerConfig(dict):
                  'fgapisrv_geappid',
                  'fgapisrv_port',
                  'fgapisrv_db_port',
+                 'fgapisrv_db_poolsize',
+                 'fgapisrv_db_poolrecycle',
+                 'fgapisrv_db_cfgpoll',
+                 'fgapisrv_tokencache_size',
+                 'fgapisrv_tokencache_ttl',
+                 'fgapisrv_authzcache_ttl',
+                 'fgapisrv_tokenver',
+                 'fgapisrv_tokensweep_period',
+                 'fgapisrv_tokensweep_batch',
+                 'fgapisrv_tokenretention',
+                 'fgapisrv_compressminsize',
+                 'fgapisrv_compresslevel',
+                 'fgapisrv_ptvcachettl',
+                 'fgapisrv_ptvnegttl',
+                 'fgapisrv_ptvconntimeout',
+                 'fgapisrv_ptvreadtimeout',
+                 'fgapisrv_ptvretries',
+                 'fgapisrv_ptvbreaker',
+                 'fgapisrv_ptvbreakerreset',
                  'utdb_port']
     bool_types = ['fgapisrv_lnkptvflag',
+                  'fgjson_compact',
+                  'fgapisrv_compress',
+                  'fgapisrv_signedtokens',
+                  'fgapisrv_db_reqtransaction',
                   'fgapisrv_notoken',
                   'fgapisrv_debug']
 
@@ -220,3 +270,74 @@ class FGApiServerConfig(dict):
             for key in cfg_dict:
                 value = cfg_dict[key]
                 self[key] = value
+
+
+# Process wide configuration snapshots, one for each configuration file.
+# Each snapshot stores the configuration file modification time and the
+# reload generation at the time the configuration object has been created
+config_snapshots = {}
+config_snapshots_lock = threading.Lock()
+config_generation = [0]
+
+
+def get_config_snapshot(config_file):
+    """
+    Return the process wide configuration object of the given file.
+    The configuration object is loaded again only when the configuration
+    file modification time changes or after a reload request (SIGHUP).
+    Returned objects are never modified, a reload replaces the whole
+    snapshot, so that callers holding the previous object keep a consistent
+    view of the configuration; callers must not change returned objects
+
+    :param config_file: configuration file path
+    :return: configuration object (FGApiServerConfig)
+    """
+    try:
+        config_mtime = os.stat(config_file).st_mtime
+    except (OSError, TypeError):
+        config_mtime = None
+    snapshot = config_snapshots.get(config_file)
+    if snapshot is not None and\
+            snapshot[0] == config_mtime and\
+            snapshot[1] == config_generation[0]:
+        return snapshot[2]
+    with config_snapshots_lock:
+        snapshot = config_snapshots.get(config_file)
+        if snapshot is None or\
+                snapshot[0] != config_mtime or\
+                snapshot[1] != config_generation[0]:
+            snapshot = (config_mtime,
+                        config_generation[0],
+                        FGApiServerConfig(config_file))
+            config_snapshots[config_file] = snapshot
+            logging.debug("Configuration snapshot of '%s' loaded"
+                          % config_file)
+    return snapshot[2]
+
+
+def reload_config_snapshots(*args):
+    """
+    Invalidate any configuration snapshot; they will be loaded again at
+    their next access. This function is also the SIGHUP signal handler
+
+    :param args: signal handler arguments (signum, frame) not used
+    :return: None
+    """
+    config_generation[0] += 1
+
+
+def install_config_reload_handler():
+    """
+    Reload configuration snapshots on SIGHUP signal.
+    Signal handlers can be installed only by the main thread; when this is
+    not possible (i.e. wsgi containers), snapshots will be reloaded only
+    on configuration file changes
+
+    :return: True if the signal handler has been installed
+    """
+    try:
+        signal.signal(signal.SIGHUP, reload_config_snapshots)
+    except (ValueError, AttributeError) as e:
+        logging.debug("Unable to install SIGHUP handler: %s" % e)
+        return False
+    return True
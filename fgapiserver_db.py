@@ -24,8 +24,11 @@ import urllib
 import shutil
 import logging
 import json
+import copy
 import time
+import threading
 from fgapiserver_config import FGApiServerConfig
+from fgapiserver_cache import FGAPIServerCache
 
 """
   GridEngine API Server database
@@ -48,6 +51,12 @@ def_db_user = 'fgapiserver'
 def_db_pass = 'fgapiserver_password'
 def_db_name = 'fgapiserver'
 
+"""
+ Database connection pool default settings
+"""
+def_db_pool_size = 8        # Maximum number of idle connections kept
+def_db_pool_recycle = 3600  # Maximum connection age in seconds
+
 """
  Task sandboxing will be placed here Sandbox directories
  will be generated as UUID names generated during task creation
@@ -55,6 +64,91 @@ def_db_name = 'fgapiserver'
 def_iosandbbox_dir = '/tmp'
 def_geapiserverappid = '10000'  # GridEngine sees API server as an application
 
+"""
+ Maximum number of task ids loaded by a single bulk query
+"""
+def_task_batch_size = 500
+
+"""
+ Registered tokens are written again in fg_token only after this time (s)
+"""
+def_registered_token_ttl = 24 * 60 * 60
+
+"""
+ Queries executed on each API call or on large tables; they are kept as
+ module constants so that their execution plans can be checked against a
+ real database (see tests/test_db_indexes.py)
+"""
+sql_verify_session_token = (
+    'select if((creation+expiry)-now()>0,user_id,NULL) user_id\n'
+    '      ,(select name from fg_user where id=user_id) name\n'
+    '      ,timestampdiff(second,\n'
+    '                     now(),\n'
+    '                     creation + interval expiry second)'
+    ' lasting\n'
+    'from fg_token\n'
+    'where token=%s;')
+sql_user_token = ('select user_id, subject\n'
+                  'from fg_token\n'
+                  'where token = %s\n'
+                  '  and creation+expiry > now();')
+sql_delete_expired_tokens = (
+    'delete from fg_token\n'
+    'where creation < now() - interval %s second\n'
+    '  and creation + interval (coalesce(expiry, 0) + %s)'
+    ' second < now()\n'
+    'limit %s;')
+sql_user_roles = ('select distinct r.name\n'
+                  'from fg_user        u  \n'
+                  '    ,fg_group       g  \n'
+                  '    ,fg_user_group ug  \n'
+                  '    ,fg_group_role gr  \n'
+                  '    ,fg_role        r  \n'
+                  'where u.id=%s          \n'
+                  '  and u.enabled = true \n'
+                  '  and u.id=ug.user_id  \n'
+                  '  and g.id=ug.group_id \n'
+                  '  and g.id=gr.group_id \n'
+                  '  and r.id=gr.role_id;')
+# Task list and count templates; the first placeholder receives the user,
+# application and status filters of FGAPIServerDB.task_list_filter()
+sql_task_list = ('select id\n'
+                 'from task\n'
+                 'where status != \'PURGED\'\n'
+                 '%s'
+                 'order by id desc%s;')
+sql_task_count = ('select count(*)\n'
+                  'from task\n'
+                  'where status != \'PURGED\'\n'
+                  '%s;')
+sql_task_version = ('select t.app_id\n'
+                    '      ,t.user\n'
+                    '      ,t.status\n'
+                    '      ,t.last_change\n'
+                    '      ,(select concat(count(*),\'/\',\n'
+                    '                      coalesce(max(r.last_change),'
+                    '\'\'))\n'
+                    '        from runtime_data r\n'
+                    '        where r.task_id=t.id) runtime_data\n'
+                    '      ,(select count(*)\n'
+                    '        from task_input_file i\n'
+                    '        where i.task_id=t.id\n'
+                    '          and i.path is not null) input_files\n'
+                    '      ,(select count(*)\n'
+                    '        from task_output_file o\n'
+                    '        where o.task_id=t.id\n'
+                    '          and o.path is not null) output_files\n'
+                    'from task t\n'
+                    'where t.id=%s\n'
+                    '  and t.status != \'PURGED\';')
+sql_file_task_id = ('select task_id from task_output_file\n'
+                    'where file=%s and path=%s\n'
+                    'union all\n'
+                    'select task_id from task_input_file\n'
+                    'where file=%s and path=%s\n'
+                    'union all\n'
+                    'select null;')
+
 # setup path
 fgapirundir = os.path.dirname(os.path.abspath(__file__)) + '/'
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -68,6 +162,402 @@ fg_config = FGApiServerConfig(fgapiserver_config_file)
 # Logging
 logging.config.fileConfig(fg_config['fgapisrv_logcfg'])
 
+# Per-process database connection pools, one for each set of
+# connection settings (host, port, user, name)
+db_pools = {}
+db_pools_lock = threading.Lock()
+
+# Per-process cache of verified session tokens: token -> (user_id, user_name)
+session_token_cache = FGAPIServerCache(
+    fg_config['fgapisrv_tokencache_size'],
+    fg_config['fgapisrv_tokencache_ttl'])
+
+# Per-process cache of tokens already registered in fg_token; entries
+# expire before the token sweeper may remove registered tokens (see
+# fgapisrv_tokenretention), so that removed tokens are registered again
+registered_token_cache = FGAPIServerCache(
+    fg_config['fgapisrv_tokencache_size'],
+    min(def_registered_token_ttl, fg_config['fgapisrv_tokenretention'] / 2))
+
+
+"""
+  FGAPIServerDBConnection - Pooled connection wrapper; any call is forwarded
+                            to the real MySQL connection except close() that
+                            gives back the connection to its pool
+"""
+
+
+class FGAPIServerDBConnection:
+
+    pool = None
+    cnx = None
+    created = 0
+    released = False
+
+    def __init__(self, pool, cnx):
+        self.pool = pool
+        self.cnx = cnx
+        self.created = time.time()
+        self.released = False
+
+    def __getattr__(self, name):
+        return getattr(self.cnx, name)
+
+    def close(self):
+        if not self.released:
+            self.released = True
+            self.pool.release(self)
+
+
+"""
+  FGAPIServerDBPool - Bounded pool of MySQL connections; idle connections
+                      are checked before their reuse and recycled once
+                      reached their maximum age
+"""
+
+
+class FGAPIServerDBPool:
+
+    db_host = None
+    db_port = None
+    db_user = None
+    db_pass = None
+    db_name = None
+    pool_size = def_db_pool_size
+    pool_recycle = def_db_pool_recycle
+
+    def __init__(self, **kwargs):
+        self.db_host = kwargs.get('db_host', def_db_host)
+        self.db_port = kwargs.get('db_port', def_db_port)
+        self.db_user = kwargs.get('db_user', def_db_user)
+        self.db_pass = kwargs.get('db_pass', def_db_pass)
+        self.db_name = kwargs.get('db_name', def_db_name)
+        self.pool_size = int(kwargs.get('pool_size', def_db_pool_size))
+        self.pool_recycle = int(kwargs.get('pool_recycle',
+                                           def_db_pool_recycle))
+        self.lock = threading.Lock()
+        self.idle = []
+        self.pid = os.getpid()
+        self.stats = {'created': 0,
+                      'reused': 0,
+                      'recycled': 0,
+                      'discarded': 0,
+                      'overflow': 0,
+                      'in_use': 0}
+
+    """
+      new_connection - Open a new MySQL connection, retrying until the
+                       database becomes reachable
+    """
+
+    def new_connection(self):
+        cnx = None
+        while cnx is None:
+            try:
+                cnx = mysql.connector.connect(
+                    host=self.db_host,
+                    user=self.db_user,
+                    passwd=self.db_pass,
+                    db=self.db_name,
+                    port=self.db_port)
+            except mysql.connector.Error as err:
+                print('Failed to connect to database: \'%s\'' % err)
+                print('Will retry in 5 seconds ...')
+                time.sleep(5)
+        return cnx
+
+    """
+      discard - Close the given pooled connection ignoring any error
+    """
+
+    @staticmethod
+    def discard(pooled):
+        try:
+            pooled.cnx.close()
+        except mysql.connector.Error as e:
+            logging.debug("Unable to close discarded connection: '%s'" % e)
+
+    """
+      check_fork - Forget connections inherited from a parent process
+    """
+
+    def check_fork(self):
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.idle = []
+            self.stats['in_use'] = 0
+
+    """
+      acquire - Return a live pooled connection, taken from the idle ones
+                or newly created when none is available
+    """
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                self.check_fork()
+                if len(self.idle) == 0:
+                    self.stats['created'] += 1
+                    self.stats['in_use'] += 1
+                    break
+                pooled = self.idle.pop()
+            if time.time() - pooled.created > self.pool_recycle:
+                self.discard(pooled)
+                with self.lock:
+                    self.stats['recycled'] += 1
+                continue
+            try:
+                alive = pooled.cnx.is_connected()
+            except mysql.connector.Error:
+                alive = False
+            if not alive:
+                self.discard(pooled)
+                with self.lock:
+                    self.stats['discarded'] += 1
+                continue
+            pooled.released = False
+            with self.lock:
+                self.stats['reused'] += 1
+                self.stats['in_use'] += 1
+            return pooled
+        try:
+            return FGAPIServerDBConnection(self, self.new_connection())
+        except Exception:
+            with self.lock:
+                self.stats['in_use'] -= 1
+            raise
+
+    """
+      release - Give back a connection to the pool; any pending transaction
+                is rolled back so that the next user starts from a clean
+                state. Connections exceeding the pool size are closed
+    """
+
+    def release(self, pooled):
+        try:
+            pooled.cnx.rollback()
+            reusable = time.time() - pooled.created <= self.pool_recycle
+        except mysql.connector.Error:
+            reusable = False
+        with self.lock:
+            if self.pid != os.getpid():
+                return
+            self.stats['in_use'] -= 1
+            if reusable and len(self.idle) < self.pool_size:
+                self.idle.append(pooled)
+                return
+            if reusable:
+                self.stats['overflow'] += 1
+            else:
+                self.stats['recycled'] += 1
+        self.discard(pooled)
+
+    """
+      get_stats - Return pool statistics
+    """
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['idle'] = len(self.idle)
+            stats['pool_size'] = self.pool_size
+            stats['pool_recycle'] = self.pool_recycle
+        return stats
+
+
+def get_db_pool(**kwargs):
+    """
+    Retrieve the connection pool associated to the given connection
+    settings, creating it when it does not exist yet
+
+    :return: The FGAPIServerDBPool object shared by the whole process
+    """
+    pool_key = (kwargs.get('db_host', def_db_host),
+                kwargs.get('db_port', def_db_port),
+                kwargs.get('db_user', def_db_user),
+                kwargs.get('db_name', def_db_name))
+    with db_pools_lock:
+        pool = db_pools.get(pool_key, None)
+        if pool is None:
+            pool = FGAPIServerDBPool(**kwargs)
+            db_pools[pool_key] = pool
+    return pool
+
+
+def evict_session_token(sestoken):
+    """
+    Remove the given session token from the verified tokens cache; this
+    function has to be called each time a token becomes invalid
+
+    :param sestoken: session token
+    :return: True if the token was cached
+    """
+    return session_token_cache.delete(sestoken)
+
+
+def evict_registered_tokens():
+    """
+    Remove any token from the registered tokens cache; this function has
+    to be called each time tokens are removed from fg_token
+
+    :return: None
+    """
+    registered_token_cache.clear()
+
+
+def evict_user_session_tokens(user_id):
+    """
+    Remove from the verified tokens cache any token belonging to the given
+    user; this function has to be called each time a user is disabled
+
+    :param user_id: user id
+    :return: number of evicted tokens
+    """
+    return session_token_cache.delete_if(
+        lambda cached_user: str(cached_user[0]) == str(user_id))
+
+
+"""
+  FGAPIServerDBSessionConnection - Connection shared by any FGAPIServerDB
+                                   call belonging to the same DB session;
+                                   close() just leaves the current call and
+                                   commit() is only honoured by the outermost
+                                   call of non transactional sessions, in
+                                   transactional sessions it is deferred to
+                                   the end of the session
+"""
+
+
+class FGAPIServerDBSessionConnection:
+
+    session = None
+    cnx = None
+    depth = 0
+
+    def __init__(self, session, cnx):
+        self.session = session
+        self.cnx = cnx
+        self.depth = 0
+
+    def __getattr__(self, name):
+        return getattr(self.cnx, name)
+
+    def commit(self):
+        if not self.session.transaction and self.depth <= 1:
+            self.cnx.commit()
+
+    def rollback(self):
+        if self.session.transaction:
+            self.session.failed = True
+        self.cnx.rollback()
+
+    def close(self):
+        if self.depth > 0:
+            self.depth -= 1
+        self.cnx.consume_results()
+
+
+"""
+  FGAPIServerDBSession - Per-thread DB session; the first connect() call
+                         made while the session is active takes a connection
+                         from the pool, further calls reuse it until the
+                         session ends
+"""
+
+
+class FGAPIServerDBSession:
+
+    transaction = False
+    failed = False
+    connections = None
+    cache = None
+
+    def __init__(self, transaction=False):
+        self.transaction = transaction
+        self.failed = False
+        self.connections = {}
+        self.cache = {}
+
+    """
+      connect - Return the session connection for the given pool
+    """
+
+    def connect(self, pool):
+        db = self.connections.get(pool, None)
+        if db is not None:
+            db.depth += 1
+            return db
+        db = FGAPIServerDBSessionConnection(self, pool.acquire())
+        if self.transaction is True:
+            sql = "BEGIN"
+            sql_data = ()
+            cursor = db.cursor()
+            logging.debug(sql % sql_data)
+            cursor.execute(sql)
+            cursor.close()
+        db.depth = 1
+        self.connections[pool] = db
+        return db
+
+    """
+      close - Commit the session transaction if no errors occurred or
+              rollback it otherwise, then give back connections to the pool
+    """
+
+    def close(self, error=None):
+        for pool, db in self.connections.items():
+            try:
+                if self.transaction is True:
+                    if error is None and not self.failed:
+                        db.cnx.commit()
+                    else:
+                        db.cnx.rollback()
+            except mysql.connector.Error as e:
+                logging.error("Unable to close DB session: '%s'" % e)
+            finally:
+                db.cnx.close()
+        self.connections = {}
+
+
+# DB sessions are kept per thread
+db_sessions = threading.local()
+
+
+def begin_db_session(transaction=False):
+    """
+    Start a DB session for the current thread, any FGAPIServerDB call made
+    until end_db_session() will share the same database connection
+
+    :param transaction: When True the whole session is executed as a single
+                        transaction, committed or rolled back at its end
+    :return: The FGAPIServerDBSession object
+    """
+    end_db_session()
+    db_sessions.session = FGAPIServerDBSession(transaction)
+    return db_sessions.session
+
+
+def get_db_session():
+    """
+    Retrieve the DB session of the current thread
+
+    :return: The FGAPIServerDBSession object or None if no session is active
+    """
+    return getattr(db_sessions, 'session', None)
+
+
+def end_db_session(error=None):
+    """
+    Terminate the DB session of the current thread, if any
+
+    :param error: Any error occurred during the session; in transactional
+                  sessions it causes the transaction rollback
+    """
+    session = get_db_session()
+    if session is not None:
+        db_sessions.session = None
+        session.close(error)
+
 
 def get_db(**kwargs):
     """
@@ -85,6 +575,8 @@ def get_db(**kwargs):
     db_user = args.get('db_user', def_db_user)
     db_pass = args.get('db_pass', def_db_pass)
     db_name = args.get('db_name', def_db_name)
+    db_pool_size = args.get('db_pool_size', def_db_pool_size)
+    db_pool_recycle = args.get('db_pool_recycle', def_db_pool_recycle)
     io_sbox = args.get('iosandbbox_dir', def_iosandbbox_dir)
     ge_apid = args.get('iosandbbox_dir', def_geapiserverappid)
     fgapiserver_db = FGAPIServerDB(
@@ -93,6 +585,8 @@ def get_db(**kwargs):
         db_user=db_user,
         db_pass=db_pass,
         db_name=db_name,
+        db_pool_size=db_pool_size,
+        db_pool_recycle=db_pool_recycle,
         iosandbbox_dir=io_sbox,
         fgapiserverappid=ge_apid)
     db_state = fgapiserver_db.get_state()
@@ -126,6 +620,7 @@ class FGAPIServerDB:
     db_user = None
     db_pass = None
     db_name = None
+    db_pool = None
     iosandbbox_dir = def_iosandbbox_dir
     geapiserverappid = def_geapiserverappid
 
@@ -153,6 +648,14 @@ class FGAPIServerDB:
         self.iosandbbox_dir = kwargs.get('iosandbbox_dir', def_iosandbbox_dir)
         self.geapiserverappid = kwargs.get(
             'geapiserverappid', def_geapiserverappid)
+        self.db_pool = get_db_pool(
+            db_host=self.db_host,
+            db_port=self.db_port,
+            db_user=self.db_user,
+            db_pass=self.db_pass,
+            db_name=self.db_name,
+            pool_size=kwargs.get('db_pool_size', def_db_pool_size),
+            pool_recycle=kwargs.get('db_pool_recycle', def_db_pool_recycle))
         logging.debug("[DB settings]\n"
                       " host: '%s'\n"
                       " port: '%s'\n"
@@ -202,6 +705,16 @@ class FGAPIServerDB:
                 db.commit()
             db.close()
 
+    """
+      values_rows - Return the placeholders of a multi-row insert statement
+                    having the given number of rows and columns
+    """
+
+    @staticmethod
+    def values_rows(columns, rows):
+        row = '(%s)' % ','.join(['%s', ] * columns)
+        return '\n      ,'.join([row, ] * rows)
+
     """
       query_done - reset the query error flag and eventually set
                    a given query related message
@@ -214,24 +727,20 @@ class FGAPIServerDB:
                       "%s" % message)
 
     """
-      connect Connects to the fgapiserver database
+      connect Connects to the fgapiserver database; connections are taken
+              from the process connection pool and given back to it by
+              their close() call. While a DB session is active the session
+              connection is returned instead
     """
 
     def connect(self, safe_transaction=False):
-        db = None
-        while db is None:
-            try:
-                db = mysql.connector.connect(
-                    host=self.db_host,
-                    user=self.db_user,
-                    passwd=self.db_pass,
-                    db=self.db_name,
-                    port=self.db_port)
-            except mysql.connector.Error as err:
-                print('Failed to connect to database: \'%s\'' % err)
-                print('Will retry in 5 seconds ...')
-                time.sleep(5)
-
+        session = get_db_session()
+        if session is not None:
+            db = session.connect(self.db_pool)
+            if session.transaction is True or db.depth > 1:
+                return db
+        else:
+            db = self.db_pool.acquire()
         if safe_transaction is True:
             sql = "BEGIN"
             sql_data = ()
@@ -241,6 +750,13 @@ class FGAPIServerDB:
             cursor.close()
         return db
 
+    """
+      get_pool_stats - Return the connection pool statistics
+    """
+
+    def get_pool_stats(self):
+        return self.db_pool.get_stats()
+
     """
      test - DB connection tester function
     """
@@ -381,16 +897,46 @@ class FGAPIServerDB:
         finally:
             self.close_db(db, cursor, safe_transaction)
 
+    """
+      get_srv_hash - Return the configuration hash of the given service
+    """
+
+    def get_srv_hash(self, fgapisrv_uuid):
+        db = None
+        cursor = None
+        safe_transaction = False
+        cfg_hash = None
+        try:
+            db = self.connect(safe_transaction)
+            cursor = db.cursor()
+            sql = ('select cfg_hash srv_hash\n'
+                   'from srv_registry\n'
+                   'where uuid=%s;')
+            sql_data = (fgapisrv_uuid,)
+            logging.debug(sql % sql_data)
+            cursor.execute(sql, sql_data)
+            srv_record = cursor.fetchone()
+            if srv_record:
+                cfg_hash = srv_record[0]
+            self.query_done("Configuration hash of service having "
+                            "uuid: '%s' is '%s'" % (fgapisrv_uuid, cfg_hash))
+        except mysql.connector.Error as e:
+            self.catch_db_error(e, db, safe_transaction)
+        finally:
+            self.close_db(db, cursor, safe_transaction)
+        return cfg_hash
+
     """
       srv_config - returns a dictionary containing configuration settings
                    of the service using its uuid value
     """
 
     def srv_config(self, fgapisrv_uuid):
-        global fg_config
         db = None
         cursor = None
         safe_transaction = False
+        # Database settings are applied to a copy of the configuration
+        srv_config = copy.copy(fg_config)
         try:
             db = self.connect(safe_transaction)
             cursor = db.cursor()
@@ -406,14 +952,14 @@ class FGAPIServerDB:
             for config in cursor:
                 kname = config[0]
                 kvalue = config[1]
-                fg_config[kname] = kvalue
+                srv_config[kname] = kvalue
             self.query_done("Configuration settings for service having "
                             "uuid: '%s' have been retrieved." % fgapisrv_uuid)
         except mysql.connector.Error as e:
             self.catch_db_error(e, db, safe_transaction)
         finally:
             self.close_db(db, cursor, safe_transaction)
-        return fg_config
+        return srv_config
 
     """
       get_state returns the status and message of the last action on the DB
@@ -509,14 +1055,15 @@ class FGAPIServerDB:
         safe_transaction = False
         user_id = ''
         user_name = ''
+        cached_user = session_token_cache.get(sestoken)
+        if cached_user is not None:
+            logging.debug("Session token: '%s' -> cached user: '%s'"
+                          % (sestoken, cached_user))
+            return cached_user
         try:
             db = self.connect(safe_transaction)
             cursor = db.cursor()
-            sql = (
-                'select if((creation+expiry)-now()>0,user_id,NULL) user_id\n'
-                '      ,(select name from fg_user where id=user_id) name\n'
-                'from fg_token\n'
-                'where token=%s;')
+            sql = sql_verify_session_token
             sql_data = (sestoken,)
             logging.debug(sql % sql_data)
             cursor.execute(sql, sql_data)
@@ -524,6 +1071,13 @@ class FGAPIServerDB:
             if user_rec is not None:
                 user_id = user_rec[0]
                 user_name = user_rec[1]
+                # Existing tokens do not need to be registered
+                registered_token_cache.set(sestoken, True)
+                # Only valid tokens are cached, until their expiration
+                if user_id is not None and user_rec[2] is not None:
+                    session_token_cache.set(sestoken,
+                                            (user_id, user_name),
+                                            int(user_rec[2]))
             self.query_done(
                 ("session token: '%s' -> "
                  "user_id='%s', "
@@ -536,6 +1090,173 @@ class FGAPIServerDB:
             self.close_db(db, cursor, safe_transaction)
         return user_id, user_name
 
+    """
+      revoke_session_token - Invalidate the given session token
+    """
+
+    def revoke_session_token(self, sestoken):
+        db = None
+        cursor = None
+        safe_transaction = True
+        try:
+            db = self.connect(safe_transaction)
+            cursor = db.cursor()
+            sql = ('update fg_token set expiry = 0\n'
+                   'where token = %s;')
+            sql_data = (sestoken,)
+            logging.debug(sql % sql_data)
+            cursor.execute(sql, sql_data)
+            self.query_done("session token: '%s' revoked" % sestoken)
+        except mysql.connector.Error as e:
+            self.catch_db_error(e, db, safe_transaction)
+        finally:
+            self.close_db(db, cursor, safe_transaction)
+        evict_session_token(sestoken)
+        return not self.err_flag
+
+    """
+      revoke_signed_token_id - Register the revocation of the signed token
+                               having the given token id (jti) until its
+                               expiration time (seconds since the epoch)
+    """
+
+    def revoke_signed_token_id(self, token_id, expiry):
+        db = None
+        cursor = None
+        safe_transaction = True
+        try:
+            db = self.connect(safe_transaction)
+            cursor = db.cursor()
+            sql = ('insert ignore into fg_token_revoked (token_id, expiry)\n'
+                   'values (%s, from_unixtime(%s));')
+            sql_data = (token_id, expiry)
+            logging.debug(sql % sql_data)
+            cursor.execute(sql, sql_data)
+            self.query_done("signed token: '%s' revoked" % token_id)
+        except mysql.connector.Error as e:
+            self.catch_db_error(e, db, safe_transaction)
+        finally:
+            self.close_db(db, cursor, safe_transaction)
+        return not self.err_flag
+
+    """
+      get_revoked_token_ids - Return the ids of revoked and not yet expired
+                              signed tokens with their expiration time
+                              (token id -> seconds since the epoch)
+    """
+
+    def get_revoked_token_ids(self):
+        db = None
+        cursor = None
+        safe_transaction = False
+        revoked_token_ids = {}
+        try:
+            db = self.connect(safe_transaction)
+            cursor = db.cursor()
+            sql = ('select token_id, unix_timestamp(expiry)\n'
+                   'from fg_token_revoked\n'
+                   'where expiry > now();')
+            sql_data = ()
+            logging.debug(sql % sql_data)
+            cursor.execute(sql)
+            for token_rec in cursor:
+                revoked_token_ids[token_rec[0]] = int(token_rec[1])
+            self.query_done("%s revoked signed tokens"
+                            % len(revoked_token_ids))
+        except mysql.connector.Error as e:
+            self.catch_db_error(e, db, safe_transaction)
+        finally:
+            self.close_db(db, cursor, safe_transaction)
+        return revoked_token_ids
+
+    """
+      delete_expired_tokens - Delete at most batch_size tokens expired since
+                              more than retention seconds; tokens without
+                              expiry (PTV tokens) are considered expired at
+                              their registration time. It returns the number
+                              of deleted tokens
+    """
+
+    def delete_expired_tokens(self, retention, batch_size):
+        db = None
+        cursor = None
+        safe_transaction = True
+        deleted_tokens = 0
+        try:
+            db = self.connect(safe_transaction)
+            cursor = db.cursor()
+            sql = sql_delete_expired_tokens
+            sql_data = (retention, retention, batch_size)
+            logging.debug(sql % sql_data)
+            cursor.execute(sql, sql_data)
+            deleted_tokens = max(cursor.rowcount, 0)
+            self.query_done("%s expired tokens deleted" % deleted_tokens)
+        except mysql.connector.Error as e:
+            self.catch_db_error(e, db, safe_transaction)
+        finally:
+            self.close_db(db, cursor, safe_transaction)
+        return deleted_tokens
+
+    """
+      delete_expired_revocations - Delete at most batch_size revocations of
+                                   expired signed tokens. It returns the
+                                   number of deleted revocations
+    """
+
+    def delete_expired_revocations(self, batch_size):
+        db = None
+        cursor = None
+        safe_transaction = True
+        deleted_revocations = 0
+        try:
+            db = self.connect(safe_transaction)
+            cursor = db.cursor()
+            sql = ('delete from fg_token_revoked\n'
+                   'where expiry <= now()\n'
+                   'limit %s;')
+            sql_data = (batch_size,)
+            logging.debug(sql % sql_data)
+            cursor.execute(sql, sql_data)
+            deleted_revocations = max(cursor.rowcount, 0)
+            self.query_done("%s expired revocations deleted"
+                            % deleted_revocations)
+        except mysql.connector.Error as e:
+            self.catch_db_error(e, db, safe_transaction)
+        finally:
+            self.close_db(db, cursor, safe_transaction)
+        return deleted_revocations
+
+    """
+      get_user_by_credentials - Return the user id and name of the user
+                                having the given credentials or None
+    """
+
+    def get_user_by_credentials(self, username, password):
+        db = None
+        cursor = None
+        safe_transaction = False
+        user_rec = None
+        try:
+            db = self.connect(safe_transaction)
+            cursor = db.cursor()
+            sql = ('select id, name\n'
+                   'from fg_user\n'
+                   'where name=%s\n'
+                   '  and password=sha(%s);')
+            sql_data = (username, password)
+            logging.debug(sql % sql_data)
+            cursor.execute(sql, sql_data)
+            record = cursor.fetchone()
+            if record is not None:
+                user_rec = (record[0], record[1])
+            self.query_done("User '%s' credentials check: %s"
+                            % (username, user_rec is not None))
+        except mysql.connector.Error as e:
+            self.catch_db_error(e, db, safe_transaction)
+        finally:
+            self.close_db(db, cursor, safe_transaction)
+        return user_rec
+
     """
       get_token_info - Retrieve information about a given session token
     """
@@ -595,13 +1316,17 @@ class FGAPIServerDB:
     """
       register_token - Register the incoming and valid token into the token
                        table. This is used by PTV which bypass APIServer
-                       session tokens. The record will be written only once
+                       session tokens. The record will be written only once;
+                       tokens already registered by this process are skipped
     """
 
     def register_token(self, userid, token, subject):
         db = None
         cursor = None
         safe_transaction = True
+        if registered_token_cache.get(token) is not None:
+            self.query_done("token: '%s' already registered" % token)
+            return
         try:
             db = self.connect(safe_transaction)
             cursor = db.cursor()
@@ -621,6 +1346,8 @@ class FGAPIServerDB:
             self.catch_db_error(e, db, safe_transaction)
         finally:
             self.close_db(db, cursor, safe_transaction)
+        if token is not None and not self.err_flag:
+            registered_token_cache.set(token, True)
         return
 
     """
@@ -636,10 +1363,7 @@ class FGAPIServerDB:
             db = self.connect(safe_transaction)
             cursor = db.cursor()
             if token is not None:
-                sql = ('select user_id, subject\n'
-                       'from fg_token\n'
-                       'where token = %s\n'
-                       '  and creation+expiry > now();')
+                sql = sql_user_token
                 sql_data = (token,)
                 logging.debug(sql % sql_data)
                 cursor.execute(sql, sql_data)
@@ -738,44 +1462,59 @@ class FGAPIServerDB:
     """
 
     def verify_user_role(self, user, roles):
-        db = None
-        cursor = None
-        safe_transaction = False
-        result = 1
         user_id = self.user_param_to_user_id(user)
-        for role_name in roles.split(','):
-            try:
-                db = self.connect(safe_transaction)
-                cursor = db.cursor()
-                sql = ('select count(*)>0      \n'
-                       'from fg_user        u  \n'
-                       '    ,fg_group       g  \n'
-                       '    ,fg_user_group ug  \n'
-                       '    ,fg_group_role gr  \n'
-                       '    ,fg_role        r  \n'
-                       'where u.id=%s          \n'
-                       '  and u.enabled = true \n'
-                       '  and u.id=ug.user_id  \n'
-                       '  and g.id=ug.group_id \n'
-                       '  and g.id=gr.group_id \n'
-                       '  and r.id=gr.role_id  \n'
-                       '  and r.name = %s;')
-                sql_data = (user_id, role_name)
-                logging.debug(sql % sql_data)
-                cursor.execute(sql, sql_data)
-                hasrole = cursor.fetchone()[0]
-                result *= hasrole
-            except mysql.connector.Error as e:
-                self.catch_db_error(e, db, safe_transaction)
-                result = 0
-                break
-            finally:
-                self.close_db(db, cursor, safe_transaction)
+        user_roles = self.get_user_roles(user_id)
+        result = not self.err_flag and self.has_user_roles(user_roles, roles)
         self.query_done(
             ("role(s) '%s' for user_id '%s' is %s'" % (roles,
                                                        user_id,
-                                                       result > 0)))
-        return result != 0
+                                                       result)))
+        return result
+
+    """
+      has_user_roles - Verify that the given set of user roles contains
+                       all roles of the given comma separated list of names
+    """
+
+    @staticmethod
+    def has_user_roles(user_roles, roles):
+        return set(roles.split(',')) <= user_roles
+
+    """
+      get_user_roles - Retrieve the set of role names granted to the given
+                       user through its groups; disabled users have no roles.
+                       While a DB session is active the set is retrieved
+                       only once for each user
+    """
+
+    def get_user_roles(self, user):
+        db = None
+        cursor = None
+        safe_transaction = False
+        user_roles = set()
+        user_id = self.user_param_to_user_id(user)
+        session = get_db_session()
+        if session is not None and\
+                ('user_roles', user_id) in session.cache:
+            return session.cache[('user_roles', user_id)]
+        try:
+            db = self.connect(safe_transaction)
+            cursor = db.cursor()
+            sql = sql_user_roles
+            sql_data = (user_id,)
+            logging.debug(sql % sql_data)
+            cursor.execute(sql, sql_data)
+            for role in cursor:
+                user_roles.add(role[0])
+            if session is not None:
+                session.cache[('user_roles', user_id)] = user_roles
+            self.query_done(
+                "Roles for user_id '%s': '%s'" % (user_id, user_roles))
+        except mysql.connector.Error as e:
+            self.catch_db_error(e, db, safe_transaction)
+        finally:
+            self.close_db(db, cursor, safe_transaction)
+        return user_roles
 
     """
       user_param_to_user_id - Retrieve the user id from an user parameter
@@ -1174,164 +1913,219 @@ class FGAPIServerDB:
         return int(task_id) in v_task
 
     """
-       get_task_record - Retrieve the whole task information
+       get_task_version - Retrieve with a single query the task application,
+                          the task owner and the values changing each time
+                          the task record changes: task and newest
+                          runtime_data changes, available files and status.
+                          An empty dictionary is returned for not existing
+                          or PURGED tasks
     """
 
-    def get_task_record(self, task_id):
+    def get_task_version(self, task_id):
         db = None
         cursor = None
         safe_transaction = False
-        task_record = {}
+        task_version = {}
         try:
             db = self.connect(safe_transaction)
             cursor = db.cursor()
-            # Task record
-            sql = (
-                'select '
-                ' id\n'
-                ',status\n'
-                ',date_format(creation, \'%Y-%m-%dT%TZ\') creation\n'
-                ',date_format(last_change, \'%Y-%m-%dT%TZ\') last_change\n'
-                ',app_id\n'
-                ',description\n'
-                ',user\n'
-                ',iosandbox\n'
-                'from task\n'
-                'where id=%s\n'
-                '  and status != \'PURGED\';')
-            sql_data = (task_id,)
-            logging.debug(self.print_sql(sql) % sql_data)
-            cursor.execute(sql, sql_data)
-            task_dbrec = cursor.fetchone()
-            if task_dbrec is not None:
-                task_dicrec = {
-                    "id": str(
-                        task_dbrec[0]),
-                    "status": task_dbrec[1],
-                    "creation": str(task_dbrec[2]),
-                    "last_change": str(task_dbrec[3]),
-                    "application": task_dbrec[4],
-                    "description": task_dbrec[5],
-                    "user": task_dbrec[6],
-                    "iosandbox": task_dbrec[7]}
-            else:
-                self.query_done("Task '%s' not found" % task_id)
-                return {}
-            # Task arguments
-            sql = ('select argument\n'
-                   'from task_arguments\n'
-                   'where task_id=%s\n'
-                   'order by arg_id asc;')
-            sql_data = (task_id,)
-            logging.debug(sql % sql_data)
-            cursor.execute(sql, sql_data)
-            task_args = []
-            for arg in cursor:
-                task_args += [arg[0], ]
-            # Task input files
-            sql = (
-                'select file\n'
-                '      ,if(path is null or length(path)=0,'
-                '          \'NEEDED\','
-                '          \'READY\') status\n'
-                '      ,if(path is NULL,\'\',path)\n'
-                'from task_input_file\n'
-                'where task_id=%s\n'
-                'order by file_id asc;')
-            sql_data = (task_id,)
-            logging.debug(sql % sql_data)
-            cursor.execute(sql, sql_data)
-            task_ifiles = []
-            for ifile in cursor:
-                if ifile[1] == 'NEEDED':
-                    ifile_entry = {
-                        "name": ifile[0],
-                        "status": ifile[1],
-                    }
-                else:
-                    ifile_entry = {
-                        "name": ifile[0],
-                        "status": ifile[1],
-                        "url": 'file?%s'
-                               % urllib.urlencode({"path": ifile[2],
-                                                   "name": ifile[0]}),
-                    }
-                task_ifiles += [ifile_entry, ]
-            # Task output files
-            sql = ('select file\n'
-                   '      ,if(path is NULL,\'\',path)\n'
-                   'from task_output_file\n'
-                   'where task_id=%s\n'
-                   'order by file_id asc;')
+            sql = sql_task_version
             sql_data = (task_id,)
             logging.debug(sql % sql_data)
             cursor.execute(sql, sql_data)
-            task_ofiles = []
-            for ofile in cursor:
-                file_url = ''
-                if ofile[1] != '':
-                    file_url = 'file?%s' % urllib.urlencode({"path": ofile[1],
-                                                             "name": ofile[0]})
-                ofile_entry = {"name": ofile[0],
-                               "url": file_url}
-                task_ofiles += [ofile_entry, ]
-            # runtime_data
-            sql = (
-                'select '
-                '  data_name\n'
-                ' ,data_value\n'
-                ' ,data_desc\n'
-                ' ,data_type\n'
-                ' ,data_proto\n'
-                ' ,date_format(creation,'
-                '              \'%Y-%m-%dT%TZ\') creation\n'
-                ' ,date_format(last_change,'
-                '              \'%Y-%m-%dT%TZ\') last_change\n'
-                'from runtime_data\n'
-                'where task_id=%s\n'
-                'order by data_id asc;')
-            sql_data = (task_id,)
-            logging.debug(self.print_sql(sql) % sql_data)
-            cursor.execute(sql, sql_data)
-            runtime_data = []
-            for rtdata in cursor:
-                rtdata_entry = {
-                    "name": rtdata[0],
-                    "value": rtdata[1],
-                    "description": rtdata[2],
-                    "type": rtdata[3],
-                    "proto": rtdata[4],
-                    "creation": str(
-                        rtdata[5]),
-                    "last_change": str(
-                        rtdata[6])}
-                runtime_data += [rtdata_entry, ]
-            # Prepare output
-            task_record = {
-                "id": str(
-                    task_dicrec['id']),
-                "status": task_dicrec['status'],
-                "creation": str(
-                    task_dicrec['creation']),
-                "last_change": str(
-                    task_dicrec['last_change']),
-                "application": str(
-                    task_dicrec['application']),
-                "description": task_dicrec['description'],
-                "user": task_dicrec['user'],
-                "arguments": task_args,
-                "input_files": task_ifiles,
-                "output_files": task_ofiles,
-                "runtime_data": runtime_data,
-                "iosandbox": task_dicrec['iosandbox']}
+            task_dbrec = cursor.fetchone()
+            if task_dbrec is not None and len(task_dbrec) > 0:
+                task_version = {
+                    'app_id': task_dbrec[0],
+                    'user': task_dbrec[1],
+                    'version': ':'.join([str(field)
+                                         for field in task_dbrec[2:]])}
+            self.query_done(
+                "Task '%s' version: '%s'" % (task_id, task_version))
+        except mysql.connector.Error as e:
+            self.catch_db_error(e, db, safe_transaction)
+        finally:
+            self.close_db(db, cursor, safe_transaction)
+        return task_version
+
+    """
+       get_task_record - Retrieve the whole task information
+    """
+
+    def get_task_record(self, task_id):
+        task_records = self.get_task_records([task_id, ])
+        if len(task_records) == 0:
+            if not self.err_flag:
+                self.query_done("Task '%s' not found" % task_id)
+            return {}
+        return task_records[0]
+
+    """
+       get_task_records - Retrieve the whole information of the given list
+                          of tasks; each task relation is loaded with a
+                          single query for each batch of task ids and task
+                          records are returned in the same order of ids.
+                          Not existing or PURGED tasks are not returned
+    """
+
+    def get_task_records(self, task_ids):
+        db = None
+        cursor = None
+        safe_transaction = False
+        task_records = []
+        try:
+            db = self.connect(safe_transaction)
+            cursor = db.cursor()
+            for batch_start in range(0, len(task_ids), def_task_batch_size):
+                batch_ids = [str(task_id) for task_id in
+                             task_ids[batch_start:
+                                      batch_start + def_task_batch_size]]
+                id_params = ','.join(['%s', ] * len(batch_ids))
+                sql_data = tuple(batch_ids)
+                # Task records
+                sql = (
+                    'select '
+                    ' id\n'
+                    ',status\n'
+                    ',date_format(creation, \'%Y-%m-%dT%TZ\') creation\n'
+                    ',date_format(last_change, \'%Y-%m-%dT%TZ\') last_change\n'
+                    ',app_id\n'
+                    ',description\n'
+                    ',user\n'
+                    ',iosandbox\n'
+                    'from task\n'
+                    'where id in (' + id_params + ')\n'
+                    '  and status != \'PURGED\';')
+                logging.debug(self.print_sql(sql) % sql_data)
+                cursor.execute(sql, sql_data)
+                tasks = {}
+                for task_dbrec in cursor:
+                    tasks[str(task_dbrec[0])] = {
+                        "id": str(task_dbrec[0]),
+                        "status": task_dbrec[1],
+                        "creation": str(task_dbrec[2]),
+                        "last_change": str(task_dbrec[3]),
+                        "application": str(task_dbrec[4]),
+                        "description": task_dbrec[5],
+                        "user": task_dbrec[6],
+                        "arguments": [],
+                        "input_files": [],
+                        "output_files": [],
+                        "runtime_data": [],
+                        "iosandbox": task_dbrec[7]}
+                if len(tasks) == 0:
+                    continue
+                # Task arguments
+                sql = ('select task_id\n'
+                       '      ,argument\n'
+                       'from task_arguments\n'
+                       'where task_id in (' + id_params + ')\n'
+                       'order by task_id asc, arg_id asc;')
+                logging.debug(sql % sql_data)
+                cursor.execute(sql, sql_data)
+                for arg in cursor:
+                    task_record = tasks.get(str(arg[0]), None)
+                    if task_record is not None:
+                        task_record['arguments'] += [arg[1], ]
+                # Task input files
+                sql = (
+                    'select task_id\n'
+                    '      ,file\n'
+                    '      ,if(path is null or length(path)=0,'
+                    '          \'NEEDED\','
+                    '          \'READY\') status\n'
+                    '      ,if(path is NULL,\'\',path)\n'
+                    'from task_input_file\n'
+                    'where task_id in (' + id_params + ')\n'
+                    'order by task_id asc, file_id asc;')
+                logging.debug(sql % sql_data)
+                cursor.execute(sql, sql_data)
+                for ifile in cursor:
+                    task_record = tasks.get(str(ifile[0]), None)
+                    if task_record is None:
+                        continue
+                    if ifile[2] == 'NEEDED':
+                        ifile_entry = {
+                            "name": ifile[1],
+                            "status": ifile[2],
+                        }
+                    else:
+                        ifile_entry = {
+                            "name": ifile[1],
+                            "status": ifile[2],
+                            "url": 'file?%s'
+                                   % urllib.urlencode({"path": ifile[3],
+                                                       "name": ifile[1]}),
+                        }
+                    task_record['input_files'] += [ifile_entry, ]
+                # Task output files
+                sql = ('select task_id\n'
+                       '      ,file\n'
+                       '      ,if(path is NULL,\'\',path)\n'
+                       'from task_output_file\n'
+                       'where task_id in (' + id_params + ')\n'
+                       'order by task_id asc, file_id asc;')
+                logging.debug(sql % sql_data)
+                cursor.execute(sql, sql_data)
+                for ofile in cursor:
+                    task_record = tasks.get(str(ofile[0]), None)
+                    if task_record is None:
+                        continue
+                    file_url = ''
+                    if ofile[2] != '':
+                        file_url = 'file?%s' % urllib.urlencode(
+                            {"path": ofile[2],
+                             "name": ofile[1]})
+                    ofile_entry = {"name": ofile[1],
+                                   "url": file_url}
+                    task_record['output_files'] += [ofile_entry, ]
+                # runtime_data
+                sql = (
+                    'select '
+                    '  task_id\n'
+                    ' ,data_name\n'
+                    ' ,data_value\n'
+                    ' ,data_desc\n'
+                    ' ,data_type\n'
+                    ' ,data_proto\n'
+                    ' ,date_format(creation,'
+                    '              \'%Y-%m-%dT%TZ\') creation\n'
+                    ' ,date_format(last_change,'
+                    '              \'%Y-%m-%dT%TZ\') last_change\n'
+                    'from runtime_data\n'
+                    'where task_id in (' + id_params + ')\n'
+                    'order by task_id asc, data_id asc;')
+                logging.debug(self.print_sql(sql) % sql_data)
+                cursor.execute(sql, sql_data)
+                for rtdata in cursor:
+                    task_record = tasks.get(str(rtdata[0]), None)
+                    if task_record is None:
+                        continue
+                    rtdata_entry = {
+                        "name": rtdata[1],
+                        "value": rtdata[2],
+                        "description": rtdata[3],
+                        "type": rtdata[4],
+                        "proto": rtdata[5],
+                        "creation": str(
+                            rtdata[6]),
+                        "last_change": str(
+                            rtdata[7])}
+                    task_record['runtime_data'] += [rtdata_entry, ]
+                # Keep the same order of the given task ids
+                for task_id in batch_ids:
+                    task_record = tasks.get(task_id, None)
+                    if task_record is not None:
+                        task_records += [task_record, ]
             self.query_done(
-                "Task '%s' record: '%s'" % (task_id,
-                                            task_record))
+                "Retrieved %s task records out of %s task ids"
+                % (len(task_records), len(task_ids)))
         except mysql.connector.Error as e:
             self.catch_db_error(e, db, safe_transaction)
+            task_records = []
         finally:
             self.close_db(db, cursor, safe_transaction)
-        return task_record
+        return task_records
 
     """
       get_task_status - Return the status of a given Task
@@ -1419,92 +2213,101 @@ class FGAPIServerDB:
         try:
             db = self.connect(safe_transaction)
             cursor = db.cursor()
-            sql = (
-                'select id\n'
-                '      ,name\n'
-                '      ,description\n'
-                '      ,outcome\n'
-                '      ,date_format(creation, \'%Y-%m-%dT%TZ\') creation\n'
-                '      ,enabled\n'
-                'from application\n'
-                'where id=%s;')
-            sql_data = (app_id,)
-            logging.debug(self.print_sql(sql) % sql_data)
-            cursor.execute(sql, sql_data)
-            app_record = cursor.fetchone()
-            app_detail = {
+            app_detail = self.load_app_detail(cursor, app_id)
+            self.query_done(
+                "Details for app '%s': '%s'" % (app_id, app_detail))
+        except mysql.connector.Error as e:
+            self.catch_db_error(e, db, safe_transaction)
+        finally:
+            self.close_db(db, cursor, safe_transaction)
+        return app_detail
+
+    """
+      load_app_detail - Return details about a given app_id using the given
+                        cursor; errors are left to the caller
+    """
+
+    def load_app_detail(self, cursor, app_id):
+        sql = (
+            'select id\n'
+            '      ,name\n'
+            '      ,description\n'
+            '      ,outcome\n'
+            '      ,date_format(creation, \'%Y-%m-%dT%TZ\') creation\n'
+            '      ,enabled\n'
+            'from application\n'
+            'where id=%s;')
+        sql_data = (app_id,)
+        logging.debug(self.print_sql(sql) % sql_data)
+        cursor.execute(sql, sql_data)
+        app_record = cursor.fetchone()
+        app_detail = {
+            "id": str(
+                app_record[0]),
+            "name": app_record[1],
+            "description": app_record[2],
+            "outcome": app_record[3],
+            "creation": str(
+                app_record[4]),
+            "enabled": bool(app_record[5])}
+        # Add now app parameters
+        sql = ('select pname\n'
+               '      ,pvalue\n'
+               'from application_parameter\n'
+               'where app_id=%s\n'
+               'order by param_id asc;')
+        sql_data = (app_id,)
+        logging.debug(sql % sql_data)
+        cursor.execute(sql, sql_data)
+        app_parameters = []
+        for param in cursor:
+            parameter = {
+                "param_name": param[0], "param_value": param[1]
+            }
+            app_parameters += [parameter, ]
+        app_detail['parameters'] = app_parameters
+        # Get now application ifnrastructures with their params
+        sql = (
+            'select id\n'
+            '      ,name\n'
+            '      ,description\n'
+            '      ,date_format(creation, \'%Y-%m-%dT%TZ\') creation\n'
+            '      ,if(enabled,\'enabled\',\'disabled\') status\n'
+            '      ,if(vinfra,\'virtual\',\'real\') status\n'
+            'from infrastructure\n'
+            'where app_id=%s;')
+        sql_data = (app_id,)
+        logging.debug(self.print_sql(sql) % sql_data)
+        cursor.execute(sql, sql_data)
+        infrastructures = []
+        for infra in cursor:
+            infra_details = {
                 "id": str(
-                    app_record[0]),
-                "name": app_record[1],
-                "description": app_record[2],
-                "outcome": app_record[3],
+                    infra[0]),
+                "name": infra[1],
+                "description": infra[2],
                 "creation": str(
-                    app_record[4]),
-                "enabled": bool(app_record[5])}
-            # Add now app parameters
-            sql = ('select pname\n'
-                   '      ,pvalue\n'
-                   'from application_parameter\n'
-                   'where app_id=%s\n'
+                    infra[3]),
+                "status": infra[4],
+                "virtual": infra[5]}
+            infrastructures += [infra_details, ]
+        # Now loop over infrastructures to get their parameters
+        for infra in infrastructures:
+            sql = ('select pname, pvalue\n'
+                   'from infrastructure_parameter\n'
+                   'where infra_id=%s\n'
                    'order by param_id asc;')
-            sql_data = (app_id,)
+            sql_data = (str(infra['id']),)
             logging.debug(sql % sql_data)
             cursor.execute(sql, sql_data)
-            app_parameters = []
+            infra_parameters = []
             for param in cursor:
-                parameter = {
-                    "param_name": param[0], "param_value": param[1]
+                param_details = {
+                    "name": param[0], "value": param[1]
                 }
-                app_parameters += [parameter, ]
-            app_detail['parameters'] = app_parameters
-            # Get now application ifnrastructures with their params
-            sql = (
-                'select id\n'
-                '      ,name\n'
-                '      ,description\n'
-                '      ,date_format(creation, \'%Y-%m-%dT%TZ\') creation\n'
-                '      ,if(enabled,\'enabled\',\'disabled\') status\n'
-                '      ,if(vinfra,\'virtual\',\'real\') status\n'
-                'from infrastructure\n'
-                'where app_id=%s;')
-            sql_data = (app_id,)
-            logging.debug(self.print_sql(sql) % sql_data)
-            cursor.execute(sql, sql_data)
-            infrastructures = []
-            for infra in cursor:
-                infra_details = {
-                    "id": str(
-                        infra[0]),
-                    "name": infra[1],
-                    "description": infra[2],
-                    "creation": str(
-                        infra[3]),
-                    "status": infra[4],
-                    "virtual": infra[5]}
-                infrastructures += [infra_details, ]
-            # Now loop over infrastructures to get their parameters
-            for infra in infrastructures:
-                sql = ('select pname, pvalue\n'
-                       'from infrastructure_parameter\n'
-                       'where infra_id=%s\n'
-                       'order by param_id asc;')
-                sql_data = (str(infra['id']),)
-                logging.debug(sql % sql_data)
-                cursor.execute(sql, sql_data)
-                infra_parameters = []
-                for param in cursor:
-                    param_details = {
-                        "name": param[0], "value": param[1]
-                    }
-                    infra_parameters += [param_details, ]
-                infra['parameters'] = infra_parameters
-            app_detail['infrastructures'] = infrastructures
-            self.query_done(
-                "Details for app '%s': '%s'" % (app_id, app_detail))
-        except mysql.connector.Error as e:
-            self.catch_db_error(e, db, safe_transaction)
-        finally:
-            self.close_db(db, cursor, safe_transaction)
+                infra_parameters += [param_details, ]
+            infra['parameters'] = infra_parameters
+        app_detail['infrastructures'] = infrastructures
         return app_detail
 
     """
@@ -1584,6 +2387,10 @@ class FGAPIServerDB:
         app_id = self.app_param_to_app_id(application)
         # Get app defined files
         app_files = self.get_app_files(app_id)
+        if self.err_flag:
+            # Inside a DB session the failure already rolled back the
+            # session transaction, thus the task cannot be created
+            return -1
         logging.debug("Application files for app_id %s are: %s"
                       % (app_id, app_files))
         # Start creating task
@@ -1591,6 +2398,7 @@ class FGAPIServerDB:
         cursor = None
         safe_transaction = True
         task_id = -1
+        task_submitted = None
         try:
             # Create the Task IO Sandbox
             iosandbox = '%s/%s' % (self.iosandbbox_dir, str(uuid.uuid1()))
@@ -1599,46 +2407,39 @@ class FGAPIServerDB:
             # Insert new Task record
             db = self.connect(safe_transaction)
             cursor = db.cursor()
-            sql = ('insert into task (id\n'
-                   '                 ,creation\n'
+            # Task id is assigned by the task table auto_increment
+            sql = ('insert into task (creation\n'
                    '                 ,last_change\n'
                    '                 ,app_id\n'
                    '                 ,description\n'
                    '                 ,status\n'
                    '                 ,user\n'
                    '                 ,iosandbox)\n'
-                   'select if(max(id) is NULL,1,max(id)+1) -- new id\n'
-                   '      ,now()                           -- creation date\n'
-                   '      ,now()                           -- last change\n'
-                   '      ,%s                              -- app_id\n'
-                   '      ,%s                              -- description\n'
-                   '      ,\'WAITING\'                     -- status WAITING\n'
-                   '      ,%s                              -- user\n'
-                   '      ,%s                              -- iosandbox\n'
-                   'from task;\n')
+                   'values (now()      -- creation date\n'
+                   '       ,now()      -- last change\n'
+                   '       ,%s         -- app_id\n'
+                   '       ,%s         -- description\n'
+                   '       ,\'WAITING\'  -- status WAITING\n'
+                   '       ,%s         -- user\n'
+                   '       ,%s         -- iosandbox\n'
+                   '       );')
             sql_data = (app_id, description, user, iosandbox)
             logging.debug(sql % sql_data)
             cursor.execute(sql, sql_data)
-            sql = 'select max(id) from task;'
-            sql_data = ()
-            logging.debug(sql % sql_data)
-            cursor.execute(sql)
-            task_id = cursor.fetchone()[0]
-            # Insert Task arguments
-            if arguments is not []:
-                for arg in arguments:
-                    sql = (
-                        'insert into task_arguments (task_id\n'
-                        '                           ,arg_id\n'
-                        '                           ,argument)\n'
-                        'select %s\n'
-                        '      ,if(max(arg_id) is NULL,1,max(arg_id)+1)\n'
-                        '      ,%s\n'
-                        'from task_arguments\n'
-                        'where task_id=%s')
-                    sql_data = (task_id, arg, task_id)
-                    logging.debug(sql % sql_data)
-                    cursor.execute(sql, sql_data)
+            task_id = cursor.lastrowid
+            # Insert Task arguments; being the task new, argument
+            # ids are just their position in the arguments list
+            if len(arguments) > 0:
+                sql = ('insert into task_arguments (task_id\n'
+                       '                           ,arg_id\n'
+                       '                           ,argument)\n'
+                       'values %s;'
+                       % self.values_rows(3, len(arguments)))
+                sql_data = ()
+                for arg_id, arg in enumerate(arguments, 1):
+                    sql_data += (task_id, arg_id, arg)
+                logging.debug(sql % sql_data)
+                cursor.execute(sql, sql_data)
 
             # Process input files specified in the REST URL (input_files)
             # producing a new vector called task_input_file having the same
@@ -1672,7 +2473,9 @@ class FGAPIServerDB:
                                           "file": input_file['name']}, ]
 
             # Files can be registered in task_input_files
-            for inpfile in app_files + task_input_files:
+            sql_data = ()
+            task_files = app_files + task_input_files
+            for file_id, inpfile in enumerate(task_files, 1):
                 # Not None paths having not empty content refers to an
                 # existing app_file that could be copied into the iosandbox
                 # task directory and path can be modifies with the iosandbox
@@ -1683,18 +2486,17 @@ class FGAPIServerDB:
                         (inpfile['path'], inpfile['file']), '%s/%s' %
                         (iosandbox, inpfile['file']))
                     inpfile['path'] = iosandbox
-                sql = (
-                    'insert into task_input_file (task_id\n'
-                    '                            ,file_id\n'
-                    '                            ,path\n'
-                    '                            ,file)\n'
-                    'select %s\n'
-                    '      ,if(max(file_id) is NULL,1,max(file_id)+1)\n'
-                    '      ,%s\n'
-                    '      ,%s\n'
-                    'from task_input_file\n'
-                    'where task_id=%s')
-                sql_data = (task_id, inpfile['path'], inpfile['file'], task_id)
+                sql_data += (task_id,
+                             file_id,
+                             inpfile['path'],
+                             inpfile['file'])
+            if len(task_files) > 0:
+                sql = ('insert into task_input_file (task_id\n'
+                       '                            ,file_id\n'
+                       '                            ,path\n'
+                       '                            ,file)\n'
+                       'values %s;'
+                       % self.values_rows(4, len(task_files)))
                 logging.debug(sql % sql_data)
                 cursor.execute(sql, sql_data)
             # Insert Task output_files specified by application settings
@@ -1710,19 +2512,59 @@ class FGAPIServerDB:
             for out_file in cursor:
                 output_files += [{"name": out_file[0]}, ]
             # Insert Task output_files specified by user
-            for outfile in output_files:
-                sql = (
-                    'insert into task_output_file (task_id\n'
-                    '                             ,file_id\n'
-                    '                             ,file)\n'
-                    'select %s\n'
-                    '      ,if(max(file_id) is NULL,1,max(file_id)+1)\n'
-                    '      ,%s\n'
-                    'from task_output_file\n'
-                    'where task_id=%s')
-                sql_data = (task_id, outfile['name'], task_id)
+            if len(output_files) > 0:
+                sql = ('insert into task_output_file (task_id\n'
+                       '                             ,file_id\n'
+                       '                             ,file)\n'
+                       'values %s;'
+                       % self.values_rows(3, len(output_files)))
+                sql_data = ()
+                for file_id, outfile in enumerate(output_files, 1):
+                    sql_data += (task_id, file_id, outfile['name'])
                 logging.debug(sql % sql_data)
                 cursor.execute(sql, sql_data)
+            # Accordingly to specs: input_files -
+            # If omitted the task is immediately ready to start
+            # When the input sandbox is already complete and it consists
+            # only of overridden files (or no files at all), the task is
+            # enqueued within this same transaction using the data already
+            # available here instead of reloading it from the database
+            sandbox_ready = True
+            for inpfile in task_files:
+                if inpfile['path'] is None:
+                    sandbox_ready = False
+                    break
+            overridden_sandbox = True
+            for app_file in app_files:
+                if not app_file['override']:
+                    overridden_sandbox = False
+                    break
+            if sandbox_ready and overridden_sandbox:
+                task_submitted = False
+                # Application details are loaded inside this transaction,
+                # so that any failure also aborts the task creation
+                app_info = self.load_app_detail(cursor, app_id)
+                if self.check_task_submission(task_id, 'WAITING', app_info):
+                    task_info = self.new_task_info(cursor,
+                                                   task_id,
+                                                   app_info,
+                                                   description,
+                                                   user,
+                                                   arguments,
+                                                   task_files,
+                                                   output_files,
+                                                   iosandbox)
+                    self.queue_task_request(cursor, task_info)
+                    task_submitted = True
+                else:
+                    logging.debug("Unable to submit taks: '%s'"
+                                  % self.err_msg)
+            elif sandbox_ready:
+                task_submitted = False
+                logging.debug("Task %s needs to finalize its input sandbox"
+                              % task_id)
+            else:
+                task_submitted = False
             self.query_done(
                 "Task successfully inserted with id: '%s'" % task_id)
         except IOError as xxx_todo_changeme:
@@ -1731,11 +2573,14 @@ class FGAPIServerDB:
             self.err_msg = "I/O error({0}): {1}".format(errno, strerror)
         except mysql.connector.Error as e:
             self.catch_db_error(e, db, safe_transaction)
+            task_id = -1
         finally:
             self.close_db(db, cursor, safe_transaction)
 
-        # Accordingly to specs: input_files -
-        # If omitted the task is immediately ready to start
+        # The task has been already processed by the fast submission path
+        if task_submitted is not None:
+            return task_id
+
         # If the inputsandbox is ready the job will be triggered for execution
         if self.is_input_sandbox_ready(task_id):
             # The input_sandbox is completed; trigger the Executor for this
@@ -1802,6 +2647,45 @@ class FGAPIServerDB:
         finally:
             self.close_db(db, cursor, safe_transaction)
 
+    """
+      get_task_output_paths - Return the list of (task_id, file, path) of
+                              the available output files of the given list
+                              of tasks
+    """
+
+    def get_task_output_paths(self, task_ids):
+        db = None
+        cursor = None
+        safe_transaction = False
+        output_paths = []
+        try:
+            db = self.connect(safe_transaction)
+            cursor = db.cursor()
+            for batch_start in range(0, len(task_ids), def_task_batch_size):
+                batch_ids = [str(task_id) for task_id in
+                             task_ids[batch_start:
+                                      batch_start + def_task_batch_size]]
+                id_params = ','.join(['%s', ] * len(batch_ids))
+                sql = ('select task_id\n'
+                       '      ,file\n'
+                       '      ,path\n'
+                       'from task_output_file\n'
+                       'where task_id in (' + id_params + ')\n'
+                       '  and path is not null\n'
+                       'order by task_id asc, file_id asc;')
+                sql_data = tuple(batch_ids)
+                logging.debug(sql % sql_data)
+                cursor.execute(sql, sql_data)
+                for ofile in cursor:
+                    output_paths += [(str(ofile[0]), ofile[1], ofile[2]), ]
+            self.query_done(
+                "Output files of tasks '%s': '%s'" % (task_ids, output_paths))
+        except mysql.connector.Error as e:
+            self.catch_db_error(e, db, safe_transaction)
+        finally:
+            self.close_db(db, cursor, safe_transaction)
+        return output_paths
+
     """
       get_task_io_sandbox - Get the assigned IO Sandbox folder of the
                             given task_id
@@ -1860,6 +2744,36 @@ class FGAPIServerDB:
             self.close_db(db, cursor, safe_transaction)
         return
 
+    """
+      update_input_sandbox_files - Update input_sandbox_table with the path
+                                   of the given list of files of a given
+                                   task_id in a single transaction
+    """
+
+    def update_input_sandbox_files(self, task_id, filenames, filepath):
+        db = None
+        cursor = None
+        safe_transaction = True
+        try:
+            db = self.connect(safe_transaction)
+            cursor = db.cursor()
+            sql = ('update task_input_file\n'
+                   'set path=%s\n'
+                   'where task_id=%s\n'
+                   '  and file=%s;')
+            for filename in filenames:
+                sql_data = (filepath, task_id, filename)
+                logging.debug(sql % sql_data)
+                cursor.execute(sql, sql_data)
+            self.query_done(
+                "input sandbox for task '%s' successfully updated with "
+                "files: '%s'" % (task_id, filenames))
+        except mysql.connector.Error as e:
+            self.catch_db_error(e, db, safe_transaction)
+        finally:
+            self.close_db(db, cursor, safe_transaction)
+        return not self.err_flag
+
     """
       is_input_sandbox_ready - Return true if all input_sandbox files have been
                                uploaded for a given (task_id)
@@ -1903,7 +2817,25 @@ class FGAPIServerDB:
         # Get task information
         task_info = self.get_task_info(task_id)
         app_info = task_info['application']
-        app_params = app_info['parameters']
+        if not self.check_task_submission(task_id,
+                                          task_info.get('status', ''),
+                                          app_info):
+            return False
+        # All checks have been done, it is possible to enqueue the Task request
+        return self.enqueue_task_request(task_info)
+
+    """
+      check_task_submission - Verify that the given task having the given
+                              status and application information can be
+                              submitted
+    """
+
+    def check_task_submission(self, task_id, task_status, app_info):
+        if app_info is None or len(app_info) == 0:
+            self.err_flag = True
+            self.err_msg = ('No application found for task_id: %s'
+                            % task_id)
+            return False
         # Retrieve only enabled infrastructures
         app_infras = ()
         for infra in app_info['infrastructures']:
@@ -1915,7 +2847,6 @@ class FGAPIServerDB:
                             % task_id)
             return False
         # Proceed only if task comes form a WAITING state
-        task_status = task_info.get('status', '')
         if task_status != 'WAITING':
             self.err_flag = True
             self.err_msg = ('Wrong status (\'%s\') '
@@ -1938,8 +2869,63 @@ class FGAPIServerDB:
             self.err_msg = ('No suitable infrastructures found for task_id: %s'
                             % task_id)
             return False
-        # All checks have been done, it is possible to enqueue the Task request
-        return self.enqueue_task_request(task_info)
+        return True
+
+    """
+      new_task_info - Build the task information of a task being created,
+                      as returned by get_task_info, from the data available
+                      at its creation time; only creation and last change
+                      dates are taken from the database
+    """
+
+    def new_task_info(self,
+                      cursor,
+                      task_id,
+                      app_info,
+                      description,
+                      user,
+                      arguments,
+                      input_files,
+                      output_files,
+                      iosandbox):
+        sql = ('select date_format(creation, \'%Y-%m-%dT%TZ\') creation\n'
+               '      ,date_format(last_change,'
+               '                   \'%Y-%m-%dT%TZ\') last_change\n'
+               'from task\n'
+               'where id=%s;')
+        sql_data = (task_id,)
+        logging.debug(self.print_sql(sql) % sql_data)
+        cursor.execute(sql, sql_data)
+        task_dates = cursor.fetchone()
+        task_ifiles = []
+        for ifile in input_files:
+            if ifile['path'] is None or len(ifile['path']) == 0:
+                task_ifiles += [{"name": ifile['file'],
+                                 "status": 'NEEDED'}, ]
+            else:
+                task_ifiles += [{"name": ifile['file'],
+                                 "status": 'READY',
+                                 "url": 'file?%s'
+                                        % urllib.urlencode(
+                                            {"path": ifile['path'],
+                                             "name": ifile['file']})}, ]
+        task_ofiles = []
+        for ofile in output_files:
+            task_ofiles += [{"name": ofile['name'],
+                             "url": ''}, ]
+        return {
+            "id": str(task_id),
+            "status": 'WAITING',
+            "creation": str(task_dates[0]),
+            "last_change": str(task_dates[1]),
+            "application": app_info,
+            "description": description,
+            "user": user,
+            "arguments": list(arguments),
+            "input_files": task_ifiles,
+            "output_files": task_ofiles,
+            "runtime_data": [],
+            "iosandbox": iosandbox}
 
     """
       enqueue_task_request - Place a request into the queue
@@ -1950,77 +2936,128 @@ class FGAPIServerDB:
         cursor = None
         safe_transaction = True
         self.err_flag = False
-        as_file = None
         try:
-            # Save native APIServer JSON file, having the format:
-            # <task_iosandbox_dir>/<task_id>.json
-            as_file = open('%s/%s.json' %
-                           (task_info['iosandbox'], task_info['id']), "w")
-            as_file.write(json.dumps(task_info))
-            # Determine the application target executor (default GridEngine)
-            target_executor = 'GridEngine'
-            for app_param in task_info['application']['parameters']:
-                if app_param['param_name'] == 'target_executor':
-                    target_executor = app_param['param_value']
-                    break
-            try:
-                # Insert task record in the APIServerDaemon' queue
-                db = self.connect(safe_transaction)
-                cursor = db.cursor()
-                sql = (
-                    'insert into as_queue (\n'
-                    '   task_id       \n'
-                    '  ,target_id     \n'
-                    '  ,target        \n'
-                    '  ,action        \n'
-                    '  ,status        \n'
-                    '  ,target_status \n'
-                    '  ,creation      \n'
-                    '  ,last_change   \n'
-                    '  ,check_ts      \n'
-                    '  ,action_info   \n'
-                    ') values (%s,\n'
-                    '          NULL,\n'
-                    '          %s,\n'
-                    '          \'SUBMIT\',\n'
-                    '          \'QUEUED\',\n'
-                    '          NULL,\n'
-                    '          now(),\n'
-                    '          now(),\n'
-                    '          now(),\n'
-                    '          %s);')
-                sql_data = (task_info['id'],
-                            target_executor, task_info['iosandbox'])
-                logging.debug(sql % sql_data)
-                cursor.execute(sql, sql_data)
-                sql = (
-                    'update task set status=\'SUBMIT\', \n'
-                    'last_change=now() where id=%s;')
-                sql_data = (str(task_info['id']),)
-                logging.debug(sql % sql_data)
-                cursor.execute(sql, sql_data)
-                self.query_done(
-                    "Task '%s' enqueued successfully" % task_info)
-            except mysql.connector.Error as e:
-                self.catch_db_error(e, db, safe_transaction)
-            finally:
-                self.close_db(db, cursor, safe_transaction)
-                if as_file is not None:
-                    as_file.close()
+            # Insert task record in the APIServerDaemon' queue
+            db = self.connect(safe_transaction)
+            cursor = db.cursor()
+            self.queue_task_request(cursor, task_info)
+            self.query_done(
+                "Task '%s' enqueued successfully" % task_info)
         except IOError as e:
             (errno, strerror) = e.args
             self.err_flag = True
             self.err_msg = "I/O error({0}): {1}".format(errno, strerror)
+        except mysql.connector.Error as e:
+            self.catch_db_error(e, db, safe_transaction)
         finally:
-            if as_file is not None:
-                as_file.close()
+            self.close_db(db, cursor, safe_transaction)
         return not self.err_flag
 
+    """
+      queue_task_request - Save the task information file and place the task
+                           request into the queue using the given cursor;
+                           errors are left to the caller
+    """
+
+    def queue_task_request(self, cursor, task_info):
+        # Save native APIServer JSON file, having the format:
+        # <task_iosandbox_dir>/<task_id>.json
+        with open('%s/%s.json' % (task_info['iosandbox'],
+                                  task_info['id']), "w") as as_file:
+            as_file.write(json.dumps(task_info))
+        # Determine the application target executor (default GridEngine)
+        target_executor = 'GridEngine'
+        for app_param in task_info['application']['parameters']:
+            if app_param['param_name'] == 'target_executor':
+                target_executor = app_param['param_value']
+                break
+        sql = (
+            'insert into as_queue (\n'
+            '   task_id       \n'
+            '  ,target_id     \n'
+            '  ,target        \n'
+            '  ,action        \n'
+            '  ,status        \n'
+            '  ,target_status \n'
+            '  ,creation      \n'
+            '  ,last_change   \n'
+            '  ,check_ts      \n'
+            '  ,action_info   \n'
+            ') values (%s,\n'
+            '          NULL,\n'
+            '          %s,\n'
+            '          \'SUBMIT\',\n'
+            '          \'QUEUED\',\n'
+            '          NULL,\n'
+            '          now(),\n'
+            '          now(),\n'
+            '          now(),\n'
+            '          %s);')
+        sql_data = (task_info['id'],
+                    target_executor, task_info['iosandbox'])
+        logging.debug(sql % sql_data)
+        cursor.execute(sql, sql_data)
+        sql = (
+            'update task set status=\'SUBMIT\', \n'
+            'last_change=now() where id=%s;')
+        sql_data = (str(task_info['id']),)
+        logging.debug(sql % sql_data)
+        cursor.execute(sql, sql_data)
+
+    """
+      task_list_filter - Build the where clause and its data selecting the
+                         tasks belonging to a user and/or app_id and/or
+                         having the given status
+    """
+
+    @staticmethod
+    def task_list_filter(user, app_id, status):
+        app_clause = ''
+        status_clause = ''
+        sql_data = ()
+        user_filter = user[0]
+        if user_filter == '*':
+            user_clause = ''
+        elif user_filter == '@':
+            user_name = user[1:]
+            user_clause = (
+                '  and user in (select distinct(u.name)      \n'
+                '               from fg_user        u        \n'
+                '                  , fg_group       g        \n'
+                '                  , fg_user_group ug        \n'
+                '               where u.id=ug.user_id        \n'
+                '                 and g.id=ug.group_id       \n'
+                '                 and g.id in                \n'
+                '                   (select g.id             \n'
+                '                    from fg_user_group ug   \n'
+                '                        ,fg_user        u   \n'
+                '                        ,fg_group       g   \n'
+                '                     where ug.user_id=u.id  \n'
+                '                       and ug.group_id=g.id \n'
+                '                       and u.name=%s))')
+            sql_data += (user_name,)
+        else:
+            user_name = user
+            user_clause = '  and user = %s\n'
+            sql_data += (user_name,)
+        if app_id is not None:
+            app_clause = '  and app_id = %s\n'
+            sql_data += (app_id,)
+        if status is not None:
+            status_clause = '  and status = %s\n'
+            sql_data += (status,)
+        return user_clause + app_clause + status_clause, sql_data
+
     """
       get_task_list - Get the list of tasks associated to a user and/or app_id
+                      and/or status; optional limit and offset values select
+                      a page of the task list ordered by descending task id,
+                      while the after value (keyset cursor) selects only the
+                      tasks preceding the given task id in the same order
     """
 
-    def get_task_list(self, user, application):
+    def get_task_list(self, user, application,
+                      status=None, limit=None, offset=None, after=None):
         db = None
         cursor = None
         safe_transaction = False
@@ -2028,45 +3065,24 @@ class FGAPIServerDB:
         app_id = self.app_param_to_app_id(application)
         try:
             # Get Task ids preparing the right query (user/*,@
-            # wildcards/app_id)
+            # wildcards/app_id/status)
             db = self.connect(safe_transaction)
             cursor = db.cursor()
-            app_clause = ''
-            sql_data = ()
-            user_filter = user[0]
-            if user_filter == '*':
-                user_clause = ''
-            elif user_filter == '@':
-                user_name = user[1:]
-                user_clause = (
-                    '  and user in (select distinct(u.name)      \n'
-                    '               from fg_user        u        \n'
-                    '                  , fg_group       g        \n'
-                    '                  , fg_user_group ug        \n'
-                    '               where u.id=ug.user_id        \n'
-                    '                 and g.id=ug.group_id       \n'
-                    '                 and g.id in                \n'
-                    '                   (select g.id             \n'
-                    '                    from fg_user_group ug   \n'
-                    '                        ,fg_user        u   \n'
-                    '                        ,fg_group       g   \n'
-                    '                     where ug.user_id=u.id  \n'
-                    '                       and ug.group_id=g.id \n'
-                    '                       and u.name=%s))')
-                sql_data += (user_name,)
+            task_clause, sql_data = self.task_list_filter(user,
+                                                          app_id,
+                                                          status)
+            if after is not None:
+                task_clause += '  and id < %s\n'
+                sql_data += (int(after),)
+            if limit is not None and offset is not None:
+                limit_clause = '\nlimit %s offset %s'
+                sql_data += (int(limit), int(offset))
+            elif limit is not None:
+                limit_clause = '\nlimit %s'
+                sql_data += (int(limit),)
             else:
-                user_name = user
-                user_clause = '  and user = %s\n'
-                sql_data += (user_name,)
-            if app_id is not None:
-                app_clause = '  and app_id = %s\n'
-                sql_data += (app_id,)
-            sql = ('select id\n'
-                   'from task\n'
-                   'where status != \'PURGED\'\n'
-                   '%s%s'
-                   'order by id desc;'
-                   ) % (user_clause, app_clause)
+                limit_clause = ''
+            sql = sql_task_list % (task_clause, limit_clause)
             logging.debug(sql % sql_data)
             cursor.execute(sql, sql_data)
             for task_id in cursor:
@@ -2081,6 +3097,37 @@ class FGAPIServerDB:
             self.close_db(db, cursor, safe_transaction)
         return task_ids
 
+    """
+      get_task_count - Count the tasks associated to a user and/or app_id
+                       and/or status
+    """
+
+    def get_task_count(self, user, application, status=None):
+        db = None
+        cursor = None
+        safe_transaction = False
+        task_count = 0
+        app_id = self.app_param_to_app_id(application)
+        try:
+            db = self.connect(safe_transaction)
+            cursor = db.cursor()
+            task_clause, sql_data = self.task_list_filter(user,
+                                                          app_id,
+                                                          status)
+            sql = sql_task_count % task_clause
+            logging.debug(sql % sql_data)
+            cursor.execute(sql, sql_data)
+            task_count = int(cursor.fetchone()[0])
+            self.query_done(
+                "Task count for user '%s', app '%s': '%s'" % (user,
+                                                              app_id,
+                                                              task_count))
+        except mysql.connector.Error as e:
+            self.catch_db_error(e, db, safe_transaction)
+        finally:
+            self.close_db(db, cursor, safe_transaction)
+        return task_count
+
     """
       delete - Delete a given task
     """
@@ -2283,13 +3330,7 @@ class FGAPIServerDB:
         try:
             db = self.connect(safe_transaction)
             cursor = db.cursor(buffered=True)
-            sql = ('select task_id from task_output_file\n'
-                   'where file=%s and path=%s\n'
-                   'union all\n'
-                   'select task_id from task_input_file\n'
-                   'where file=%s and path=%s\n'
-                   'union all\n'
-                   'select null;')
+            sql = sql_file_task_id
             sql_data = (file_name, file_path, file_name, file_path)
             logging.debug(sql % sql_data)
             cursor.execute(sql, sql_data)
@@ -2506,6 +3547,57 @@ class FGAPIServerDB:
             self.close_db(db, cursor, safe_transaction)
         return count > 0
 
+    """
+      get_app_version - Return the version of the given application or None
+                        if the application does not exist; the version is
+                        increased each time the application record changes
+    """
+
+    def get_app_version(self, application):
+        db = None
+        cursor = None
+        safe_transaction = False
+        app_version = None
+        app_id = self.app_param_to_app_id(application)
+        try:
+            db = self.connect(safe_transaction)
+            cursor = db.cursor()
+            sql = ('select version\n'
+                   'from application\n'
+                   'where id = %s;')
+            sql_data = (app_id,)
+            logging.debug(sql % sql_data)
+            cursor.execute(sql, sql_data)
+            app_dbrec = cursor.fetchone()
+            if app_dbrec is not None and len(app_dbrec) > 0:
+                app_version = app_dbrec[0]
+            self.query_done(
+                "App \'%s\' version is %s" % (app_id, app_version))
+        except mysql.connector.Error as e:
+            self.catch_db_error(e, db, safe_transaction)
+        finally:
+            self.close_db(db, cursor, safe_transaction)
+        return app_version
+
+    """
+      update_app_version - Increase the version of the given application or
+                           of the applications using the given infrastructure
+                           inside the caller transaction
+    """
+
+    def update_app_version(self, cursor, app_id=None, infra_id=None):
+        if infra_id is not None:
+            sql = ('update application set version=version+1\n'
+                   'where id in (select app_id\n'
+                   '             from infrastructure\n'
+                   '             where id=%s);')
+            sql_data = (infra_id,)
+        else:
+            sql = 'update application set version=version+1 where id=%s;'
+            sql_data = (app_id,)
+        logging.debug(sql % sql_data)
+        cursor.execute(sql, sql_data)
+
     """
       get_app_list - Get the list of applications
     """
@@ -2975,6 +4067,7 @@ class FGAPIServerDB:
                 sql_data = (app_id, file_name, file_path, app_id)
             logging.debug(sql % sql_data)
             cursor.execute(sql, sql_data)
+            self.update_app_version(cursor, app_id=app_id)
             self.query_done(
                 "insert or update of file '%s/%s' for app '%s'" % (file_path,
                                                                    file_name,
@@ -3392,6 +4485,7 @@ class FGAPIServerDB:
                 sql_data = (app_id,)
                 logging.debug(sql % sql_data)
                 cursor.execute(sql, sql_data)
+                self.update_app_version(cursor, app_id=app_id)
                 result = True
             else:
                 #
@@ -3429,6 +4523,7 @@ class FGAPIServerDB:
                 sql_data = (infra_id,)
                 logging.debug(sql % sql_data)
                 cursor.execute(sql, sql_data)
+                self.update_app_version(cursor, infra_id=infra_id)
                 #
                 # (!) In the future here should be handled the
                 #     infrastructure_task table
@@ -3475,6 +4570,7 @@ class FGAPIServerDB:
                         infra_id)
             logging.debug(sql % sql_data)
             cursor.execute(sql, sql_data)
+            self.update_app_version(cursor, infra_id=infra_id)
             # Now remove any existing parameter
             json_params = infra_desc.get('parameters', None)
             if json_params is not None:
@@ -3539,7 +4635,8 @@ class FGAPIServerDB:
                 '    name=%s,\n'
                 '    description=%s,\n'
                 '    outcome=%s,\n'
-                '    enabled=%s\n'
+                '    enabled=%s,\n'
+                '    version=version+1\n'
                 'where id=%s;')
             sql_data = (app_desc['name'],
                         app_desc['description'],
@@ -4664,41 +5761,42 @@ class FGAPIServerDB:
     """
       user_tasks_retrieve - Retrieve ids of user tasks from database and
                             optionally an application name or id to filter
-                            output
+                            output; optional limit and after values select
+                            a page of tasks preceding the given task id
     """
 
-    def user_tasks_retrieve(self, user, application):
+    def user_tasks_retrieve(self, user, application, limit=None, after=None):
         db = None
         cursor = None
         safe_transaction = False
         tasks = []
         user_id = self.user_param_to_user_id(user)
         app_id = self.app_param_to_app_id(application)
-        sql, sql_data = (), ()
-
+        sql_data = (user_id,)
+        app_clause = ''
         if app_id is not None:
-            sql = ('select t.id\n'
-                   'from task t,\n'
-                   '     fg_user u,\n'
-                   '     application a\n'
-                   'where u.id=%s\n'
-                   '  and a.id=%s\n'
-                   '  and t.status != \'PURGED\'\n'
-                   '  and t.user=u.name\n'
-                   '  and t.app_id=a.id\n'
-                   'order by t.id desc;')
-            sql_data = (user_id, app_id)
-        else:
-            sql = ('select t.id\n'
-                   'from task t,\n'
-                   '     fg_user u,\n'
-                   '     application a\n'
-                   'where u.id=%s\n'
-                   '  and t.status != \'PURGED\'\n'
-                   '  and t.user=u.name\n'
-                   '  and t.app_id=a.id\n'
-                   'order by t.id desc;')
-            sql_data = (user_id)
+            app_clause = '  and a.id=%s\n'
+            sql_data += (app_id,)
+        after_clause = ''
+        if after is not None:
+            after_clause = '  and t.id < %s\n'
+            sql_data += (int(after),)
+        limit_clause = ''
+        if limit is not None:
+            limit_clause = '\nlimit %s'
+            sql_data += (int(limit),)
+        sql = ('select t.id\n'
+               'from task t,\n'
+               '     fg_user u,\n'
+               '     application a\n'
+               'where u.id=%%s\n'
+               '%s'
+               '  and t.status != \'PURGED\'\n'
+               '  and t.user=u.name\n'
+               '  and t.app_id=a.id\n'
+               '%s'
+               'order by t.id desc%s;'
+               ) % (app_clause, after_clause, limit_clause)
 
         try:
             db = self.connect(safe_transaction)
@@ -4706,7 +5804,7 @@ class FGAPIServerDB:
             logging.debug(sql % sql_data)
             cursor.execute(sql, sql_data)
             for task in cursor:
-                tasks += [task, ]
+                tasks += [task[0], ]
             self.query_done(
                 "Tasks for user '%s': %s" % (user_id, tasks))
         except mysql.connector.Error as e:
@@ -35,6 +35,7 @@ create table application (
    ,outcome      varchar(32)  not null                -- Application outcome (JOB,RESOURCE,...)
    ,creation     datetime                             -- Application creation timestamp
    ,enabled      boolean default false                -- Enabled application flag
+   ,version      int unsigned not null default 0      -- Application record version
    ,primary key(id)
 );
 
@@ -167,6 +168,8 @@ create table task (
     ,user         varchar(256) not null -- username submitting the task
     ,primary key(id)
     ,foreign key (app_id) references application(id)
+    ,index idx_task_user_status (user,status,id)
+    ,index idx_task_app (app_id)
 );
 
 -- Task arguments
@@ -186,6 +189,7 @@ create table task_input_file (
     ,path         varchar(256) default null   -- the absolute path to the file
     ,primary key(task_id,file_id)
     ,foreign key (task_id) references task(id)
+    ,index idx_task_input_file_path (path,file)
 );
 
 -- Task output file
@@ -196,6 +200,7 @@ create table task_output_file (
     ,path         varchar(256) default null   -- the absolute path to the file
     ,primary key(task_id,file_id)
     ,foreign key (task_id) references task(id)
+    ,index idx_task_output_file_path (path,file)
 );
 
 -- Runtime data
@@ -346,6 +351,7 @@ create table fg_user_group (
    ,creation    datetime     not null -- when association has been done
    ,foreign key (user_id) references fg_user(id)
    ,foreign key (group_id) references fg_group(id)
+   ,index idx_fg_user_group_user (user_id)
 );
 
 -- UserGroups baseline values
@@ -406,6 +412,16 @@ create table fg_token (
    ,user_id  int unsigned  not null -- the associated user
    ,creation datetime      not null -- when token has been created
    ,expiry   integer                -- number of seconds of validity (default 24 hours)
+   ,index idx_fg_token_token (token(255))
+   ,index idx_fg_token_creation (creation)
+);
+
+-- Revoked signed tokens; revocations are kept until tokens expiration
+create table fg_token_revoked (
+    token_id varchar(32)   not null -- signed token id (jti)
+   ,expiry   datetime      not null -- signed token expiration time
+   ,primary key(token_id)
+   ,index idx_fg_token_revoked_expiry (expiry)
 );
 
 --
@@ -513,4 +529,4 @@ create table db_patches (
 );
 
 -- Default value for baseline setup (this script)
-insert into db_patches (id,version,name,file,applied) values (1,'0.0.13','baseline setup','../fgapiserver_db.sql',now());
\ No newline at end of file
+insert into db_patches (id,version,name,file,applied) values (1,'0.0.16','baseline setup','../fgapiserver_db.sql',now());
\ No newline at end of file
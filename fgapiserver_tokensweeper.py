@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# Copyright (c) 2015:
+# Istituto Nazionale di Fisica Nucleare (INFN), Italy
+#
+# See http://www.infn.it  for details on the copyrigh holder
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import time
+import atexit
+import argparse
+import threading
+import logging
+from fgapiserver_tools import fg_config, get_fgapiserver_db
+from fgapiserver_db import evict_registered_tokens
+
+"""
+  FutureGateway APIServer fg_token expiry sweeper
+
+  Expired tokens are removed from the fg_token table in small batches,
+  each one in its own transaction, so that the table is never locked
+  for long. The sweeper may run inside the server process as a daemon
+  thread (see fgapisrv_tokensweep_period) or from the command line, i.e.:
+
+    python fgapiserver_tokensweeper.py --retention 86400
+"""
+__author__ = 'Riccardo Bruno'
+__copyright__ = '2019'
+__license__ = 'Apache'
+__version__ = 'v0.0.10.1'
+__maintainer__ = 'Riccardo Bruno'
+__email__ = 'riccardo.bruno@ct.infn.it'
+__status__ = 'devel'
+__update__ = '2019-10-18 15:19:14'
+
+"""
+ Sweeper default settings
+"""
+def_batch_pause = 0.1  # Seconds between two deletion batches
+
+# The process wide sweeper thread
+token_sweeper = [None]
+token_sweeper_lock = threading.Lock()
+
+
+def sweep_batches(fgapisrv_db, delete_batch, batch_size, batch_pause):
+    """
+    Call the given deletion function until it removes less than batch_size
+    records or a database error occurs
+
+    :param fgapisrv_db: fgAPIServer database object
+    :param delete_batch: function deleting a batch, returns deleted records
+    :param batch_size: records removed by each batch
+    :param batch_pause: seconds to wait between two batches
+    :return: number of removed records
+    """
+    removed_records = 0
+    while True:
+        batch_records = delete_batch()
+        if fgapisrv_db.get_state()[0]:
+            logging.error("Token sweep interrupted: %s"
+                          % fgapisrv_db.get_state()[1])
+            break
+        removed_records += batch_records
+        if batch_records < batch_size:
+            break
+        time.sleep(batch_pause)
+    return removed_records
+
+
+def sweep_tokens(fgapisrv_db,
+                 retention=None,
+                 batch_size=None,
+                 batch_pause=def_batch_pause):
+    """
+    Remove expired tokens from fg_token and revocations of expired signed
+    tokens from fg_token_revoked in batches, until no more expired records
+    are found or a database error occurs
+
+    :param fgapisrv_db: fgAPIServer database object
+    :param retention: seconds expired tokens are kept (fgapisrv_tokenretention)
+    :param batch_size: tokens removed by each batch (fgapisrv_tokensweep_batch)
+    :param batch_pause: seconds to wait between two batches
+    :return: number of removed tokens
+    """
+    if retention is None:
+        retention = fg_config['fgapisrv_tokenretention']
+    if batch_size is None:
+        batch_size = fg_config['fgapisrv_tokensweep_batch']
+    removed_tokens = sweep_batches(
+        fgapisrv_db,
+        lambda: fgapisrv_db.delete_expired_tokens(retention, batch_size),
+        batch_size,
+        batch_pause)
+    if removed_tokens > 0:
+        # Removed tokens have to be registered again by this process
+        evict_registered_tokens()
+    removed_revocations = sweep_batches(
+        fgapisrv_db,
+        lambda: fgapisrv_db.delete_expired_revocations(batch_size),
+        batch_size,
+        batch_pause)
+    logging.info("Token sweep removed %s expired tokens and %s revocations"
+                 % (removed_tokens, removed_revocations))
+    return removed_tokens
+
+
+"""
+  FGAPIServerTokenSweeper - Daemon thread removing expired tokens each
+                            period seconds
+"""
+
+
+class FGAPIServerTokenSweeper(threading.Thread):
+
+    period = 0
+    retention = None
+    batch_size = None
+
+    def __init__(self, period, retention=None, batch_size=None):
+        threading.Thread.__init__(self, name='fgapiserver_tokensweeper')
+        self.daemon = True
+        self.period = period
+        self.retention = retention
+        self.batch_size = batch_size
+        self.stopped = threading.Event()
+        self.stats = {'sweeps': 0,
+                      'last_sweep': None,
+                      'last_removed': 0,
+                      'removed': 0}
+
+    """
+      sweep - Perform a single sweep updating statistics
+    """
+
+    def sweep(self):
+        fgapisrv_db = get_fgapiserver_db()
+        if fgapisrv_db is None:
+            return 0
+        removed_tokens = sweep_tokens(fgapisrv_db,
+                                      self.retention,
+                                      self.batch_size)
+        self.stats['sweeps'] += 1
+        self.stats['last_sweep'] = time.time()
+        self.stats['last_removed'] = removed_tokens
+        self.stats['removed'] += removed_tokens
+        return removed_tokens
+
+    def run(self):
+        while not self.stopped.wait(self.period):
+            try:
+                self.sweep()
+            except Exception as e:
+                # The thread must survive to any unexpected failure
+                logging.error("Token sweep failed: %s" % e)
+
+    """
+      stop - Terminate the sweeper thread after the current sweep
+    """
+
+    def stop(self):
+        self.stopped.set()
+
+    """
+      get_stats - Return sweeper statistics
+    """
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['period'] = self.period
+        return stats
+
+
+def start_token_sweeper(period=None):
+    """
+    Start the process wide token sweeper thread, unless already running
+    or disabled (period <= 0)
+
+    :param period: seconds between sweeps (fgapisrv_tokensweep_period)
+    :return: the sweeper thread or None if the sweeper is disabled
+    """
+    if period is None:
+        period = fg_config['fgapisrv_tokensweep_period']
+    if period <= 0:
+        return None
+    with token_sweeper_lock:
+        if token_sweeper[0] is None or not token_sweeper[0].is_alive():
+            token_sweeper[0] = FGAPIServerTokenSweeper(period)
+            token_sweeper[0].start()
+            atexit.register(stop_token_sweeper)
+            logging.debug("Token sweeper started; period: %ss" % period)
+    return token_sweeper[0]
+
+
+def stop_token_sweeper():
+    """
+    Stop the process wide token sweeper thread, if any, waiting the end
+    of the current sweep
+
+    :return: None
+    """
+    with token_sweeper_lock:
+        sweeper = token_sweeper[0]
+        token_sweeper[0] = None
+    if sweeper is not None:
+        sweeper.stop()
+        sweeper.join(sweeper.period)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Remove expired tokens from the fg_token table')
+    parser.add_argument('--retention', type=int,
+                        default=fg_config['fgapisrv_tokenretention'],
+                        help='seconds expired tokens are kept')
+    parser.add_argument('--batch', type=int,
+                        default=fg_config['fgapisrv_tokensweep_batch'],
+                        help='maximum tokens removed by each batch')
+    args = parser.parse_args()
+    fgapisrv_db = get_fgapiserver_db()
+    if fgapisrv_db is None:
+        print("Unable to connect to the database!")
+        sys.exit(1)
+    removed = sweep_tokens(fgapisrv_db, args.retention, args.batch)
+    print("Removed %s expired tokens" % removed)
+    sys.exit(1 if fgapisrv_db.get_state()[0] else 0)
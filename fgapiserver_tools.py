@@ -27,9 +27,24 @@ from fgapiserver_db import get_db
 import os
 import sys
 import time
+import json
+import hmac
 import base64
+import hashlib
+import copy
+import urllib
+import urlparse
+import zlib
+import atexit
+import threading
 import logging
 
+# Brotli compression is available only if the brotli module is installed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 """
   FutureGateway APIServer tools
 """
@@ -57,6 +72,26 @@ fg_config = FGApiServerConfig(fgapiserver_config_file)
 # FutureGateway database object
 fgapisrv_db = None
 
+# Signed access tokens have the form: fgt1.<payload>.<signature>
+signed_token_prefix = 'fgt1'
+def_signed_token_expiry = 24 * 60 * 60
+
+# Revoked signed tokens: token id -> token expiration. Revocations are
+# stored in the fg_token_revoked table, shared by every front-end; 'ids'
+# is the per-process copy of that table, loaded again when older than
+# fgapisrv_tokencache_ttl seconds. The published dictionary is never
+# modified; reloads and new revocations replace it as whole
+revoked_tokens_state = {'ids': {}, 'loaded': None}
+revoked_tokens_lock = threading.Lock()
+
+# Service configuration stored in the database; the configuration hash
+# (srv_registry.cfg_hash) of the last applied configuration avoids to load
+# again unchanged settings. The configuration object having database
+# settings applied is never modified; changed settings replace it as whole
+db_config_state = {'uuid': None, 'cfg_hash': None, 'config': None}
+db_config_lock = threading.Lock()
+db_config_poller = [None]
+
 # Logging
 logging.config.fileConfig(fg_config['fgapisrv_logcfg'])
 
@@ -96,6 +131,8 @@ def get_fgapiserver_db():
         db_user=fg_config['fgapisrv_db_user'],
         db_pass=fg_config['fgapisrv_db_pass'],
         db_name=fg_config['fgapisrv_db_name'],
+        db_pool_size=fg_config['fgapisrv_db_poolsize'],
+        db_pool_recycle=fg_config['fgapisrv_db_poolrecycle'],
         iosandbbox_dir=fg_config['fgapisrv_iosandbox'],
         fgapiserverappid=fg_config['fgapisrv_geappid'])
     if db is None:
@@ -168,45 +205,122 @@ def srv_uuid():
     return str(uuid.uuid3(uuid.NAMESPACE_DNS, socket.gethostname()))
 
 
-def paginate_response(response, page, per_page, page_url):
+def set_url_params(url, **params):
+    """
+    Replace or add the given query parameters to the given url; parameters
+    having None value are removed from the url
+    :param url: The url to modify
+    :param params: Query parameters to replace
+    :return: The modified url
+    """
+    url_parts = list(urlparse.urlsplit(url))
+    query = [(key, value)
+             for key, value in urlparse.parse_qsl(url_parts[3], True)
+             if key not in params]
+    query += [(key, params[key])
+              for key in sorted(params.keys())
+              if params[key] is not None]
+    url_parts[3] = urllib.urlencode(query)
+    return urlparse.urlunsplit(url_parts)
+
+
+def check_paging(page, per_page, after):
+    """
+    Check the paging query parameters; an empty 'after' cursor selects the
+    first page of a cursor paged response
+    :param page: The selected page number or None
+    :param per_page: How many response record per page or None
+    :param after: The task cursor or None
+    :return: None if parameters are valid, the error message otherwise
+    """
+    if per_page is not None and\
+            (not per_page.isdigit() or int(per_page) == 0):
+        return "Invalid per_page value: '%s'" % per_page
+    if page is not None and not page.isdigit():
+        return "Invalid page value: '%s'" % page
+    if after is not None and after != '' and not after.isdigit():
+        return "Invalid task cursor: '%s'" % after
+    return None
+
+
+def cursor_links(page_url, per_page, next_after):
+    """
+    Generate the links of a response paged with the 'after' task cursor
+    :param page_url: The url to get this page
+    :param per_page: How many response record per page
+    :param next_after: The cursor value of the next page or None if no
+                       more records are available
+    :return: The list of links
+    """
+    links = [{"rel": "first",
+              "href": set_url_params(page_url, after='')},
+             {"rel": "self",
+              "href": page_url}, ]
+    if next_after is not None:
+        links += [{"rel": "next",
+                   "href": set_url_params(page_url,
+                                          after=next_after,
+                                          per_page=per_page)}, ]
+    return links
+
+
+def page_bounds(page, per_page, total):
+    """
+    Normalize page and per_page values accordingly to the total number of
+    available records
+    :param page: The selected page number (starting from 1)
+    :param per_page: How many response record per page
+    :param total: The total number of records
+    :return: The zero based page index and the number of records per page
+    """
+    pg = int(page)
+    if pg > 0:
+        pg -= 1
+    ppg = int(per_page)
+    last_pg = max(0, (total - 1) / ppg)
+    if pg > last_pg:
+        pg = last_pg
+    return pg, ppg
+
+
+def paginate_response(response, page, per_page, page_url, total=None):
     """
     Paginate the incoming response json vector, accordinlgly to page and
-    per_page values
+    per_page values; links are generated only for the first, previous,
+    current, next and last pages
     :param response: The whole response text
     :param page: The selected page number
     :param per_page: How many response record per page
     :param page_url: The url to get this page
+    :param total: When specified, the response already contains only the
+                  records of the selected page and total is the number of
+                  the whole records
     :return: The number of specified response records of the selected page
     """
     links = []
     if page is not None and per_page is not None:
-        pg = int(page)
+        if total is None:
+            total = len(response)
+            pg, ppg = page_bounds(page, per_page, total)
+            record_from = pg * ppg
+            record_to = record_from + ppg
+            paginated_response = response[record_from:record_to]
+        else:
+            pg, ppg = page_bounds(page, per_page, total)
+            paginated_response = response
+        last_pg = max(0, (total - 1) / ppg)
+        link_pages = [("first", 0), ]
         if pg > 0:
-            pg -= 1
-        ppg = int(per_page)
-        if pg > len(response) / ppg:
-            pg = len(response) / ppg
-        max_pages = len(response) / ppg + (1 * len(response) % ppg)
-        record_from = pg * ppg
-        record_to = record_from + ppg
-        paginated_response = response[record_from:record_to]
-        for link_page in range(0, max_pages):
-            if link_page == pg:
-                rel = "self"
-            elif link_page < pg:
-                rel = "prev"
-            else:
-                rel = "next"
-            if "?" in page_url:
-                filter_char = "&"
-            else:
-                filter_char = "?"
-            href = "%s%spage=%s&per_page=%s" % (page_url,
-                                                filter_char,
-                                                link_page + 1,
-                                                ppg)
+            link_pages += [("prev", pg - 1), ]
+        link_pages += [("self", pg), ]
+        if pg < last_pg:
+            link_pages += [("next", pg + 1), ]
+        link_pages += [("last", last_pg), ]
+        for rel, link_page in link_pages:
             links += [{"rel": rel,
-                       "href": href}, ]
+                       "href": set_url_params(page_url,
+                                              page=link_page + 1,
+                                              per_page=ppg)}, ]
     else:
         paginated_response = response
         links += [{"rel": "self",
@@ -309,6 +423,9 @@ def create_session_token(**kwargs):
         # Calculate credentials starting from a logtoken
         username, password, timestamp = process_log_token(logtoken)
     if len(username) > 0 and len(password) > 0:
+        if fg_config['fgapisrv_signedtokens']:
+            # Signed access tokens only need to verify user credentials
+            return create_signed_session_token(username, password, user)
         # Create a new access token starting from given username and password
         # (DBRequired)
         sestoken = fgapisrv_db.create_session_token(username,
@@ -346,9 +463,309 @@ def create_session_token(**kwargs):
     return sestoken, delegated_token
 
 
+def create_signed_session_token(username, password, user):
+    """
+    Create a signed access token for the given credentials and optionally
+    a signed delegated token for the given user
+
+    :param username: APIServer user name
+    :param password: APIServer user password
+    :param user: delegated user name or empty string
+    :return: access token and delegated token
+    """
+    sestoken = ''
+    delegated_token = ''
+    user_rec = fgapisrv_db.get_user_by_credentials(username, password)
+    if user_rec is None:
+        return sestoken, delegated_token
+    sestoken = signed_token_encode(user_rec[0], user_rec[1])
+    if len(user) > 0 and\
+            user_rec[1] != user and\
+            fgapisrv_db.verify_user_role(user_rec[0], 'user_impersonate'):
+        user_info = fgapisrv_db.get_user_info_by_name(user)
+        if user_info is not None:
+            delegated_token = signed_token_encode(user_info['id'],
+                                                  user_info['name'])
+            logging.debug("Delegated token is: '%s' for user: '%s'"
+                          % (delegated_token, user))
+    return sestoken, delegated_token
+
+
+def signed_token_b64encode(data):
+    """
+    URL safe base64 encoding without padding used by signed tokens
+    """
+    return base64.urlsafe_b64encode(data).rstrip('=')
+
+
+def signed_token_b64decode(data):
+    """
+    Decode URL safe base64 strings without padding used by signed tokens
+    """
+    return base64.urlsafe_b64decode(str(data) + '=' * (-len(data) % 4))
+
+
+def signed_token_signature(token_body):
+    """
+    Return the signature of the given signed token body (prefix.payload)
+    using the fgapisrv_secret value as key
+    """
+    return signed_token_b64encode(
+        hmac.new(str(fg_config['fgapisrv_secret']),
+                 str(token_body),
+                 hashlib.sha256).digest())
+
+
+def is_signed_token(token):
+    """
+    Return True if the given token has the form of a signed access token
+    """
+    return token is not None and token.startswith(signed_token_prefix + '.')
+
+
+def signed_token_encode(user_id, user_name, expiry=def_signed_token_expiry):
+    """
+    Create a signed access token; signed tokens carry the user id, the user
+    name, the expiration time and the token version (fgapisrv_tokenver).
+    Such tokens can be verified without accessing the database; changing
+    the fgapisrv_tokenver value invalidates any previously issued token,
+    for instance after role changes
+
+    :param user_id: APIServer user id
+    :param user_name: APIServer user name
+    :param expiry: token validity in seconds
+    :return: the signed access token
+    """
+    now = int(time.time())
+    payload = {'uid': user_id,
+               'name': user_name,
+               'iat': now,
+               'exp': now + expiry,
+               'rv': fg_config['fgapisrv_tokenver'],
+               'jti': uuid.uuid4().hex}
+    token_body = '%s.%s' % (
+        signed_token_prefix,
+        signed_token_b64encode(json.dumps(payload,
+                                          sort_keys=True,
+                                          separators=(',', ':'))))
+    return '%s.%s' % (token_body, signed_token_signature(token_body))
+
+
+def signed_token_decode(token):
+    """
+    Verify the given signed access token
+
+    :param token: signed access token
+    :return: token payload or None if the token is not valid, expired,
+             revoked or issued with a different token version
+    """
+    if not is_signed_token(token):
+        return None
+    token_fields = token.split('.')
+    if len(token_fields) != 3:
+        return None
+    token_body = '%s.%s' % (token_fields[0], token_fields[1])
+    if not hmac.compare_digest(str(signed_token_signature(token_body)),
+                               str(token_fields[2])):
+        logging.debug("Wrong signature of token: '%s'" % token)
+        return None
+    try:
+        payload = json.loads(signed_token_b64decode(token_fields[1]))
+    except (TypeError, ValueError):
+        return None
+    if payload.get('exp', 0) <= time.time():
+        logging.debug("Token: '%s' is expired" % token)
+        return None
+    if payload.get('rv') != fg_config['fgapisrv_tokenver']:
+        logging.debug("Token: '%s' has a different version" % token)
+        return None
+    if is_revoked_token(payload.get('jti')):
+        logging.debug("Token: '%s' has been revoked" % token)
+        return None
+    return payload
+
+
+def is_revoked_token(token_id):
+    """
+    Check if the given signed token id has been revoked; the list of
+    revoked tokens is loaded from the database at most once each
+    fgapisrv_tokencache_ttl seconds, so that revocations made by other
+    front-ends are applied within that time
+
+    :param token_id: signed token id (jti)
+    :return: True if the token has been revoked
+    """
+    now = time.time()
+    loaded = revoked_tokens_state['loaded']
+    if fgapisrv_db is not None and (
+            loaded is None or
+            now - loaded >= fg_config['fgapisrv_tokencache_ttl']):
+        with revoked_tokens_lock:
+            loaded = revoked_tokens_state['loaded']
+            if loaded is None or\
+                    now - loaded >= fg_config['fgapisrv_tokencache_ttl']:
+                revoked_token_ids = fgapisrv_db.get_revoked_token_ids()
+                if not fgapisrv_db.get_state()[0]:
+                    # Keep not expired revocations missing in the DB copy,
+                    # i.e. the ones added while it was being loaded
+                    for revoked_id, expiry in \
+                            revoked_tokens_state['ids'].items():
+                        if expiry > now:
+                            revoked_token_ids.setdefault(revoked_id, expiry)
+                    revoked_tokens_state['ids'] = revoked_token_ids
+                revoked_tokens_state['loaded'] = now
+    return token_id in revoked_tokens_state['ids']
+
+
+def signed_token_info(token):
+    """
+    Return information about the given signed access token, in the same
+    format of FGAPIServerDB.get_token_info()
+
+    :param token: signed access token
+    :return: token information
+    """
+    token_info = {'token': token, }
+    payload = signed_token_decode(token)
+    if payload is not None:
+        token_info['user_id'] = payload['uid']
+        token_info['user_name'] = payload['name']
+        token_info['creation'] = time.strftime('%Y-%m-%dT%H:%M:%SZ',
+                                               time.gmtime(payload['iat']))
+        token_info['expiry'] = payload['exp'] - payload['iat']
+        token_info['valid'] = True
+        token_info['lasting'] = max(int(payload['exp'] - time.time()), 0)
+    return token_info
+
+
+def revoke_signed_token(token):
+    """
+    Revoke the given signed access token; the revocation is stored in the
+    database, so that any front-end refuses the token, and it is kept until
+    the token expiration (see fgapiserver_tokensweeper)
+
+    :param token: signed access token
+    :return: True if the token has been revoked
+    """
+    payload = signed_token_decode(token)
+    if payload is None or\
+            not fgapisrv_db.revoke_signed_token_id(payload['jti'],
+                                                   payload['exp']):
+        return False
+    with revoked_tokens_lock:
+        revoked_token_ids = dict(revoked_tokens_state['ids'])
+        revoked_token_ids[payload['jti']] = payload['exp']
+        revoked_tokens_state['ids'] = revoked_token_ids
+    return True
+
+
+def json_dump(json_dict):
+    """
+    Serialize the given response; readable JSON, indented by fgjson_indent,
+    is produced only when the client asks for it with the 'pretty'
+    parameter or when fgjson_compact is False, otherwise compact JSON is
+    returned
+
+    :param json_dict: the response dictionary
+    :return: the JSON string
+    """
+    if json_pretty():
+        return json.dumps(json_dict, indent=fg_config['fgjson_indent'])
+    return json.dumps(json_dict, separators=(',', ':'))
+
+
+def json_pretty():
+    """
+    Return True if the response JSON has to be indented (see json_dump)
+
+    :return: True for readable JSON, False for compact JSON
+    """
+    pretty = request.args.get('pretty', None)
+    return not fg_config['fgjson_compact'] or\
+        (pretty is not None and (pretty == '' or json_bool(pretty)))
+
+
+def resource_etag(*values):
+    """
+    Return the strong entity tag of a resource representation; the tag is
+    calculated from the given values, which change each time the resource
+    changes, and from the JSON format of the response, so that differently
+    formatted responses never share the same tag
+
+    :param values: resource identity and version values
+    :return: the entity tag (unquoted)
+    """
+    etag_values = [str(value) for value in values]
+    etag_values.append('pretty' if json_pretty() else 'compact')
+    return hashlib.md5(':'.join(etag_values)).hexdigest()
+
+
+def etag_match(etag):
+    """
+    Check the If-None-Match request header against the given entity tag
+    and its content encoded variants (see compress_response)
+
+    :param etag: the current resource entity tag (unquoted)
+    :return: the matching entity tag or None if the resource changed
+    """
+    if_none_match = request.if_none_match
+    for etag_suffix in ('', '-gzip', '-br'):
+        if if_none_match.contains_weak(etag + etag_suffix):
+            return etag + etag_suffix
+    return None
+
+
+def compress_response(response):
+    """
+    Compress the given response with the encoding negotiated by the
+    Accept-Encoding request header (brotli if available, gzip).
+    Only JSON responses larger than fgapisrv_compressminsize bytes are
+    compressed; streamed responses (files and archives) are never compressed
+
+    :param response: the response object
+    :return: the response object
+    """
+    if not fg_config['fgapisrv_compress'] or\
+            response.direct_passthrough or\
+            response.is_streamed or\
+            response.mimetype != 'application/json' or\
+            'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < fg_config['fgapisrv_compressminsize']:
+        return response
+    accept_encodings = request.accept_encodings
+    level = fg_config['fgapisrv_compresslevel']
+    if brotli is not None and\
+            0 < accept_encodings['gzip'] <= accept_encodings['br']:
+        content_encoding = 'br'
+        body = brotli.compress(body, quality=min(level, 11))
+    elif accept_encodings['gzip'] > 0:
+        content_encoding = 'gzip'
+        # wbits 16 + MAX_WBITS produces the gzip format
+        compressor = zlib.compressobj(level,
+                                      zlib.DEFLATED,
+                                      16 + zlib.MAX_WBITS)
+        body = compressor.compress(body) + compressor.flush()
+    elif brotli is not None and accept_encodings['br'] > 0:
+        content_encoding = 'br'
+        body = brotli.compress(body, quality=min(level, 11))
+    else:
+        return response
+    response.set_data(body)
+    response.headers['Content-Encoding'] = content_encoding
+    # Encoded representations need their own entity tag
+    etag, weak = response.get_etag()
+    if etag is not None:
+        response.set_etag('%s-%s' % (etag, content_encoding), weak)
+    return response
+
+
 #
-# header_links; take care of _links fields and Location specified
-#               inside the passed json dictionary content
+# header_links; take care of _links fields, Location and total count
+#               of paginated records specified inside the passed json
+#               dictionary content
 #
 def header_links(req, resp, json_dict):
     if '_links' in json_dict:
@@ -359,6 +776,8 @@ def header_links(req, resp, json_dict):
                                          link['rel'],
                                          link['href'])))
         resp.headers.add('Location', req.url)
+    if 'total' in json_dict:
+        resp.headers.add('X-Total-Count', str(json_dict['total']))
 
 
 #
@@ -409,7 +828,7 @@ def check_db_reg(config):
     return fgapisrv_uuid
 
 
-def update_db_config(config):
+def update_db_config(config, fgapisrv_uuid=None):
     """
         Update given configuration with registered service configuration
 
@@ -417,13 +836,119 @@ def update_db_config(config):
                  and passed configuration values are compared with database
                  settings that will have highest priority. Returned value
                  will be the setting extracted from the DB if enabled.
+                 Database settings are loaded again only when the service
+                 configuration hash (srv_registry.cfg_hash) changes.
+                 The given configuration is never modified; DB settings
+                 are applied to a new configuration object that replaces
+                 the previous one (see get_db_config)
     """
     # Retrieve the service UUID
-    fgapisrv_uuid = srv_uuid()
-    db_config = fgapisrv_db.srv_config(fgapisrv_uuid)
-    for key in config.keys():
-        if config[key] != db_config[key]:
-            logging.debug("DB configuration overload: conf(%s)='%s'<-'%s'"
-                          % (key, config[key], db_config[key]))
-            config[key] = db_config[key]
-    return config
+    if fgapisrv_uuid is None:
+        fgapisrv_uuid = srv_uuid()
+    with db_config_lock:
+        cfg_hash = fgapisrv_db.get_srv_hash(fgapisrv_uuid)
+        if fgapisrv_db.get_state()[0] or\
+                (db_config_state['uuid'] == fgapisrv_uuid and
+                 db_config_state['cfg_hash'] == cfg_hash):
+            return get_db_config(config)
+        db_config = fgapisrv_db.srv_config(fgapisrv_uuid)
+        if fgapisrv_db.get_state()[0]:
+            return get_db_config(config)
+        new_config = copy.copy(config)
+        for key in config.keys():
+            if config[key] != db_config[key]:
+                logging.debug("DB configuration overload: conf(%s)='%s'<-'%s'"
+                              % (key, config[key], db_config[key]))
+                new_config[key] = db_config[key]
+        db_config_state['uuid'] = fgapisrv_uuid
+        db_config_state['cfg_hash'] = cfg_hash
+        db_config_state['config'] = new_config
+    return new_config
+
+
+def get_db_config(config):
+    """
+    Return the configuration object having the database settings applied
+    by the last update_db_config call; readers holding the returned object
+    keep a consistent view of the configuration
+
+    :param config: configuration returned when no database settings have
+                   been applied yet
+    :return: configuration object
+    """
+    db_config = db_config_state['config']
+    if db_config is None:
+        return config
+    return db_config
+
+
+class FGAPIServerDBConfigPoller(threading.Thread):
+    """
+    Daemon thread checking each period seconds the service configuration
+    hash and applying database settings to a new copy of the given
+    configuration when the hash changes (see get_db_config)
+    """
+
+    def __init__(self, config, fgapisrv_uuid, period):
+        threading.Thread.__init__(self, name='fgapiserver_dbconfigpoller')
+        self.daemon = True
+        self.config = config
+        self.fgapisrv_uuid = fgapisrv_uuid
+        self.period = period
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.period):
+            try:
+                update_db_config(self.config, self.fgapisrv_uuid)
+            except Exception as e:
+                # The thread must survive to any unexpected failure
+                logging.error("Unable to update DB configuration: %s" % e)
+
+    def stop(self):
+        """
+        Terminate the poller thread after the current check
+        """
+        self.stopped.set()
+
+
+def start_db_config_poller(config, fgapisrv_uuid, period=None):
+    """
+    Start the process wide thread that keeps the configuration returned by
+    get_db_config aligned with the service configuration stored in the
+    database
+
+    :param config: configuration object database settings are applied to
+    :param fgapisrv_uuid: service UUID
+    :param period: seconds between checks (fgapisrv_db_cfgpoll); the
+                   database configuration is not checked when <= 0
+    :return: the poller thread or None if polling is disabled
+    """
+    if period is None:
+        period = fg_config['fgapisrv_db_cfgpoll']
+    if period <= 0:
+        return None
+    with db_config_lock:
+        if db_config_poller[0] is None or not db_config_poller[0].is_alive():
+            db_config_poller[0] = FGAPIServerDBConfigPoller(config,
+                                                            fgapisrv_uuid,
+                                                            period)
+            db_config_poller[0].start()
+            atexit.register(stop_db_config_poller)
+    return db_config_poller[0]
+
+
+def stop_db_config_poller():
+    """
+    Stop the process wide database configuration poller, if any; the
+    function waits the thread termination so that it does not run while
+    the interpreter shuts down
+
+    :return: None
+    """
+    with db_config_lock:
+        poller = db_config_poller[0]
+        db_config_poller[0] = None
+    if poller is not None:
+        poller.stop()
+        poller.join(poller.period)
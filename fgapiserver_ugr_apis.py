@@ -23,9 +23,12 @@ from flask import Response
 from flask import Blueprint
 from flask_login import login_required, current_user
 from fgapiserver_config import FGApiServerConfig
-from fgapiserver_auth import authorize_user
+from fgapiserver_auth import authorize_user, bump_authz_generation
 from fgapiserver_tools import check_api_ver,\
-                              get_fgapiserver_db
+                              check_paging,\
+                              cursor_links,\
+                              get_fgapiserver_db,\
+                              json_dump
 import os
 import sys
 import json
@@ -105,6 +108,7 @@ def users(apiver=fg_config['fgapiver']):
                         user_record = fgapisrv_db.user_create(user_data)
                         if user_record is not None:
                             new_users.append(user_record)
+                    bump_authz_generation()
                     if new_users is not []:
                         status = 201
                         response = {"users": new_users}
@@ -129,7 +133,7 @@ def users(apiver=fg_config['fgapiver']):
             status = 400
             response = {"message": "Unhandled method: '%s'" % request.method}
     logging.debug('message: %s' % response.get('message', 'success'))
-    js = json.dumps(response, indent=fg_config['fgjson_indent'])
+    js = json_dump(response)
     resp = Response(js, status=status, mimetype='application/json')
     resp.headers['Content-type'] = 'application/json'
     return resp
@@ -191,6 +195,7 @@ def users_user(user, apiver=fg_config['fgapiver']):
                             'mail': params.get('mail', ''),
                         }
                         user_record = fgapisrv_db.user_create(user_data)
+                        bump_authz_generation()
                         if user_record is not None:
                             status = 201
                             response = user_record
@@ -214,7 +219,7 @@ def users_user(user, apiver=fg_config['fgapiver']):
             status = 400
             response = {"message": "Unhandled method: '%s'" % request.method}
     logging.debug('message: %s' % response.get('message', 'success'))
-    js = json.dumps(response, indent=fg_config['fgjson_indent'])
+    js = json_dump(response)
     resp = Response(js, status=status, mimetype='application/json')
     resp.headers['Content-type'] = 'application/json'
     return resp
@@ -273,6 +278,7 @@ def user_groups(user, apiver=fg_config['fgapiver']):
                         group_list = params.get('groups', [])
                         inserted_groups =\
                             fgapisrv_db.add_user_groups(user, group_list)
+                        bump_authz_generation()
                         if inserted_groups is not None:
                             status = 201
                             response = {'groups': inserted_groups}
@@ -310,6 +316,7 @@ def user_groups(user, apiver=fg_config['fgapiver']):
                         group_list = params.get('groups', [])
                         deleted_groups =\
                             fgapisrv_db.delete_user_groups(user, group_list)
+                        bump_authz_generation()
                         if deleted_groups is not None:
                             status = 200
                             response = {'groups': deleted_groups}
@@ -335,7 +342,7 @@ def user_groups(user, apiver=fg_config['fgapiver']):
             status = 400
             response = {"message": "Unhandled method: '%s'" % request.method}
     logging.debug('message: %s' % response.get('message', 'success'))
-    js = json.dumps(response, indent=fg_config['fgjson_indent'])
+    js = json_dump(response)
     resp = Response(js, status=status, mimetype='application/json')
     resp.headers['Content-type'] = 'application/json'
     return resp
@@ -355,24 +362,43 @@ def user_tasks(user, apiver=fg_config['fgapiver']):
         response = {"message": message}
     else:
         application = request.values.get('application')
+        per_page = request.values.get('per_page')
+        after = request.values.get('after')
         user_name = current_user.get_name()
         user_id = current_user.get_id()
         logging.debug("user_name: '%s'" % user_name)
         logging.debug("user_id: '%s'" % user_id)
         user = request.values.get('user', user)
-        if request.method == 'GET':
+        paging_message = check_paging(None, per_page, after)
+        if paging_message is not None:
+            status = 400
+            response = {"message": paging_message}
+        elif request.method == 'GET':
             auth_state, auth_msg = \
                 authorize_user(current_user, None, user, "users_tasks_view")
             if auth_state is True:
                 if fgapisrv_db.user_exists(user):
-                    tasks_list = []
+                    # The 'after' cursor pages on task ids as in /tasks
+                    limit = None
+                    next_after = None
+                    if after is not None and per_page is not None:
+                        limit = int(per_page) + 1
                     user_task_ids =\
-                        fgapisrv_db.user_tasks_retrieve(user, application)
-                    for task_id in user_task_ids:
-                        task_record = fgapisrv_db.get_task_record(task_id)
-                        tasks_list += [task_record, ]
+                        fgapisrv_db.user_tasks_retrieve(user,
+                                                        application,
+                                                        limit,
+                                                        after or None)
+                    if limit is not None and\
+                            len(user_task_ids) > int(per_page):
+                        user_task_ids = user_task_ids[:int(per_page)]
+                        next_after = user_task_ids[-1]
+                    tasks_list = fgapisrv_db.get_task_records(user_task_ids)
                     status = 200
                     response = {'tasks':  tasks_list}
+                    if after is not None:
+                        response['_links'] = cursor_links(request.url,
+                                                          per_page,
+                                                          next_after)
                 else:
                     status = 404
                     response = {
@@ -387,7 +413,7 @@ def user_tasks(user, apiver=fg_config['fgapiver']):
             status = 400
             response = {"message": "Unhandled method: '%s'" % request.method}
     logging.debug('message: %s' % response.get('message', 'success'))
-    js = json.dumps(response, indent=fg_config['fgjson_indent'])
+    js = json_dump(response)
     resp = Response(js, status=status, mimetype='application/json')
     resp.headers['Content-type'] = 'application/json'
     return resp
@@ -433,7 +459,7 @@ def user_tasks_id(user, task_id, apiver=fg_config['fgapiver']):
             status = 400
             response = {"message": "Unhandled method: '%s'" % request.method}
     logging.debug('message: %s' % response.get('message', 'success'))
-    js = json.dumps(response, indent=fg_config['fgjson_indent'])
+    js = json_dump(response)
     resp = Response(js, status=status, mimetype='application/json')
     resp.headers['Content-type'] = 'application/json'
     return resp
@@ -559,7 +585,7 @@ def users_user_data(user, apiver=fg_config['fgapiver']):
             status = 400
             response = {"message": "Unhandled method: '%s'" % request.method}
     logging.debug('message: %s' % response.get('message', 'success'))
-    js = json.dumps(response, indent=fg_config['fgjson_indent'])
+    js = json_dump(response)
     resp = Response(js, status=status, mimetype='application/json')
     resp.headers['Content-type'] = 'application/json'
     return resp
@@ -686,7 +712,7 @@ def users_user_data_name(user, data_name, apiver=fg_config['fgapiver']):
             status = 400
             response = {"message": "Unhandled method: '%s'" % request.method}
     logging.debug('message: %s' % response.get('message', 'success'))
-    js = json.dumps(response, indent=fg_config['fgjson_indent'])
+    js = json_dump(response)
     resp = Response(js, status=status, mimetype='application/json')
     resp.headers['Content-type'] = 'application/json'
     return resp
@@ -730,6 +756,7 @@ def groups(apiver=fg_config['fgapiver']):
                     logging.debug("params: '%s'" % params)
                     group_name = params.get('name', '')
                     new_group = fgapisrv_db.group_add(group_name)
+                    bump_authz_generation()
                     if new_group is not None:
                         status = 201
                         response = new_group
@@ -753,7 +780,7 @@ def groups(apiver=fg_config['fgapiver']):
             status = 400
             response = {"message": "Unhandled method: '%s'" % request.method}
     logging.debug('message: %s' % response.get('message', 'success'))
-    js = json.dumps(response, indent=fg_config['fgjson_indent'])
+    js = json_dump(response)
     resp = Response(js, status=status, mimetype='application/json')
     resp.headers['Content-type'] = 'application/json'
     return resp
@@ -802,7 +829,7 @@ def groups_group(group, apiver=fg_config['fgapiver']):
             status = 404
             response = {"message": "Unhandled method: '%s'" % request.method}
     logging.debug('message: %s' % response.get('message', 'success'))
-    js = json.dumps(response, indent=fg_config['fgjson_indent'])
+    js = json_dump(response)
     resp = Response(js, status=status, mimetype='application/json')
     resp.headers['Content-type'] = 'application/json'
     return resp
@@ -854,6 +881,7 @@ def groups_group_apps(group, apiver=fg_config['fgapiver']):
                     logging.debug("params: '%s'" % params)
                     app_ids = params.get('applications', [])
                     new_ids = fgapisrv_db.group_apps_add(group, app_ids)
+                    bump_authz_generation()
                     if new_ids is not []:
                         status = 201
                         response = {'applications': new_ids}
@@ -879,7 +907,7 @@ def groups_group_apps(group, apiver=fg_config['fgapiver']):
             status = 400
             response = {"message": "Unhandled method: '%s'" % request.method}
     logging.debug('message: %s' % response.get('message', 'success'))
-    js = json.dumps(response, indent=fg_config['fgjson_indent'])
+    js = json_dump(response)
     resp = Response(js, status=status, mimetype='application/json')
     resp.headers['Content-type'] = 'application/json'
     return resp
@@ -930,6 +958,7 @@ def groups_group_roles(group, apiver=fg_config['fgapiver']):
                     logging.debug("params: '%s'" % params)
                     role_ids = params.get('roles', [])
                     new_roles = fgapisrv_db.group_roles_add(group, role_ids)
+                    bump_authz_generation()
                     if new_roles is not []:
                         status = 201
                         response = {'roles': new_roles}
@@ -955,7 +984,7 @@ def groups_group_roles(group, apiver=fg_config['fgapiver']):
             status = 400
             response = {"message": "Unhandled method: '%s'" % request.method}
     logging.debug('message: %s' % response.get('message', 'success'))
-    js = json.dumps(response, indent=fg_config['fgjson_indent'])
+    js = json_dump(response)
     resp = Response(js, status=status, mimetype='application/json')
     resp.headers['Content-type'] = 'application/json'
     return resp
@@ -994,7 +1023,7 @@ def roles(apiver=fg_config['fgapiver']):
             status = 400
             response = {"message": "Unhandled method: '%s'" % request.method}
     logging.debug('message: %s' % response.get('message', 'success'))
-    js = json.dumps(response, indent=fg_config['fgjson_indent'])
+    js = json_dump(response)
     resp = Response(js, status=status, mimetype='application/json')
     resp.headers['Content-type'] = 'application/json'
     return resp
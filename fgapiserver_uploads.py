@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# Copyright (c) 2015:
+# Istituto Nazionale di Fisica Nucleare (INFN), Italy
+#
+# See http://www.infn.it  for details on the copyrigh holder
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import re
+import json
+import fcntl
+import uuid
+import hashlib
+import logging
+from werkzeug.utils import secure_filename
+
+"""
+  FutureGateway APIServer resumable task input uploads
+
+  Each upload session stores its data directly inside the task IO sandbox
+  in a partial file (.upload_<id>) and its description in a metadata file
+  (.upload_<id>.json); the current upload offset is the partial file size,
+  so that any server process can resume an interrupted upload.
+  Once completed, the partial file is verified against the optional client
+  checksum and renamed to the input file name.
+"""
+__author__ = 'Riccardo Bruno'
+__copyright__ = '2019'
+__license__ = 'Apache'
+__version__ = 'v0.0.10.1'
+__maintainer__ = 'Riccardo Bruno'
+__email__ = 'riccardo.bruno@ct.infn.it'
+__status__ = 'devel'
+__update__ = '2019-10-18 15:19:14'
+
+"""
+ Upload default settings
+"""
+def_upload_chunk = 64 * 1024       # Bytes read/written at once
+def_upload_checksum = 'sha256'     # Server side checksum algorithm
+upload_id_pattern = re.compile('^[0-9a-f]{32}$')
+
+
+def upload_paths(task_sandbox, upload_id):
+    """
+    Return the partial file and the metadata file paths of an upload
+
+    :param task_sandbox: task IO sandbox directory
+    :param upload_id: upload session id
+    :return: (partial file path, metadata file path) or None if the upload
+             id is not valid
+    """
+    if not isinstance(upload_id, basestring) or\
+            upload_id_pattern.match(upload_id) is None:
+        return None
+    upload_file = os.path.join(task_sandbox, '.upload_%s' % upload_id)
+    return upload_file, '%s.json' % upload_file
+
+
+def upload_info(task_sandbox, upload_id):
+    """
+    Return the description of the given upload session
+
+    :param task_sandbox: task IO sandbox directory
+    :param upload_id: upload session id
+    :return: upload description or None if the upload does not exist
+    """
+    paths = upload_paths(task_sandbox, upload_id)
+    if paths is None or not os.path.isfile(paths[1]):
+        return None
+    with open(paths[1]) as upload_meta:
+        info = json.load(upload_meta)
+    info['upload'] = upload_id
+    info['offset'] = os.path.getsize(paths[0])
+    return info
+
+
+def upload_create(task_sandbox, name, size=None, checksum=None):
+    """
+    Create a new upload session
+
+    :param task_sandbox: task IO sandbox directory
+    :param name: input file name
+    :param size: expected file size in bytes, if known
+    :param checksum: expected file checksum as '<algorithm>:<hex digest>'
+    :return: state, response
+    """
+    filename = secure_filename(name or '')
+    if len(filename) == 0:
+        return 400, {"message": "Missing or wrong file name: '%s'" % name}
+    if size is not None:
+        try:
+            size = int(size)
+        except (TypeError, ValueError):
+            return 400, {"message": "Wrong file size: '%s'" % size}
+        if size < 0:
+            return 400, {"message": "Wrong file size: '%s'" % size}
+    if checksum is not None and (
+            not isinstance(checksum, basestring) or
+            len(checksum.split(':')) != 2 or
+            checksum.split(':')[0] not in hashlib.algorithms):
+        return 400, {"message": ("Unsupported checksum: '%s'; use "
+                                 "'<algorithm>:<digest>' with algorithm "
+                                 "in: %s" % (checksum,
+                                             ', '.join(hashlib.algorithms)))}
+    upload_id = uuid.uuid4().hex
+    upload_file, upload_meta = upload_paths(task_sandbox, upload_id)
+    with open(upload_meta, 'w') as meta:
+        json.dump({'name': filename,
+                   'size': size,
+                   'checksum': checksum}, meta)
+    open(upload_file, 'wb').close()
+    logging.debug("Upload '%s' of file: '%s' created in '%s'"
+                  % (upload_id, filename, task_sandbox))
+    return 201, upload_info(task_sandbox, upload_id)
+
+
+def upload_write(task_sandbox, upload_id, offset, stream):
+    """
+    Append to the given upload session the data read from the stream; the
+    data is written in chunks, so that the upload does not need to be kept
+    in memory. The given offset must match the current upload offset
+
+    :param task_sandbox: task IO sandbox directory
+    :param upload_id: upload session id
+    :param offset: offset of the received data
+    :param stream: input stream
+    :return: state, response
+    """
+    info = upload_info(task_sandbox, upload_id)
+    if info is None:
+        return 404, {"message": "Unable to find upload: '%s'" % upload_id}
+    upload_file = upload_paths(task_sandbox, upload_id)[0]
+    with open(upload_file, 'ab') as upload_data:
+        # Concurrent requests for the same upload are serialized by the
+        # partial file lock; the offset is checked while holding it
+        fcntl.flock(upload_data, fcntl.LOCK_EX)
+        info['offset'] = os.fstat(upload_data.fileno()).st_size
+        if offset != info['offset']:
+            info['message'] = ("Upload offset mismatch; expected %s got %s"
+                               % (info['offset'], offset))
+            return 409, info
+        while True:
+            chunk = stream.read(def_upload_chunk)
+            if not chunk:
+                break
+            upload_data.write(chunk)
+            if info['size'] is not None and\
+                    upload_data.tell() > info['size']:
+                upload_data.truncate(info['offset'])
+                info['message'] = ("Upload exceeds the declared size of %s "
+                                   "bytes" % info['size'])
+                return 413, info
+    return 200, upload_info(task_sandbox, upload_id)
+
+
+def upload_complete(task_sandbox, upload_id):
+    """
+    Complete the given upload session; the uploaded data is verified and
+    renamed as the input file inside the task IO sandbox. The server side
+    checksum is calculated with the algorithm specified by the client or
+    with the default one (sha256)
+
+    :param task_sandbox: task IO sandbox directory
+    :param upload_id: upload session id
+    :return: state, response
+    """
+    info = upload_info(task_sandbox, upload_id)
+    if info is None:
+        return 404, {"message": "Unable to find upload: '%s'" % upload_id}
+    if info['size'] is not None and info['offset'] != info['size']:
+        info['message'] = ("Upload is not completed; %s bytes of %s "
+                           "received" % (info['offset'], info['size']))
+        return 409, info
+    algorithm = def_upload_checksum
+    if info['checksum'] is not None:
+        algorithm = info['checksum'].split(':')[0]
+    upload_file, upload_meta = upload_paths(task_sandbox, upload_id)
+    digest = hashlib.new(algorithm)
+    with open(upload_file, 'rb') as upload_data:
+        while True:
+            chunk = upload_data.read(def_upload_chunk)
+            if not chunk:
+                break
+            digest.update(chunk)
+    checksum = '%s:%s' % (algorithm, digest.hexdigest())
+    if info['checksum'] is not None and\
+            info['checksum'].lower() != checksum:
+        info['message'] = ("Checksum mismatch; expected '%s' got '%s'"
+                           % (info['checksum'], checksum))
+        return 412, info
+    os.rename(upload_file, os.path.join(task_sandbox, info['name']))
+    os.remove(upload_meta)
+    info['checksum'] = checksum
+    logging.debug("Upload '%s' of file: '%s' completed; checksum: '%s'"
+                  % (upload_id, info['name'], checksum))
+    return 200, info
+
+
+def upload_delete(task_sandbox, upload_id):
+    """
+    Abort the given upload session removing its data
+
+    :param task_sandbox: task IO sandbox directory
+    :param upload_id: upload session id
+    :return: state, response
+    """
+    if upload_info(task_sandbox, upload_id) is None:
+        return 404, {"message": "Unable to find upload: '%s'" % upload_id}
+    for upload_path in upload_paths(task_sandbox, upload_id):
+        os.remove(upload_path)
+    return 204, {"message": "Upload '%s' removed" % upload_id}
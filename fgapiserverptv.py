@@ -18,10 +18,17 @@
 import urllib2
 import base64
 import requests
+import os
 import json
+import copy
+import time
+import hashlib
+import threading
 import logging
 import logging.config
+from collections import OrderedDict
 from fgapiserver_config import FGApiServerConfig
+from fgapiserver_cache import FGAPIServerCache
 from fgapiserver_user import User
 
 __author__ = 'Riccardo Bruno'
@@ -54,7 +61,55 @@ __update__ = '2019-10-18 15:19:14'
 
   Optional values such portal user and group can be used to apply a
   fine-grained user mapping from portal users to the APIServer users
+
+  Validation results are cached by the PTV endpoint and the hash of the
+  token; valid tokens for cache_ttl seconds and invalid tokens for
+  negative_ttl seconds. Concurrent validations of the same token are
+  collapsed into a single portal call
+
+  PTV objects are shared by the whole process (see get_ptv) and keep alive
+  their connections to the portal; validation results are only returned
+  to the caller and never stored in the shared object. Failed portal calls
+  are retried with an exponential backoff; after breaker_failures
+  consecutive failures the portal is no longer contacted for breaker_reset
+  seconds and tokens are considered invalid (circuit breaker)
+"""
+
+"""
+ PTV cache default settings
 """
+def_ptv_cache_size = 1024       # Maximum number of cached tokens
+def_ptv_cache_ttl = 300         # Valid tokens time to live in seconds
+def_ptv_cache_negative_ttl = 10  # Invalid tokens time to live in seconds
+def_ptv_cache_max_ttl = 86400   # Upper bound of any configured TTL
+
+"""
+ PTV connection default settings
+"""
+def_ptv_pool_size = 10          # Maximum number of kept alive connections
+def_ptv_conn_timeout = 5        # Connection timeout in seconds
+def_ptv_read_timeout = 10       # Response timeout in seconds
+def_ptv_retries = 2             # Retries of a failed portal call
+def_ptv_backoff = 0.1           # Seconds before the first retry
+def_ptv_breaker_failures = 5    # Consecutive failures opening the breaker
+def_ptv_breaker_reset = 30      # Seconds the breaker stays open
+
+# Per-process cache of validation results:
+# (PTV endpoint, token hash) -> validated token
+ptv_cache = FGAPIServerCache(def_ptv_cache_size, def_ptv_cache_max_ttl)
+
+# Portal calls in progress:
+# (PTV endpoint, token hash) -> {'event': Event, 'result': ...}
+ptv_inflight = {}
+ptv_inflight_lock = threading.Lock()
+
+# Per-process PTV objects, one for each set of PTV settings
+ptv_clients = {}
+ptv_clients_lock = threading.Lock()
+
+# Per-process compiled PTV user maps, one for each map file
+ptv_maps = {}
+ptv_maps_lock = threading.Lock()
 
 
 class FGAPIServerPTV:
@@ -62,12 +117,16 @@ class FGAPIServerPTV:
     portal_endpoint = ''
     portal_tv_user = ''
     portal_tv_pass = ''
-    portal_validate = False
-    portal_user = ''
-    portal_group = ''
-    portal_groups = []
-    portal_subject = None
     fgapiserver_db = None
+    cache_ttl = def_ptv_cache_ttl
+    negative_ttl = def_ptv_cache_negative_ttl
+    conn_timeout = def_ptv_conn_timeout
+    read_timeout = def_ptv_read_timeout
+    retries = def_ptv_retries
+    backoff = def_ptv_backoff
+    breaker_failures = def_ptv_breaker_failures
+    breaker_reset = def_ptv_breaker_reset
+    session = None
     log = None
 
     def __init__(self, *args, **kwargs):
@@ -76,6 +135,17 @@ class FGAPIServerPTV:
             portal_tv_user  - The portal user name used to perform the token
                               validation
             portal_tv_pass  - The portal token validator user password
+            cache_ttl       - Seconds a valid token result is cached
+            negative_ttl    - Seconds an invalid token result is cached
+            pool_size       - Maximum number of kept alive connections
+            conn_timeout    - Portal connection timeout in seconds
+            read_timeout    - Portal response timeout in seconds
+            retries         - Number of retries of a failed portal call
+            backoff         - Seconds before the first retry, doubled at
+                              each further retry
+            breaker_failures- Consecutive failed portal calls opening the
+                              circuit breaker
+            breaker_reset   - Seconds the circuit breaker stays open
 
         """
         self.log = logging.getLogger(__name__)
@@ -83,6 +153,40 @@ class FGAPIServerPTV:
         self.portal_tv_user = kwargs.get('tv_user', '')
         self.portal_tv_pass = kwargs.get('tv_password', '')
         self.fgapiserver_db = kwargs.get('fgapiserver_db', None)
+        self.cache_ttl = int(kwargs.get('cache_ttl', def_ptv_cache_ttl))
+        self.negative_ttl = int(kwargs.get('negative_ttl',
+                                           def_ptv_cache_negative_ttl))
+        self.conn_timeout = float(kwargs.get('conn_timeout',
+                                             def_ptv_conn_timeout))
+        self.read_timeout = float(kwargs.get('read_timeout',
+                                             def_ptv_read_timeout))
+        self.retries = int(kwargs.get('retries', def_ptv_retries))
+        self.backoff = float(kwargs.get('backoff', def_ptv_backoff))
+        self.breaker_failures = int(kwargs.get('breaker_failures',
+                                               def_ptv_breaker_failures))
+        self.breaker_reset = float(kwargs.get('breaker_reset',
+                                              def_ptv_breaker_reset))
+        pool_size = int(kwargs.get('pool_size', def_ptv_pool_size))
+        # Kept alive connections to the portal
+        self.session = requests.Session()
+        self.session.auth = requests.auth.HTTPBasicAuth(self.portal_tv_user,
+                                                        self.portal_tv_pass)
+        self.session.verify = False
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # Circuit breaker and statistics
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.open_until = 0
+        self.stats = {'calls': 0,
+                      'failures': 0,
+                      'retries': 0,
+                      'short_circuits': 0,
+                      'breaker_opened': 0,
+                      'latency_total': 0.0,
+                      'latency_max': 0.0}
 
         self.log.debug("Initializing PTV with:\n"
                        "  Endpoint: '%s'\n"
@@ -111,40 +215,283 @@ class FGAPIServerPTV:
         The return of user and group field is not mandatory for the portal.
         """
         self.log.debug("Validating token: '%s'", token)
-        self.log.debug("Connecting PTV service: '%s'" % self.portal_endpoint)
+        token_key = self.token_key(token)
+        validated_token = ptv_cache.get(token_key)
+        if validated_token is None:
+            # Only one thread at time contacts the portal for a given token
+            with ptv_inflight_lock:
+                inflight = ptv_inflight.get(token_key, None)
+                leader = inflight is None
+                if leader:
+                    inflight = {'event': threading.Event(), 'result': None}
+                    ptv_inflight[token_key] = inflight
+            if leader:
+                try:
+                    validated_token = self.portal_validate_token(token)
+                    inflight['result'] = validated_token
+                finally:
+                    with ptv_inflight_lock:
+                        del ptv_inflight[token_key]
+                    inflight['event'].set()
+            else:
+                self.log.debug("Waiting in progress validation of token: "
+                               "'%s'", token)
+                inflight['event'].wait()
+                validated_token = inflight['result']
+                if validated_token is None:
+                    validated_token = self.portal_validate_token(token)
+        else:
+            self.log.debug("Using cached validation of token: '%s'", token)
+        # Callers may change the returned values; never share cached ones
+        validated_token = copy.deepcopy(validated_token)
+        self.log.debug("Validated token:\n"
+                       "%s" % validated_token)
+        return validated_token
+
+    def token_key(self, token):
+        """
+        Return the key used to cache token validation results; the same
+        token may be validated differently by different portals and tokens
+        are never stored as they are
 
+        :param token: The incoming API token
+        :return: the (PTV endpoint, token hash) pair
+        """
+        if isinstance(token, unicode):
+            token = token.encode('utf-8')
+        return self.portal_endpoint, hashlib.sha256('%s' % token).hexdigest()
+
+    def portal_validate_token(self, token):
+        """
+        Contact the portal to validate the given token and cache the
+        result; results of failed portal calls are not cached
+
+        :param token: The incoming API token
+        :return: return the validated token map (see validate_token)
+        """
+        self.log.debug("Connecting PTV service: '%s'" % self.portal_endpoint)
         token_info = {}
         post_data = {'token': token}
-        try:
-            response = requests.post(self.portal_endpoint,
-                                     auth=requests.auth.HTTPBasicAuth(
-                                         self.portal_tv_user,
-                                         self.portal_tv_pass),
-                                     data=post_data,
-                                     verify=False)
-            token_info = response.json()
-            response.close()
-            self.log.debug("Retrieved token info:\n"
-                           "%s" % token_info)
-        except requests.ConnectionError, e:
-            self.log.error("Unable to get token info: '%s'", e)
-
-        # Now fill class values
-        self.portal_validate = \
+        portal_error = True
+        if not self.breaker_allow():
+            self.log.error("PTV service '%s' is not available; "
+                           "circuit breaker is open" % self.portal_endpoint)
+        else:
+            attempt = 0
+            while True:
+                call_start = time.time()
+                retry = False
+                try:
+                    response = self.session.post(
+                        self.portal_endpoint,
+                        data=post_data,
+                        timeout=(self.conn_timeout, self.read_timeout))
+                    try:
+                        if response.status_code >= 500:
+                            retry = True
+                            self.log.error("PTV service returned: %s"
+                                           % response.status_code)
+                        else:
+                            token_info = response.json()
+                            portal_error = False
+                            self.log.debug("Retrieved token info:\n"
+                                           "%s" % token_info)
+                    finally:
+                        response.close()
+                except (requests.ConnectionError, requests.Timeout), e:
+                    retry = True
+                    self.log.error("Unable to get token info: '%s'", e)
+                except ValueError, e:
+                    self.log.error("Unable to decode token info: '%s'", e)
+                self.call_done(time.time() - call_start, portal_error)
+                if not retry or attempt >= self.retries:
+                    break
+                time.sleep(self.backoff * 2 ** attempt)
+                attempt += 1
+                with self.lock:
+                    self.stats['retries'] += 1
+            self.breaker_done(portal_error)
+
+        portal_validate = \
             token_info.get('subject', '') is not None\
             and len(token_info.get('subject', '')) > 0
-        self.portal_user = token_info.get('user', '')
-        self.portal_group = token_info.get('group', '')
-        self.portal_groups = token_info.get('groups', [])
-        self.portal_subject = token_info.get('subject', None)
-
         validated_token = {
-            "portal_validate": self.portal_validate,
-            "portal_user": self.portal_user,
-            "portal_group": self.portal_group,
-            "portal_groups": self.portal_groups,
-            "portal_subject": self.portal_subject
+            "portal_validate": portal_validate,
+            "portal_user": token_info.get('user', ''),
+            "portal_group": token_info.get('group', ''),
+            "portal_groups": token_info.get('groups', []),
+            "portal_subject": token_info.get('subject', None)
         }
-        self.log.debug("Validated token:\n"
-                       "%s" % validated_token)
+        if not portal_error:
+            ptv_cache.set(self.token_key(token),
+                          validated_token,
+                          self.cache_ttl if portal_validate
+                          else self.negative_ttl)
         return validated_token
+
+    def breaker_allow(self):
+        """
+        Check the circuit breaker; once the breaker_reset time is elapsed
+        a single portal call is allowed to verify the portal availability
+
+        :return: True if the portal can be contacted
+        """
+        with self.lock:
+            if self.open_until == 0:
+                return True
+            if time.time() >= self.open_until:
+                self.open_until = time.time() + self.breaker_reset
+                return True
+            self.stats['short_circuits'] += 1
+            return False
+
+    def breaker_done(self, failed):
+        """
+        Update the circuit breaker with the result of a portal validation
+
+        :param failed: True if the portal could not validate the token
+        :return: None
+        """
+        with self.lock:
+            if not failed:
+                self.failures = 0
+                self.open_until = 0
+                return
+            self.failures += 1
+            if self.failures >= self.breaker_failures:
+                if self.open_until == 0:
+                    self.stats['breaker_opened'] += 1
+                self.open_until = time.time() + self.breaker_reset
+
+    def call_done(self, latency, failed):
+        """
+        Update portal call statistics
+
+        :param latency: call duration in seconds
+        :param failed: True if the call failed
+        :return: None
+        """
+        with self.lock:
+            self.stats['calls'] += 1
+            if failed:
+                self.stats['failures'] += 1
+            self.stats['latency_total'] += latency
+            if latency > self.stats['latency_max']:
+                self.stats['latency_max'] = latency
+
+    def get_stats(self):
+        """
+        Return portal calls, circuit breaker and connection pool statistics
+
+        :return: statistics map
+        """
+        with self.lock:
+            stats = dict(self.stats)
+            stats['breaker_open'] = self.open_until != 0
+            stats['consecutive_failures'] = self.failures
+        stats['latency_avg'] = (stats['latency_total'] / stats['calls']
+                                if stats['calls'] > 0 else 0.0)
+        adapter = self.session.get_adapter(self.portal_endpoint or 'http://')
+        stats['pool_size'] = adapter._pool_maxsize
+        stats['pools'] = len(adapter.poolmanager.pools)
+        stats['cache'] = ptv_cache.get_stats()
+        return stats
+
+
+def get_ptv(**kwargs):
+    """
+    Retrieve the PTV object associated to the given settings, creating it
+    when it does not exist yet; see FGAPIServerPTV for accepted settings
+
+    :return: The FGAPIServerPTV object shared by the whole process
+    """
+    ptv_key = tuple(sorted(kwargs.items()))
+    with ptv_clients_lock:
+        ptv = ptv_clients.get(ptv_key, None)
+        if ptv is None:
+            ptv = FGAPIServerPTV(**kwargs)
+            ptv_clients[ptv_key] = ptv
+    return ptv
+
+
+def get_ptv_stats():
+    """
+    Return the statistics of any PTV object of the process
+
+    :return: list of statistics maps, one for each PTV endpoint
+    """
+    with ptv_clients_lock:
+        ptvs = ptv_clients.values()
+    return [dict(ptv.get_stats(), endpoint=ptv.portal_endpoint)
+            for ptv in ptvs]
+
+
+"""
+  FGAPIServerPTVMap - Compiled PTV user map file (fgapisrv_ptvmapfile)
+
+  The map file associates each APIServer user to a list of portal user and
+  group names:
+
+    { "<APIServer user>": [ "<portal user or group>", ... ], ... }
+
+  The map is compiled in a reverse index: portal name -> APIServer user.
+  When the same portal name is associated to more APIServer users, the
+  first one in the file wins. Portal names are resolved with the following
+  precedence: the portal user, then the portal group, then the portal
+  groups in the same order returned by the portal
+"""
+
+
+class FGAPIServerPTVMap:
+
+    ptvmap_file = None
+    ptvmap_mtime = None
+    portal_names = {}
+
+    def __init__(self, ptvmap_file, ptvmap_mtime=None):
+        self.ptvmap_file = ptvmap_file
+        self.ptvmap_mtime = ptvmap_mtime
+        self.portal_names = {}
+        with open(ptvmap_file) as ptvmap_fd:
+            ptvmap = json.load(ptvmap_fd, object_pairs_hook=OrderedDict)
+        for fg_user, portal_names in ptvmap.items():
+            for portal_name in portal_names:
+                self.portal_names.setdefault(portal_name, fg_user)
+
+    def map_user(self, portal_user, portal_group, portal_groups):
+        """
+        Return the APIServer user mapped by the given portal user or groups
+
+        :param portal_user: portal user name
+        :param portal_group: portal group name
+        :param portal_groups: list of portal group names
+        :return: the APIServer user name or None if no mapping exists
+        """
+        for portal_name in [portal_user, portal_group] + \
+                list(portal_groups or []):
+            if portal_name:
+                fg_user = self.portal_names.get(portal_name, None)
+                if fg_user is not None:
+                    return fg_user
+        return None
+
+
+def get_ptv_map(ptvmap_file):
+    """
+    Retrieve the compiled PTV user map of the given file; the map is
+    compiled again only when the file modification time changes
+
+    :param ptvmap_file: PTV user map file path
+    :return: The FGAPIServerPTVMap object shared by the whole process
+    """
+    ptvmap_mtime = os.stat(ptvmap_file).st_mtime
+    ptvmap = ptv_maps.get(ptvmap_file, None)
+    if ptvmap is None or ptvmap.ptvmap_mtime != ptvmap_mtime:
+        with ptv_maps_lock:
+            ptvmap = ptv_maps.get(ptvmap_file, None)
+            if ptvmap is None or ptvmap.ptvmap_mtime != ptvmap_mtime:
+                ptvmap = FGAPIServerPTVMap(ptvmap_file, ptvmap_mtime)
+                ptv_maps[ptvmap_file] = ptvmap
+                logging.getLogger(__name__).debug(
+                    "PTV map file '%s' loaded" % ptvmap_file)
+    return ptvmap
@@ -34,7 +34,7 @@ fgapiserver_queries = [
      'result': [['test', ], ]},
     {'id': 1,
      'query': 'select version from db_patches order by id desc limit 1;',
-     'result': [['0.0.13'], ]},
+     'result': [['0.0.16'], ]},
     {'id': 2,
      'query': 'select id\n'
               'from fg_user\n'
@@ -56,7 +56,7 @@ fgapiserver_queries = [
                ',user\n'
                ',iosandbox\n'
                'from task\n'
-               'where id=%s\n'
+               'where id in (%s)\n'
                '  and status != \'PURGED\';'),
      'result': [['1',
                  'WAITING',
@@ -67,32 +67,37 @@ fgapiserver_queries = [
                  'test user',
                  '/tmp/test']], },
     {'id': 5,
-     'query': ('select argument\n'
+     'query': ('select task_id\n'
+               '      ,argument\n'
                'from task_arguments\n'
-               'where task_id=%s\n'
-               'order by arg_id asc;'),
-     'result': [['argument'], ]},
+               'where task_id in (%s)\n'
+               'order by task_id asc, arg_id asc;'),
+     'result': [['1', 'argument'], ]},
     {'id': 6,
-     'query': ('select file\n'
+     'query': ('select task_id\n'
+               '      ,file\n'
                '      ,if(path is null or length(path)=0,'
                '          \'NEEDED\','
                '          \'READY\') status\n'
                '      ,if(path is NULL,\'\',path)\n'
                'from task_input_file\n'
-               'where task_id=%s\n'
-               'order by file_id asc;'),
-     'result': [['input_file_1', 'NEEDED', ''],
-                ['input_file_2', 'READY', '/tmp/test'], ]},
+               'where task_id in (%s)\n'
+               'order by task_id asc, file_id asc;'),
+     'result': [['1', 'input_file_1', 'NEEDED', ''],
+                ['1', 'input_file_2', 'READY', '/tmp/test'], ]},
     {'id': 7,
-     'query': ('select file\n'
+     'query': ('select task_id\n'
+               '      ,file\n'
                '      ,if(path is NULL,\'\',path)\n'
                'from task_output_file\n'
-               'where task_id=%s\n'
-               'order by file_id asc;'),
-     'result': [['output_file_1', '/tmp'], ['output_file_2', '/tmp'], ]},
+               'where task_id in (%s)\n'
+               'order by task_id asc, file_id asc;'),
+     'result': [['1', 'output_file_1', '/tmp'],
+                ['1', 'output_file_2', '/tmp'], ]},
     {'id': 8,
      'query': ('select '
-               '  data_name\n'
+               '  task_id\n'
+               ' ,data_name\n'
                ' ,data_value\n'
                ' ,data_desc\n'
                ' ,data_type\n'
@@ -102,16 +107,18 @@ fgapiserver_queries = [
                ' ,date_format(last_change,'
                '              \'%Y-%m-%dT%TZ\') last_change\n'
                'from runtime_data\n'
-               'where task_id=%s\n'
-               'order by data_id asc;'),
-     'result': [['userdata_name_1',
+               'where task_id in (%s)\n'
+               'order by task_id asc, data_id asc;'),
+     'result': [['1',
+                 'userdata_name_1',
                  'userdata_value_1',
                  'userdata_desc_1',
                  'NULL',
                  'NULL',
                  '1970-01-01T00:00:00',
                  '1970-01-01T00:00:00'],
-                ['userdata_name_2',
+                ['1',
+                 'userdata_name_2',
                  'userdata_value_2',
                  'userdata_desc_2',
                  'NULL',
@@ -181,9 +188,13 @@ fgapiserver_queries = [
     {'id': 14,
      'query': ('select if((creation+expiry)-now()>0,user_id,NULL) user_id\n'
                '      ,(select name from fg_user where id=user_id) name\n'
+               '      ,timestampdiff(second,\n'
+               '                     now(),\n'
+               '                     creation + interval expiry second)'
+               ' lasting\n'
                'from fg_token\n'
                'where token=%s;'),
-     'result': [['1', 'test_user'], ]},
+     'result': [['1', 'test_user', 86400], ]},
     {'id': 15,
      'query': ('select task_id from task_output_file\n'
                'where file=%s and path=%s\n'
@@ -258,7 +269,7 @@ fgapiserver_queries = [
                'where id = %s;'),
      'result': ['1']},
     {'id': 22,
-     'query': ('select count(*)>0      \n'
+     'query': ('select distinct r.name\n'
                'from fg_user        u  \n'
                '    ,fg_group       g  \n'
                '    ,fg_user_group ug  \n'
@@ -269,9 +280,42 @@ fgapiserver_queries = [
                '  and u.id=ug.user_id  \n'
                '  and g.id=ug.group_id \n'
                '  and g.id=gr.group_id \n'
-               '  and r.id=gr.role_id  \n'
-               '  and r.name = %s;'),
-     'result': ['1']},
+               '  and r.id=gr.role_id;'),
+     'result': [['app_change', ],
+                ['app_delete', ],
+                ['app_install', ],
+                ['app_run', ],
+                ['app_view', ],
+                ['group_change', ],
+                ['group_impersonate', ],
+                ['groups_apps_change', ],
+                ['groups_apps_view', ],
+                ['groups_change', ],
+                ['groups_roles_change', ],
+                ['groups_roles_view', ],
+                ['groups_view', ],
+                ['infra_add', ],
+                ['infra_attach', ],
+                ['infra_change', ],
+                ['infra_delete', ],
+                ['infra_detach', ],
+                ['infra_view', ],
+                ['role_change', ],
+                ['roles_view', ],
+                ['task_delete', ],
+                ['task_statuschange', ],
+                ['task_userdata', ],
+                ['task_view', ],
+                ['test_role', ],
+                ['user_add', ],
+                ['user_change', ],
+                ['user_del', ],
+                ['user_impersonate', ],
+                ['users_change', ],
+                ['users_groups_change', ],
+                ['users_groups_view', ],
+                ['users_tasks_view', ],
+                ['users_view', ], ]},
     {'id': 23,
      'query': ('select count(*)>1               \n'
                'from fg_user_group              \n'
@@ -438,18 +482,11 @@ fgapiserver_queries = [
                'order by file_id asc;'),
      'result': [['test_app_file1', '/path/to/file1', 0],
                 ['test_app_file2', '/path/to/file2', 1], ]},
-    {'id': 41,
-     'query': 'select max(id) from task;',
-     'result': [[1], ]},
     {'id': 42,
      'query': ('insert into task_output_file (task_id\n'
                '                             ,file_id\n'
                '                             ,file)\n'
-               'select %s\n'
-               '      ,if(max(file_id) is NULL,1,max(file_id)+1)\n'
-               '      ,%s\n'
-               'from task_output_file\n'
-               'where task_id=%s'),
+               'values (%s,%s,%s);'),
      'result': []},
     {'id': 43,
      'query': 'select '
@@ -534,33 +571,27 @@ fgapiserver_queries = [
                '          %s);'),
      'result': []},
     {'id': 51,
-     'query': ('insert into task (id\n'
-               '                 ,creation\n'
+     'query': ('insert into task (creation\n'
                '                 ,last_change\n'
                '                 ,app_id\n'
                '                 ,description\n'
                '                 ,status\n'
                '                 ,user\n'
                '                 ,iosandbox)\n'
-               'select if(max(id) is NULL,1,max(id)+1) -- new id\n'
-               '      ,now()                           -- creation date\n'
-               '      ,now()                           -- last change\n'
-               '      ,%s                              -- app_id\n'
-               '      ,%s                              -- description\n'
-               '      ,\'WAITING\'                     -- status WAITING\n'
-               '      ,%s                              -- user\n'
-               '      ,%s                              -- iosandbox\n'
-               'from task;\n'),
+               'values (now()      -- creation date\n'
+               '       ,now()      -- last change\n'
+               '       ,%s         -- app_id\n'
+               '       ,%s         -- description\n'
+               '       ,\'WAITING\'  -- status WAITING\n'
+               '       ,%s         -- user\n'
+               '       ,%s         -- iosandbox\n'
+               '       );'),
      'result': []},
     {'id': 52,
      'query': ('insert into task_arguments (task_id\n'
                '                           ,arg_id\n'
                '                           ,argument)\n'
-               'select %s\n'
-               '      ,if(max(arg_id) is NULL,1,max(arg_id)+1)\n'
-               '      ,%s\n'
-               'from task_arguments\n'
-               'where task_id=%s'),
+               'values (%s,%s,%s);'),
      'result': []},
     {'id': 53,
      'query': ('update task set status=\'SUBMIT\', \n'
@@ -848,7 +879,8 @@ fgapiserver_queries = [
                '    name=%s,\n'
                '    description=%s,\n'
                '    outcome=%s,\n'
-               '    enabled=%s\n'
+               '    enabled=%s,\n'
+               '    version=version+1\n'
                'where id=%s;'),
      'result': None},
     {'id': 80,
@@ -1161,6 +1193,126 @@ fgapiserver_queries = [
     {'id': 114,
      'query': 'delete from application where id=%s;',
      'result': None},
+    {'id': 115,
+     'query': ('select count(*)\n'
+               'from task\n'
+               'where status != \'PURGED\'\n'
+               '  and user = %s\n'
+               '  and status = %s\n'
+               ';'),
+     'result': [[1, ], ]},
+    {'id': 116,
+     'query': ('select id\n'
+               'from task\n'
+               'where status != \'PURGED\'\n'
+               '  and user = %s\n'
+               '  and status = %s\n'
+               'order by id desc\n'
+               'limit %s offset %s;'),
+     'result': [[1, ], ]},
+    {'id': 117,
+     'query': ('select id\n'
+               'from task\n'
+               'where status != \'PURGED\'\n'
+               '  and user = %s\n'
+               '  and id < %s\n'
+               'order by id desc\n'
+               'limit %s;'),
+     'result': [[1, ], [0, ], ]},
+    {'id': 118,
+     'query': ('select id, name\n'
+               'from fg_user\n'
+               'where name=%s\n'
+               '  and password=sha(%s);'),
+     'result': [[1, 'test'], ]},
+    {'id': 119,
+     'query': ('update fg_token set expiry = 0\n'
+               'where token = %s;'),
+     'result': []},
+    {'id': 120,
+     'query': ('delete from fg_token\n'
+               'where creation < now() - interval %s second\n'
+               '  and creation + interval (coalesce(expiry, 0) + %s)'
+               ' second < now()\n'
+               'limit %s;'),
+     'result': []},
+    {'id': 121,
+     'query': ('select file\n'
+               '      ,path\n'
+               'from application_file\n'
+               'where app_id = (select app_id\n'
+               '                from task\n'
+               '                where id=%s)'
+               '  and path is not NULL;'),
+     'result': []},
+    {'id': 122,
+     'query': ('select task_id\n'
+               '      ,file\n'
+               '      ,path\n'
+               'from task_output_file\n'
+               'where task_id in (%s)\n'
+               '  and path is not null\n'
+               'order by task_id asc, file_id asc;'),
+     'result': [['1', 'output_file_1', '/tmp/fgapiserver_archive_test'],
+                ['1', 'output_file_2', '/tmp/fgapiserver_archive_test']]},
+    {'id': 123,
+     'query': 'update application set version=version+1 where id=%s;',
+     'result': None},
+    {'id': 124,
+     'query': ('update application set version=version+1\n'
+               'where id in (select app_id\n'
+               '             from infrastructure\n'
+               '             where id=%s);'),
+     'result': None},
+    {'id': 125,
+     'query': ('select version\n'
+               'from application\n'
+               'where id = %s;'),
+     'result': [[3], ]},
+    {'id': 126,
+     'query': ('select t.app_id\n'
+               '      ,t.user\n'
+               '      ,t.status\n'
+               '      ,t.last_change\n'
+               '      ,(select concat(count(*),\'/\',\n'
+               '                      coalesce(max(r.last_change),\'\'))\n'
+               '        from runtime_data r\n'
+               '        where r.task_id=t.id) runtime_data\n'
+               '      ,(select count(*)\n'
+               '        from task_input_file i\n'
+               '        where i.task_id=t.id\n'
+               '          and i.path is not null) input_files\n'
+               '      ,(select count(*)\n'
+               '        from task_output_file o\n'
+               '        where o.task_id=t.id\n'
+               '          and o.path is not null) output_files\n'
+               'from task t\n'
+               'where t.id=%s\n'
+               '  and t.status != \'PURGED\';'),
+     'result': [['1', 'futuregateway', 'WAITING', '1970-01-01 00:00:00',
+                 '1/1970-01-01 00:00:00', '1', '0'], ]},
+    {'id': 127,
+     'query': ('select id\n'
+               'from task\n'
+               'where status != \'PURGED\'\n'
+               '  and user = %s\n'
+               'order by id desc\n'
+               'limit %s;'),
+     'result': [[1, ], [0, ]]},
+    {'id': 128,
+     'query': ('insert ignore into fg_token_revoked (token_id, expiry)\n'
+               'values (%s, from_unixtime(%s));'),
+     'result': []},
+    {'id': 129,
+     'query': ('select token_id, unix_timestamp(expiry)\n'
+               'from fg_token_revoked\n'
+               'where expiry > now();'),
+     'result': [['TEST_REVOKED_TOKEN_ID', 4102444800], ]},
+    {'id': 130,
+     'query': ('delete from fg_token_revoked\n'
+               'where expiry <= now()\n'
+               'limit %s;'),
+     'result': []},
 ]
 
 # fgapiserver tests queries
@@ -54,6 +54,8 @@ class cursor:
 
     position = 0
     cursor_results = None
+    lastrowid = 1
+    rowcount = 0
     _cnx = CNX()
 
     def __getitem__(self, i):
@@ -187,3 +189,15 @@ class connector:
         print("MySQLdb.commit")
         return None
 
+    def rollback(self):
+        print("MySQLdb.rollback")
+        return None
+
+    def is_connected(self):
+        print("MySQLdb.is_connected")
+        return True
+
+    def consume_results(self):
+        print("MySQLdb.consume_results")
+        return None
+
@@ -20,6 +20,7 @@
 
 import unittest
 import fgapiserver
+import fgapiserver_tools
 import hashlib
 import json
 import os
@@ -52,6 +53,8 @@ class TestUsersAPIs(unittest.TestCase):
         self.app = app.test_client()
         self.app.testing = True
         self.app.debug = True
+        # Expected results are readable JSON outputs
+        fgapiserver_tools.fg_config['fgjson_compact'] = False
 
     @staticmethod
     def banner(test_name):
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# Copyright (c) 2015:
+# Istituto Nazionale di Fisica Nucleare (INFN), Italy
+#
+# See http://www.infn.it  for details on the copyrigh holder
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import unittest
+import subprocess
+import fgapiserver_db
+from fgapiserver_db import FGAPIServerDB
+
+__author__ = 'Riccardo Bruno'
+__copyright__ = '2019'
+__license__ = 'Apache'
+__version__ = 'v0.0.10'
+__maintainer__ = 'Riccardo Bruno'
+__email__ = 'riccardo.bruno@ct.infn.it'
+__status__ = 'devel'
+__update__ = '2019-10-18 15:19:14'
+
+# The tests in this file need a real database, the mysql.connector module
+# used by the other tests is a mock, so that queries are executed through
+# the mysql client; database access settings are the same of fgapiserver.conf
+# and they can be overridden by the corresponding environment variables
+db_settings = {
+    'fgapisrv_db_host': 'localhost',
+    'fgapisrv_db_port': '3306',
+    'fgapisrv_db_user': 'fgapiserver',
+    'fgapisrv_db_pass': 'fgapiserver_password',
+    'fgapisrv_db_name': 'fgapiserver'}
+
+# Queries executed on each API call or on large tables, each query is
+# associated to the tables that must not be fully scanned; statements are
+# the same executed by fgapiserver_db, only query parameters are given here
+task_clause, task_data = FGAPIServerDB.task_list_filter('test', None, None)
+hot_queries = [
+    {'name': 'verify_session_token',
+     'tables': ['fg_token'],
+     'query': fgapiserver_db.sql_verify_session_token,
+     'query_data': ('TESTSESSIONTOKEN',)},
+    {'name': 'user_token',
+     'tables': ['fg_token'],
+     'query': fgapiserver_db.sql_user_token,
+     'query_data': ('TESTSESSIONTOKEN',)},
+    {'name': 'delete_expired_tokens',
+     'tables': ['fg_token'],
+     'query': fgapiserver_db.sql_delete_expired_tokens,
+     'query_data': (604800, 604800, 500)},
+    {'name': 'get_task_list',
+     'tables': ['task'],
+     'query': fgapiserver_db.sql_task_list % (task_clause, '\nlimit %s'),
+     'query_data': task_data + (10,)},
+    {'name': 'get_task_count',
+     'tables': ['task'],
+     'query': fgapiserver_db.sql_task_count % task_clause,
+     'query_data': task_data},
+    {'name': 'get_task_version',
+     'tables': ['task', 'runtime_data', 'task_input_file', 'task_output_file'],
+     'query': fgapiserver_db.sql_task_version,
+     'query_data': (1,)},
+    {'name': 'get_file_task_id',
+     'tables': ['task_input_file', 'task_output_file'],
+     'query': fgapiserver_db.sql_file_task_id,
+     'query_data': ('test.txt', '/tmp/test', 'test.txt', '/tmp/test')},
+    {'name': 'get_user_roles',
+     'tables': ['fg_user_group'],
+     'query': fgapiserver_db.sql_user_roles,
+     'query_data': (1,)},
+]
+
+
+def sql_literal(value):
+    """
+    Return the SQL literal of the given query parameter
+    :param value: query parameter
+    :return: SQL literal
+    """
+    if isinstance(value, (int, long)):
+        return str(value)
+    return "'%s'" % str(value).replace('\\', '\\\\').replace("'", "\\'")
+
+
+def db_setting(name):
+    """
+    Return the database setting value taking it from environment first
+    :param name: setting name
+    :return: setting value
+    """
+    return os.environ.get(name.upper(), db_settings[name])
+
+
+def explain(query):
+    """
+    Execute the EXPLAIN of the given query through the mysql client
+    :param query: SQL statement to explain
+    :return: list of dictionaries, one for each EXPLAIN output row
+    """
+    cmd = ['mysql',
+           '-h', db_setting('fgapisrv_db_host'),
+           '-P', db_setting('fgapisrv_db_port'),
+           '-u', db_setting('fgapisrv_db_user'),
+           '-p%s' % db_setting('fgapisrv_db_pass'),
+           '-B',
+           db_setting('fgapisrv_db_name'),
+           '-e', 'explain %s' % query]
+    output = subprocess.check_output(cmd).splitlines()
+    header = output[0].split('\t')
+    return [dict(zip(header, row.split('\t'))) for row in output[1:]]
+
+
+@unittest.skipUnless(os.environ.get('FGTESTS_DBEXPLAIN'),
+                     'FGTESTS_DBEXPLAIN not set; a real database is needed')
+class TestDBIndexes(unittest.TestCase):
+
+    def test_hot_queries(self):
+        for hot_query in hot_queries:
+            plan = explain(hot_query['query'] %
+                           tuple([sql_literal(value)
+                                  for value in hot_query['query_data']]))
+            self.assertTrue(len(plan) > 0)
+            for row in plan:
+                if row.get('table') not in hot_query['tables']:
+                    continue
+                self.assertNotEqual(
+                    'ALL', row.get('type'),
+                    "Full scan of table '%s' in query '%s'"
+                    % (row.get('table'), hot_query['name']))
+
+
+if __name__ == '__main__':
+    print("----------------------------------\n"
+          "Starting unit tests ...\n"
+          "----------------------------------\n")
+    unittest.main(failfast=True)
+    print("Tests completed")
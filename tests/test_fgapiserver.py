@@ -18,15 +18,30 @@
 
 import unittest
 import fgapiserver
+import fgapiserver_tools
 import hashlib
 import json
 import os
 import shutil
+import tarfile
+import time
+import zipfile
+import zlib
 from StringIO import StringIO
 from fgapiserver import app
 from mklogtoken import token_encode, token_decode, token_info
 from fgapiserver_user import User
-from fgapiserver_tools import get_fgapiserver_db
+from fgapiserver_tools import get_fgapiserver_db, signed_token_encode,\
+    signed_token_decode, signed_token_info, revoke_signed_token,\
+    is_revoked_token, update_db_config, get_db_config, db_config_state
+from fgapiserver_auth import authorize_user, bump_authz_generation,\
+    authz_cache
+from fgapiserver_tokensweeper import FGAPIServerTokenSweeper,\
+    sweep_tokens, start_token_sweeper
+from fgapiserver_archive import archive_stream, archive_check
+from fgapiserver_db import begin_db_session, end_db_session,\
+    session_token_cache, evict_session_token, evict_user_session_tokens,\
+    registered_token_cache
 
 __author__ = 'Riccardo Bruno'
 __copyright__ = '2019'
@@ -49,6 +64,8 @@ class TestfgAPIServer(unittest.TestCase):
         self.app = app.test_client()
         self.app.testing = True
         self.app.debug = True
+        # Expected results are readable JSON outputs
+        fgapiserver_tools.fg_config['fgjson_compact'] = False
 
     @staticmethod
     def banner(test_name):
@@ -90,7 +107,7 @@ class TestfgAPIServer(unittest.TestCase):
         self.assertEqual('test_token', user.get_token())
 
     def test_paginate_reposnse(self):
-        self.banner("paginate_response(txt,'2','3',[])")
+        self.banner("paginate_response(txt,'2','3',url)")
         response = ['111111111111111111111111111\n',
                     '222222222222222222222222222\n',
                     '333333333333333333333333333\n',
@@ -106,16 +123,20 @@ class TestfgAPIServer(unittest.TestCase):
         expected_page = (['444444444444444444444444444\n',
                           '555555555555555555555555555\n',
                           '666666666666666666666666666\n'],
-                         [{'href': '[]?page=1&per_page=3', 'rel': 'prev'},
-                          {'href': '[]?page=2&per_page=3', 'rel': 'self'},
-                          {'href': '[]?page=3&per_page=3', 'rel': 'next'},
-                          {'href': '[]?page=4&per_page=3', 'rel': 'next'}])
-        received_page = fgapiserver.paginate_response(response, '2', '3', [])
+                         [{'href': '/tasks?page=1&per_page=3', 'rel': 'first'},
+                          {'href': '/tasks?page=1&per_page=3', 'rel': 'prev'},
+                          {'href': '/tasks?page=2&per_page=3', 'rel': 'self'},
+                          {'href': '/tasks?page=3&per_page=3', 'rel': 'next'},
+                          {'href': '/tasks?page=4&per_page=3', 'rel': 'last'}])
+        received_page = fgapiserver.paginate_response(response,
+                                                      '2',
+                                                      '3',
+                                                      '/tasks')
         self.assertEqual(expected_page, received_page)
 
     def test_checkDbVer(self):
         self.banner("checkDbVer()")
-        self.assertEqual('0.0.13', fgapiserver.check_db_ver())
+        self.assertEqual('0.0.16', fgapiserver.check_db_ver())
 
     def test_fgapiserver(self):
         self.banner("get_task_app_id(1)")
@@ -135,6 +156,38 @@ class TestfgAPIServer(unittest.TestCase):
         conn = self.fgapisrv_db.connect()
         assert conn is not None
 
+    def test_dbobj_pool(self):
+        self.banner("Testing fgapiserverdb connection pool")
+        conn = self.fgapisrv_db.connect()
+        cnx = conn.cnx
+        conn.close()
+        conn.close()
+        stats = self.fgapisrv_db.get_pool_stats()
+        print("Pool stats: %s" % stats)
+        idle = stats['idle']
+        reused = stats['reused']
+        conn = self.fgapisrv_db.connect()
+        stats = self.fgapisrv_db.get_pool_stats()
+        print("Pool stats: %s" % stats)
+        self.assertEqual(cnx, conn.cnx)
+        self.assertEqual(idle - 1, stats['idle'])
+        self.assertEqual(reused + 1, stats['reused'])
+        conn.close()
+
+    def test_dbobj_session(self):
+        self.banner("Testing fgapiserverdb request session")
+        begin_db_session()
+        conn = self.fgapisrv_db.connect()
+        conn.close()
+        in_use = self.fgapisrv_db.get_pool_stats()['in_use']
+        conn_nested = self.fgapisrv_db.connect()
+        self.assertEqual(conn.cnx, conn_nested.cnx)
+        self.assertEqual(in_use, self.fgapisrv_db.get_pool_stats()['in_use'])
+        conn_nested.close()
+        end_db_session()
+        self.assertEqual(in_use - 1,
+                         self.fgapisrv_db.get_pool_stats()['in_use'])
+
     def test_dbobj_test(self):
         self.banner("Testing fgapiserverdb test")
         result = self.fgapisrv_db.test()
@@ -159,6 +212,42 @@ class TestfgAPIServer(unittest.TestCase):
         assert result[0] == '1'
         assert result[1] == 'test_user'
 
+    def test_dbobj_session_token_cache(self):
+        self.banner("Testing fgapiserverdb session token cache")
+        session_token_cache.clear()
+        self.fgapisrv_db.verify_session_token('TESTSESSIONTOKEN')
+        stats = session_token_cache.get_stats()
+        print("Cache stats: %s" % stats)
+        self.assertEqual(1, stats['size'])
+        result = self.fgapisrv_db.verify_session_token('TESTSESSIONTOKEN')
+        self.assertEqual(('1', 'test_user'), result)
+        self.assertEqual(stats['hits'] + 1,
+                         session_token_cache.get_stats()['hits'])
+        self.assertTrue(evict_session_token('TESTSESSIONTOKEN'))
+        self.assertFalse(evict_session_token('TESTSESSIONTOKEN'))
+        self.fgapisrv_db.verify_session_token('TESTSESSIONTOKEN')
+        self.assertEqual(1, evict_user_session_tokens(1))
+        self.assertEqual(0, session_token_cache.get_stats()['size'])
+
+    def test_authorize_user_cache(self):
+        self.banner("Testing authorize_user decision cache")
+        authz_cache.clear()
+        user = User(1, 'test', '')
+        result = authorize_user(user, None, 'test', 'app_run')
+        self.assertEqual((True, ''), result)
+        stats = authz_cache.get_stats()
+        print("Cache stats: %s" % stats)
+        self.assertEqual(1, stats['size'])
+        self.assertEqual(result, authorize_user(user, None, 'test', 'app_run'))
+        self.assertEqual(stats['hits'] + 1, authz_cache.get_stats()['hits'])
+        # A new generation invalidates cached decisions
+        bump_authz_generation()
+        self.assertEqual(result, authorize_user(user, None, 'test', 'app_run'))
+        self.assertEqual(stats['hits'] + 1, authz_cache.get_stats()['hits'])
+        # Different requests are cached separately
+        authorize_user(user, None, 'test', 'task_view')
+        self.assertEqual(3, authz_cache.get_stats()['size'])
+
     def test_get_token_info(self):
         self.banner("Testing fgapiserverdb get_token_info")
         result = self.fgapisrv_db.get_token_info('TESTSESSIONTOKEN')
@@ -176,6 +265,150 @@ class TestfgAPIServer(unittest.TestCase):
             'lasting': 1000}
         assert result == expected_result
 
+    def test_signed_token(self):
+        self.banner("Testing signed access tokens")
+        token = signed_token_encode(1, 'test')
+        print("Signed token: '%s'" % token)
+        payload = signed_token_decode(token)
+        self.assertEqual(1, payload['uid'])
+        self.assertEqual('test', payload['name'])
+        token_info = signed_token_info(token)
+        self.assertTrue(token_info['valid'])
+        self.assertEqual('test', token_info['user_name'])
+        # Tampered tokens
+        token_fields = token.split('.')
+        self.assertIsNone(signed_token_decode(
+            '%s.%s.%s' % (token_fields[0],
+                          token_fields[1][:-2],
+                          token_fields[2])))
+        self.assertIsNone(signed_token_decode(token[:-2]))
+        self.assertIsNone(signed_token_decode('TESTSESSIONTOKEN'))
+        # Expired tokens
+        self.assertIsNone(signed_token_decode(signed_token_encode(1,
+                                                                  'test',
+                                                                  0)))
+        # Tokens issued with a different token version
+        tokenver = fgapiserver_tools.fg_config['fgapisrv_tokenver']
+        fgapiserver_tools.fg_config['fgapisrv_tokenver'] = tokenver + 1
+        try:
+            self.assertIsNone(signed_token_decode(token))
+        finally:
+            fgapiserver_tools.fg_config['fgapisrv_tokenver'] = tokenver
+        # Revoked tokens
+        self.assertTrue(revoke_signed_token(token))
+        self.assertIsNone(signed_token_decode(token))
+        self.assertFalse(revoke_signed_token(token))
+        self.assertFalse('valid' in signed_token_info(token))
+        # Revocations stored by other front-ends
+        fgapiserver_tools.revoked_tokens_state['loaded'] = None
+        self.assertTrue(is_revoked_token('TEST_REVOKED_TOKEN_ID'))
+        self.assertFalse(is_revoked_token(json.loads(
+            fgapiserver_tools.signed_token_b64decode(
+                signed_token_encode(1, 'test').split('.')[1]))['jti']))
+
+    def test_revoked_tokens_reload(self):
+        self.banner("Revoked signed tokens reload")
+        fgapisrv_db = fgapiserver_tools.fgapisrv_db
+        token = signed_token_encode(1, 'test')
+        token_id = json.loads(fgapiserver_tools.signed_token_b64decode(
+            token.split('.')[1]))['jti']
+        self.assertTrue(revoke_signed_token(token))
+        checks = []
+
+        def get_revoked_token_ids():
+            # A request having checked the revocations age before the
+            # reload and a revocation not yet part of the DB copy
+            fgapiserver_tools.revoked_tokens_state['loaded'] = time.time()
+            checks.append(is_revoked_token(token_id))
+            return {'TEST_REVOKED_TOKEN_ID': 4102444800}
+
+        fgapisrv_db.get_revoked_token_ids = get_revoked_token_ids
+        try:
+            fgapiserver_tools.revoked_tokens_state['loaded'] = None
+            self.assertTrue(is_revoked_token('TEST_REVOKED_TOKEN_ID'))
+        finally:
+            del fgapisrv_db.get_revoked_token_ids
+        self.assertEqual([True], checks)
+        self.assertTrue(is_revoked_token(token_id))
+
+    def test_dbobj_revoke_signed_token_id(self):
+        self.banner("Testing fgapiserverdb revoke_signed_token_id")
+        result = self.fgapisrv_db.revoke_signed_token_id(
+            'TEST_REVOKED_TOKEN_ID', 4102444800)
+        state = self.fgapisrv_db.get_state()
+        print("DB state: %s" % (state,))
+        self.assertTrue(result)
+        result = self.fgapisrv_db.get_revoked_token_ids()
+        self.assertEqual({'TEST_REVOKED_TOKEN_ID': 4102444800}, result)
+        result = self.fgapisrv_db.delete_expired_revocations(500)
+        self.assertEqual(0, result)
+        assert self.fgapisrv_db.get_state()[0] is False
+
+    def test_dbobj_revoke_session_token(self):
+        self.banner("Testing fgapiserverdb revoke_session_token")
+        result = self.fgapisrv_db.revoke_session_token('TESTSESSIONTOKEN')
+        state = self.fgapisrv_db.get_state()
+        print("DB state: %s" % (state,))
+        self.assertTrue(result)
+        assert state[0] is False
+
+    def test_dbobj_delete_expired_tokens(self):
+        self.banner("Testing fgapiserverdb delete_expired_tokens")
+        result = self.fgapisrv_db.delete_expired_tokens(3600, 500)
+        state = self.fgapisrv_db.get_state()
+        print("DB state: %s" % (state,))
+        self.assertEqual(0, result)
+        assert state[0] is False
+
+    def test_sweep_tokens(self):
+        self.banner("Testing token sweeper")
+
+        class SweepDB:
+            batches = [3, 3, 1]
+
+            def delete_expired_tokens(self, retention, batch_size):
+                return self.batches.pop(0)
+
+            def delete_expired_revocations(self, batch_size):
+                return 0
+
+            def get_state(self):
+                return False, ''
+
+        registered_token_cache.set('TEST_PTV_TOKEN', True)
+        self.assertEqual(7, sweep_tokens(SweepDB(), 3600, 3, 0))
+        # Removed tokens are not considered registered anymore
+        self.assertIsNone(registered_token_cache.get('TEST_PTV_TOKEN'))
+        self.assertEqual(0, sweep_tokens(self.fgapisrv_db, 3600, 500))
+        self.assertIsNone(start_token_sweeper(0))
+        sweeper = FGAPIServerTokenSweeper(3600)
+        self.assertEqual(0, sweeper.sweep())
+        self.assertEqual(1, sweeper.get_stats()['sweeps'])
+
+    def test_update_db_config(self):
+        self.banner("Testing update_db_config")
+        # Served requests use the configuration applied by update_db_config
+        saved_state = dict(db_config_state)
+        db_config_state['cfg_hash'] = None
+        config = {'fgapisrv_notokenusr': 'test'}
+        try:
+            db_config = update_db_config(config, 'TEST_UUID')
+            self.assertEqual('TEST_CFG_HASH', db_config_state['cfg_hash'])
+            self.assertEqual('TEST_UUID', db_config_state['uuid'])
+            # DB settings replace the configuration object, never change it
+            self.assertIsNot(config, db_config)
+            self.assertEqual({'fgapisrv_notokenusr': 'test'}, config)
+            self.assertIs(db_config, get_db_config(config))
+            # Unchanged configuration hash does not load settings again
+            self.assertIs(db_config, update_db_config(config, 'TEST_UUID'))
+            state = fgapiserver_tools.fgapisrv_db.get_state()
+        finally:
+            db_config_state.update(saved_state)
+        print("DB state: %s" % (state,))
+        self.assertEqual(
+            (False, "Configuration hash of service having "
+                    "uuid: 'TEST_UUID' is 'TEST_CFG_HASH'"), state)
+
     def test_dbobj_register_token(self):
         self.banner("Testing fgapiserverdb register_token")
         result = self.fgapisrv_db.register_token(1, 'TESTSESSIONTOKEN', 'SUBJ')
@@ -183,6 +416,12 @@ class TestfgAPIServer(unittest.TestCase):
         print(result)
         print("DB state: %s" % (state,))
         assert state[0] is False
+        # Already registered tokens do not reach the database
+        self.fgapisrv_db.register_token(1, 'TESTSESSIONTOKEN', 'SUBJ')
+        state = self.fgapisrv_db.get_state()
+        print("DB state: %s" % (state,))
+        self.assertEqual(
+            (False, "token: 'TESTSESSIONTOKEN' already registered"), state)
 
     def test_dbobj_verify_user_role(self):
         self.banner("Testing fgapiserverdb verify_user_role")
@@ -192,6 +431,18 @@ class TestfgAPIServer(unittest.TestCase):
         assert state[0] is False
         assert result > 0
 
+    def test_dbobj_get_user_roles(self):
+        self.banner("Testing fgapiserverdb get_user_roles")
+        begin_db_session()
+        result = self.fgapisrv_db.get_user_roles(1)
+        state = self.fgapisrv_db.get_state()
+        print("DB state: %s" % (state,))
+        assert state[0] is False
+        assert 'task_view' in result
+        self.assertIs(result, self.fgapisrv_db.get_user_roles(1))
+        end_db_session()
+        self.assertIsNot(result, self.fgapisrv_db.get_user_roles(1))
+
     def test_dbobj_verify_user_app(self):
         self.banner("Testing fgapiserverdb verify_user_app")
         result = self.fgapisrv_db.verify_user_app(1, 1)
@@ -255,6 +506,57 @@ class TestfgAPIServer(unittest.TestCase):
         print(result)
         assert result['description'] == 'test task'
 
+    def test_dbobj_get_task_version(self):
+        self.banner("Testing fgapiserverdb get_task_version")
+        result = self.fgapisrv_db.get_task_version(1)
+        state = self.fgapisrv_db.get_state()
+        print("DB state: %s" % (state,))
+        assert state[0] is False
+        assert result['app_id'] == '1'
+        assert result['version'] == ('WAITING:1970-01-01 00:00:00:'
+                                     '1/1970-01-01 00:00:00:1:0')
+
+    def test_dbobj_user_tasks_retrieve(self):
+        self.banner("Testing fgapiserverdb user_tasks_retrieve")
+        result = self.fgapisrv_db.user_tasks_retrieve('test', None)
+        state = self.fgapisrv_db.get_state()
+        print("DB state: %s" % (state,))
+        assert state[0] is False
+        assert result == [1]
+
+    def test_dbobj_get_task_records(self):
+        self.banner("Testing fgapiserverdb get_task_records")
+        result = self.fgapisrv_db.get_task_records([1, ])
+        state = self.fgapisrv_db.get_state()
+        print("DB state: %s" % (state,))
+        assert state[0] is False
+        print(result)
+        self.assertEqual(1, len(result))
+        self.assertEqual(['argument', ], result[0]['arguments'])
+        self.assertEqual(2, len(result[0]['input_files']))
+        self.assertEqual(2, len(result[0]['output_files']))
+        self.assertEqual(2, len(result[0]['runtime_data']))
+
+    def test_dbobj_values_rows(self):
+        self.banner("Testing fgapiserverdb values_rows")
+        self.assertEqual('(%s,%s)\n      ,(%s,%s)\n      ,(%s,%s)',
+                         self.fgapisrv_db.values_rows(2, 3))
+
+    def test_dbobj_check_task_submission(self):
+        self.banner("Testing fgapiserverdb check_task_submission")
+        app_info = {'enabled': True,
+                    'parameters': [],
+                    'infrastructures': [{'id': '1', 'status': 'enabled'}, ]}
+        self.assertTrue(
+            self.fgapisrv_db.check_task_submission(1, 'WAITING', app_info))
+        self.assertFalse(
+            self.fgapisrv_db.check_task_submission(1, 'SUBMIT', app_info))
+        app_info['infrastructures'][0]['status'] = 'disabled'
+        self.assertFalse(
+            self.fgapisrv_db.check_task_submission(1, 'WAITING', app_info))
+        self.assertFalse(
+            self.fgapisrv_db.check_task_submission(1, 'WAITING', {}))
+
     def test_dbobj_get_task_status(self):
         self.banner("Testing fgapiserverdb get_task_status")
         result = self.fgapisrv_db.get_task_status(1)
@@ -352,6 +654,29 @@ class TestfgAPIServer(unittest.TestCase):
         assert state[0] is False
         assert result == 1
 
+    def test_dbobj_init_task_app_files_error(self):
+        self.banner("Testing fgapiserverdb init_task failing app files")
+
+        def get_app_files_error(application):
+            self.fgapisrv_db.err_flag = True
+            self.fgapisrv_db.err_msg = "[ERROR] 2013: Lost connection"
+            return []
+
+        self.fgapisrv_db.get_app_files = get_app_files_error
+        try:
+            result = self.fgapisrv_db.init_task(1,
+                                                'test_application',
+                                                'test_user',
+                                                [],
+                                                [],
+                                                [])
+        finally:
+            del self.fgapisrv_db.get_app_files
+        state = self.fgapisrv_db.get_state()
+        print("DB state: %s" % (state,))
+        assert state[0] is True
+        assert result == -1
+
     def test_dbobj_get_task_io_sandbox(self):
         self.banner("Testing fgapiserverdb get_task_io_sandbox")
         result = self.fgapisrv_db.get_task_io_sandbox(1)
@@ -525,6 +850,14 @@ class TestfgAPIServer(unittest.TestCase):
         assert state[0] is False
         assert result is True
 
+    def test_dbobj_get_app_version(self):
+        self.banner("Testing fgapiserverdb get_app_version")
+        result = self.fgapisrv_db.get_app_version(1)
+        state = self.fgapisrv_db.get_state()
+        print("DB state: %s" % (state,))
+        assert state[0] is False
+        assert result == 3
+
     def test_dbobj_get_app_list(self):
         self.banner("Testing fgapiserverdb get_app_list")
         result = self.fgapisrv_db.get_app_list()
@@ -742,6 +1075,208 @@ class TestfgAPIServer(unittest.TestCase):
         self.assertEqual("8ba55904600d405ea07f71e499ca3aa5",
                          self.md5sum_str(result.data))
 
+    def test_get_file(self):
+        self.banner("GET /v1.0/file")
+        iosandbox = fgapiserver.fg_config['fgapisrv_iosandbox']
+        test_file = os.path.join(iosandbox, 'fgapiserver_test_file')
+        with open(test_file, 'w') as f:
+            f.write('0123456789')
+        url = ('/v1.0/file?path=%s&name=fgapiserver_test_file'
+               % iosandbox)
+        try:
+            result = self.app.get(url)
+            print("Result: '%s'" % result)
+            self.assertEqual(200, result.status_code)
+            self.assertEqual('0123456789', result.data)
+            etag = result.headers['ETag']
+            result.close()
+            # Range requests
+            result = self.app.get(url, headers={'Range': 'bytes=2-5'})
+            print("Result: '%s'" % result)
+            self.assertEqual(206, result.status_code)
+            self.assertEqual('2345', result.data)
+            self.assertEqual('bytes 2-5/10', result.headers['Content-Range'])
+            result.close()
+            # Conditional requests
+            result = self.app.get(url, headers={'If-None-Match': etag})
+            print("Result: '%s'" % result)
+            self.assertEqual(304, result.status_code)
+            result.close()
+            # Transfer delegated to the front-end server
+            fgapiserver.fg_config['fgapisrv_xsendfile'] = 'X-Accel-Redirect'
+            result = self.app.get(url)
+            print("Result: '%s'" % result)
+            self.assertEqual('/fgapiserver_iosandbox/fgapiserver_test_file',
+                             result.headers['X-Accel-Redirect'])
+            self.assertEqual('', result.data)
+        finally:
+            fgapiserver.fg_config['fgapisrv_xsendfile'] = ''
+            os.remove(test_file)
+        # Unexisting files
+        result = self.app.get(url)
+        self.assertEqual(404, result.status_code)
+
+    def test_task_input_upload(self):
+        self.banner("Resumable upload of task input files")
+        task_sandbox = '/tmp/iosandbox'
+        if not os.path.isdir(task_sandbox):
+            os.makedirs(task_sandbox)
+        # Negative sizes are rejected
+        result = self.app.post('/v1.0/tasks/1/input/uploads',
+                               data=json.dumps({'name': 'test_upload_file',
+                                                'size': -1}),
+                               content_type="application/json")
+        self.assertEqual(400, result.status_code)
+        post_data = {'name': 'test_upload_file',
+                     'size': 6,
+                     'checksum': 'md5:%s' % self.md5sum_str('012345')}
+        result = self.app.post('/v1.0/tasks/1/input/uploads',
+                               data=json.dumps(post_data),
+                               content_type="application/json")
+        print("Result data: '%s'" % result.data)
+        self.assertEqual(201, result.status_code)
+        upload_url = json.loads(result.data)['_links'][0]['href']
+        result = self.app.put(upload_url,
+                              data='012',
+                              headers={'Upload-Offset': '0'},
+                              content_type='application/octet-stream')
+        print("Result data: '%s'" % result.data)
+        self.assertEqual(200, result.status_code)
+        self.assertEqual('3', result.headers['Upload-Offset'])
+        # Wrong offsets are rejected
+        result = self.app.put(upload_url,
+                              data='012',
+                              headers={'Upload-Offset': '0'},
+                              content_type='application/octet-stream')
+        self.assertEqual(409, result.status_code)
+        # Uncompleted uploads cannot be used as task inputs
+        upload_id = json.loads(result.data)['upload']
+        result = self.app.post('/v1.0/tasks/1/input',
+                               data=json.dumps({'uploads': [upload_id]}),
+                               content_type="application/json")
+        print("Result data: '%s'" % result.data)
+        self.assertEqual(409, result.status_code)
+        # Resume the upload
+        result = self.app.get(upload_url)
+        self.assertEqual(3, json.loads(result.data)['offset'])
+        result = self.app.put(upload_url,
+                              data='345',
+                              headers={'Upload-Offset': '3'},
+                              content_type='application/octet-stream')
+        self.assertEqual(200, result.status_code)
+        result = self.app.post('/v1.0/tasks/1/input',
+                               data=json.dumps({'uploads': [upload_id]}),
+                               content_type="application/json")
+        print("Result data: '%s'" % result.data)
+        uploaded_file = os.path.join(task_sandbox, 'test_upload_file')
+        with open(uploaded_file) as f:
+            self.assertEqual('012345', f.read())
+        os.remove(uploaded_file)
+        self.assertEqual(404, self.app.get(upload_url).status_code)
+
+    def test_dbobj_update_input_sandbox_files(self):
+        self.banner("Testing fgapiserverdb update_input_sandbox_files")
+        result = self.fgapisrv_db.update_input_sandbox_files(
+            1, ['file1', 'file2'], '/tmp/iosandbox')
+        state = self.fgapisrv_db.get_state()
+        print("DB state: %s" % (state,))
+        self.assertTrue(result)
+        assert state[0] is False
+
+    def test_archive_stream(self):
+        self.banner("Testing archive_stream")
+        archive_dir = '/tmp/fgapiserver_archive_test'
+        if not os.path.isdir(archive_dir):
+            os.makedirs(archive_dir)
+        archive_files = []
+        for i in range(3):
+            file_path = os.path.join(archive_dir, 'archive_file_%s' % i)
+            with open(file_path, 'w') as f:
+                f.write('archive file %s\n' % i * (i * 1000 + 1))
+            archive_files += [('%s/archive_file_%s' % (i, i),
+                               file_path,
+                               os.path.getsize(file_path)), ]
+        try:
+            archive = zipfile.ZipFile(StringIO(
+                ''.join(archive_stream(archive_files, 'zip'))))
+            self.assertIsNone(archive.testzip())
+            for arcname, file_path, _ in archive_files:
+                with open(file_path) as f:
+                    self.assertEqual(f.read(), archive.read(arcname))
+            for archive_format, mode in (('tar', 'r:'), ('tgz', 'r:gz')):
+                archive = tarfile.open(fileobj=StringIO(''.join(
+                    archive_stream(archive_files, archive_format))),
+                    mode=mode)
+                for arcname, file_path, _ in archive_files:
+                    with open(file_path) as f:
+                        self.assertEqual(f.read(),
+                                         archive.extractfile(arcname).read())
+        finally:
+            shutil.rmtree(archive_dir)
+        self.assertIsNotNone(archive_check(archive_files, 'rar'))
+        self.assertIsNotNone(archive_check(
+            [('big_file', '/tmp/big_file', 0xFFFFFFFF)], 'zip'))
+        self.assertIsNone(archive_check(
+            [('big_file', '/tmp/big_file', 0xFFFFFFFF)], 'tgz'))
+
+    def test_get_task_output_archive(self):
+        self.banner("GET /v1.0/tasks/1/output/archive")
+        archive_dir = '/tmp/fgapiserver_archive_test'
+        if not os.path.isdir(archive_dir):
+            os.makedirs(archive_dir)
+        # output_file_2 is missing and it will not be archived
+        with open(os.path.join(archive_dir, 'output_file_1'), 'w') as f:
+            f.write('output file 1')
+        try:
+            result = self.app.get('/v1.0/tasks/1/output/archive')
+            print("Result: '%s'" % result)
+            self.assertEqual(200, result.status_code)
+            archive = zipfile.ZipFile(StringIO(result.data))
+            self.assertEqual(['output_file_1'], archive.namelist())
+            self.assertEqual('output file 1', archive.read('output_file_1'))
+            result = self.app.get('/v1.0/tasks/1/output/archive?format=tgz')
+            self.assertEqual(200, result.status_code)
+            self.assertEqual('attachment; filename="task_1_output.tar.gz"',
+                             result.headers['Content-Disposition'])
+            archive = tarfile.open(fileobj=StringIO(result.data),
+                                   mode='r:gz')
+            self.assertEqual(['output_file_1'], archive.getnames())
+            result = self.app.get('/v1.0/tasks/1/output/archive?format=rar')
+            self.assertEqual(400, result.status_code)
+        finally:
+            shutil.rmtree(archive_dir)
+
+    def test_compressed_response(self):
+        self.banner("Negotiated compression and compact JSON")
+        fgapiserver_tools.fg_config['fgjson_compact'] = True
+        result = self.app.get('/v1.0/applications/1')
+        compact_data = result.data
+        self.assertTrue(len(compact_data) > 0)
+        self.assertTrue('\n' not in compact_data)
+        result = self.app.get('/v1.0/applications/1?pretty')
+        self.assertEqual(json.loads(compact_data), json.loads(result.data))
+        self.assertTrue('\n' in result.data)
+        # Responses larger than the threshold are compressed
+        minsize = fgapiserver_tools.fg_config['fgapisrv_compressminsize']
+        fgapiserver_tools.fg_config['fgapisrv_compressminsize'] = 16
+        try:
+            result = self.app.get('/v1.0/applications/1',
+                                  headers={'Accept-Encoding': 'gzip'})
+            self.assertEqual('gzip', result.headers['Content-Encoding'])
+            self.assertEqual('Accept-Encoding', result.headers['Vary'])
+            self.assertEqual(compact_data,
+                             zlib.decompress(result.data,
+                                             16 + zlib.MAX_WBITS))
+            result = self.app.get('/v1.0/applications/1',
+                                  headers={'Accept-Encoding': 'identity'})
+            self.assertTrue('Content-Encoding' not in result.headers)
+            self.assertEqual(compact_data, result.data)
+        finally:
+            fgapiserver_tools.fg_config['fgapisrv_compressminsize'] = minsize
+        result = self.app.get('/v1.0/applications/1',
+                              headers={'Accept-Encoding': 'gzip'})
+        self.assertTrue('Content-Encoding' not in result.headers)
+
     """
     APPLICATIONS
     """
@@ -763,6 +1298,34 @@ class TestfgAPIServer(unittest.TestCase):
         self.assertEqual("473edf1da15f42eaf32992a3d759e631",
                          self.md5sum_str(result.data))
 
+    def test_get_application_etag(self):
+        self.banner("GET /v1.0/applications/1 (If-None-Match)")
+        result = self.app.get('/v1.0/applications/1')
+        self.assertEqual(200, result.status_code)
+        etag = result.headers['ETag']
+        print("ETag: '%s'" % etag)
+        result = self.app.get('/v1.0/applications/1',
+                              headers={'If-None-Match': etag})
+        self.assertEqual(304, result.status_code)
+        self.assertEqual(etag, result.headers['ETag'])
+        self.assertEqual('', result.data)
+        # Compressed responses have their own tag, matching as well
+        minsize = fgapiserver_tools.fg_config['fgapisrv_compressminsize']
+        fgapiserver_tools.fg_config['fgapisrv_compressminsize'] = 16
+        try:
+            result = self.app.get('/v1.0/applications/1',
+                                  headers={'Accept-Encoding': 'gzip'})
+            self.assertEqual('gzip', result.headers['Content-Encoding'])
+            gzip_etag = result.headers['ETag']
+            self.assertEqual('%s-gzip"' % etag[:-1], gzip_etag)
+            result = self.app.get('/v1.0/applications/1',
+                                  headers={'Accept-Encoding': 'gzip',
+                                           'If-None-Match': gzip_etag})
+            self.assertEqual(304, result.status_code)
+            self.assertEqual(gzip_etag, result.headers['ETag'])
+        finally:
+            fgapiserver_tools.fg_config['fgapisrv_compressminsize'] = minsize
+
     def test_post_application(self):
         post_data = {'name': 'Test application',
                      'description': 'Test application description',
@@ -837,6 +1400,51 @@ class TestfgAPIServer(unittest.TestCase):
         self.assertEqual("cb8f131e1ec4fb565710a3b1b7d8a233",
                          self.md5sum_str(result.data))
 
+    def test_get_tasks_page(self):
+        self.banner("GET /v1.0/tasks?status=WAITING&page=1&per_page=10")
+        result = self.app.get('/v1.0/tasks?status=WAITING&page=1&per_page=10')
+        print("Result: '%s'" % result)
+        print("Result data: '%s'" % result.data)
+        print("MD5: '%s'" % self.md5sum_str(result.data))
+        self.assertEqual("efa4e9bb7fd9b17c548b09f713959637",
+                         self.md5sum_str(result.data))
+        self.assertEqual('1', result.headers['X-Total-Count'])
+
+    def test_get_tasks_after(self):
+        self.banner("GET /v1.0/tasks?after=2&per_page=1")
+        result = self.app.get('/v1.0/tasks?after=2&per_page=1')
+        print("Result: '%s'" % result)
+        print("Result data: '%s'" % result.data)
+        print("MD5: '%s'" % self.md5sum_str(result.data))
+        self.assertEqual("fcf5ce1860dbcca5c830b2c1775fd790",
+                         self.md5sum_str(result.data))
+
+    def test_get_tasks_after_first(self):
+        self.banner("GET /v1.0/tasks?after=2&per_page=1 (first link)")
+        result = self.app.get('/v1.0/tasks?after=2&per_page=1')
+        links = dict([(link['rel'], link['href'])
+                      for link in json.loads(result.data)['_links']])
+        print("First link: '%s'" % links['first'])
+        # The first page stays paged with the task cursor
+        result = self.app.get(links['first'])
+        print("Result data: '%s'" % result.data)
+        self.assertEqual(200, result.status_code)
+        response = json.loads(result.data)
+        self.assertEqual(1, len(response['tasks']))
+        links = dict([(link['rel'], link['href'])
+                      for link in response['_links']])
+        self.assertTrue(links['next'].endswith('?after=1&per_page=1'))
+
+    def test_get_tasks_wrong_paging(self):
+        self.banner("GET /v1.0/tasks?page=1&per_page=abc")
+        result = self.app.get('/v1.0/tasks?page=1&per_page=abc')
+        print("Result data: '%s'" % result.data)
+        self.assertEqual(400, result.status_code)
+        result = self.app.get('/v1.0/tasks?after=2&per_page=0')
+        self.assertEqual(400, result.status_code)
+        result = self.app.get('/v1.0/tasks?page=first&per_page=1')
+        self.assertEqual(400, result.status_code)
+
     def test_get_task(self):
         self.banner("GET /v1.0/tasks/1")
         result = self.app.get('/v1.0/tasks/1')
@@ -846,6 +1454,29 @@ class TestfgAPIServer(unittest.TestCase):
         self.assertEqual("6ab2753736658d09062ced3d7fecae6d",
                          self.md5sum_str(result.data))
 
+    def test_get_task_etag(self):
+        self.banner("GET /v1.0/tasks/1 (If-None-Match)")
+        result = self.app.get('/v1.0/tasks/1')
+        self.assertEqual(200, result.status_code)
+        etag = result.headers['ETag']
+        print("ETag: '%s'" % etag)
+        result = self.app.get('/v1.0/tasks/1',
+                              headers={'If-None-Match': etag})
+        self.assertEqual(304, result.status_code)
+        self.assertEqual(etag, result.headers['ETag'])
+        self.assertEqual('', result.data)
+        # Differently formatted responses have their own tag
+        fgapiserver_tools.fg_config['fgjson_compact'] = True
+        result = self.app.get('/v1.0/tasks/1',
+                              headers={'If-None-Match': etag})
+        self.assertEqual(200, result.status_code)
+        self.assertNotEqual(etag, result.headers['ETag'])
+        fgapiserver_tools.fg_config['fgjson_compact'] = False
+        result = self.app.get('/v1.0/tasks/1',
+                              headers={'If-None-Match': '"0123456789"'})
+        self.assertEqual(200, result.status_code)
+        self.assertEqual(etag, result.headers['ETag'])
+
     def test_post_task(self):
         post_data = {'name': 'Test task',
                      'description': 'Test application execution',
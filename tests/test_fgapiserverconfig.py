@@ -18,8 +18,11 @@
 
 import unittest
 import hashlib
+import shutil
 import os
-from fgapiserver_config import FGApiServerConfig
+from fgapiserver_config import FGApiServerConfig,\
+    get_config_snapshot,\
+    reload_config_snapshots
 
 __author__ = 'Riccardo Bruno'
 __copyright__ = '2019'
@@ -279,6 +282,11 @@ class TestfgAPIServerConfig(unittest.TestCase):
             "fgapisrv_db_host": "fgapisrv_db_host",
             "fgapisrv_db_port": cfg['fgapisrv_db_port'] * -1,
             "fgapisrv_db_user": "fgapisrv_db_user",
+            "fgapisrv_db_poolsize": cfg['fgapisrv_db_poolsize'] * -1,
+            "fgapisrv_db_poolrecycle": cfg['fgapisrv_db_poolrecycle'] * -1,
+            "fgapisrv_db_cfgpoll": cfg['fgapisrv_db_cfgpoll'] * -1,
+            "fgapisrv_db_reqtransaction":
+                not cfg['fgapisrv_db_reqtransaction'],
             # fgAPIServer
             "fgapisrv_ptvuser": "fgapisrv_ptvuser",
             "fgapisrv_crt": "fgapisrv_crt",
@@ -292,10 +300,36 @@ class TestfgAPIServerConfig(unittest.TestCase):
             "fgapiver": "fgapiver",
             "fgapisrv_key": "fgapisrv_key",
             "fgjson_indent": cfg['fgjson_indent'] * -1,
+            "fgjson_compact": not cfg['fgjson_compact'],
             "fgapisrv_notoken": not cfg['fgapisrv_notoken'],
             "fgapisrv_ptvdefusr": "fgapisrv_ptvdefusr",
             "fgapisrv_ptvpass": "fgapisrv_ptvpass",
             "fgapisrv_ptvmapfile": "fgapisrv_ptvmapfile",
+            "fgapisrv_ptvcachettl": cfg['fgapisrv_ptvcachettl'] * -1,
+            "fgapisrv_ptvnegttl": cfg['fgapisrv_ptvnegttl'] * -1,
+            "fgapisrv_ptvconntimeout": cfg['fgapisrv_ptvconntimeout'] * -1,
+            "fgapisrv_ptvreadtimeout": cfg['fgapisrv_ptvreadtimeout'] * -1,
+            "fgapisrv_ptvretries": cfg['fgapisrv_ptvretries'] * -1,
+            "fgapisrv_ptvbreaker": cfg['fgapisrv_ptvbreaker'] * -1,
+            "fgapisrv_ptvbreakerreset":
+                cfg['fgapisrv_ptvbreakerreset'] * -1,
+            "fgapisrv_tokencache_size":
+                cfg['fgapisrv_tokencache_size'] * -1,
+            "fgapisrv_tokencache_ttl": cfg['fgapisrv_tokencache_ttl'] * -1,
+            "fgapisrv_authzcache_ttl": cfg['fgapisrv_authzcache_ttl'] * -1,
+            "fgapisrv_signedtokens": not cfg['fgapisrv_signedtokens'],
+            "fgapisrv_tokenver": cfg['fgapisrv_tokenver'] * -1,
+            "fgapisrv_tokensweep_period":
+                cfg['fgapisrv_tokensweep_period'] * -1,
+            "fgapisrv_tokensweep_batch":
+                cfg['fgapisrv_tokensweep_batch'] * -1,
+            "fgapisrv_tokenretention": cfg['fgapisrv_tokenretention'] * -1,
+            "fgapisrv_xsendfile": "fgapisrv_xsendfile",
+            "fgapisrv_xaccelprefix": "fgapisrv_xaccelprefix",
+            "fgapisrv_compress": not cfg['fgapisrv_compress'],
+            "fgapisrv_compressminsize":
+                cfg['fgapisrv_compressminsize'] * -1,
+            "fgapisrv_compresslevel": cfg['fgapisrv_compresslevel'] * -1,
             "fgapisrv_notokenusr": "fgapisrv_notokenusr",
             "fgapisrv_dbver": "fgapisrv_dbver",
             "fgapisrv_debug": not cfg['fgapisrv_debug'],
@@ -349,6 +383,11 @@ class TestfgAPIServerConfig(unittest.TestCase):
             "fgapisrv_db_host": "fgapisrv_db_host",
             "fgapisrv_db_port": cfg['fgapisrv_db_port'] * -1,
             "fgapisrv_db_user": "fgapisrv_db_user",
+            "fgapisrv_db_poolsize": cfg['fgapisrv_db_poolsize'] * -1,
+            "fgapisrv_db_poolrecycle": cfg['fgapisrv_db_poolrecycle'] * -1,
+            "fgapisrv_db_cfgpoll": cfg['fgapisrv_db_cfgpoll'] * -1,
+            "fgapisrv_db_reqtransaction":
+                not cfg['fgapisrv_db_reqtransaction'],
             # fgAPIServer
             "fgapisrv_ptvuser": "fgapisrv_ptvuser",
             "fgapisrv_crt": "fgapisrv_crt",
@@ -362,10 +401,36 @@ class TestfgAPIServerConfig(unittest.TestCase):
             "fgapiver": "fgapiver",
             "fgapisrv_key": "fgapisrv_key",
             "fgjson_indent": cfg['fgjson_indent'] * -1,
+            "fgjson_compact": not cfg['fgjson_compact'],
             "fgapisrv_notoken": not cfg['fgapisrv_notoken'],
             "fgapisrv_ptvdefusr": "fgapisrv_ptvdefusr",
             "fgapisrv_ptvpass": "fgapisrv_ptvpass",
             "fgapisrv_ptvmapfile": "fgapisrv_ptvmapfile",
+            "fgapisrv_ptvcachettl": cfg['fgapisrv_ptvcachettl'] * -1,
+            "fgapisrv_ptvnegttl": cfg['fgapisrv_ptvnegttl'] * -1,
+            "fgapisrv_ptvconntimeout": cfg['fgapisrv_ptvconntimeout'] * -1,
+            "fgapisrv_ptvreadtimeout": cfg['fgapisrv_ptvreadtimeout'] * -1,
+            "fgapisrv_ptvretries": cfg['fgapisrv_ptvretries'] * -1,
+            "fgapisrv_ptvbreaker": cfg['fgapisrv_ptvbreaker'] * -1,
+            "fgapisrv_ptvbreakerreset":
+                cfg['fgapisrv_ptvbreakerreset'] * -1,
+            "fgapisrv_tokencache_size":
+                cfg['fgapisrv_tokencache_size'] * -1,
+            "fgapisrv_tokencache_ttl": cfg['fgapisrv_tokencache_ttl'] * -1,
+            "fgapisrv_authzcache_ttl": cfg['fgapisrv_authzcache_ttl'] * -1,
+            "fgapisrv_signedtokens": not cfg['fgapisrv_signedtokens'],
+            "fgapisrv_tokenver": cfg['fgapisrv_tokenver'] * -1,
+            "fgapisrv_tokensweep_period":
+                cfg['fgapisrv_tokensweep_period'] * -1,
+            "fgapisrv_tokensweep_batch":
+                cfg['fgapisrv_tokensweep_batch'] * -1,
+            "fgapisrv_tokenretention": cfg['fgapisrv_tokenretention'] * -1,
+            "fgapisrv_xsendfile": "fgapisrv_xsendfile",
+            "fgapisrv_xaccelprefix": "fgapisrv_xaccelprefix",
+            "fgapisrv_compress": not cfg['fgapisrv_compress'],
+            "fgapisrv_compressminsize":
+                cfg['fgapisrv_compressminsize'] * -1,
+            "fgapisrv_compresslevel": cfg['fgapisrv_compresslevel'] * -1,
             "fgapisrv_notokenusr": "fgapisrv_notokenusr",
             "fgapisrv_dbver": "fgapisrv_dbver",
             "fgapisrv_debug": not cfg['fgapisrv_debug'],
@@ -406,6 +471,31 @@ class TestfgAPIServerConfig(unittest.TestCase):
         for key in cfg_dict:
             del os.environ[key.upper()]
 
+    def test_ConfigSnapshot(self):
+        """
+        Test that configuration snapshots are loaded again only when the
+        configuration file changes or a reload is requested
+        :return:
+        """
+        self.banner("Config snapshot")
+        cfg_file = 'fgapiserver_snapshot.conf'
+        shutil.copy('../fgapiserver.conf', cfg_file)
+        try:
+            cfg = get_config_snapshot(cfg_file)
+            self.assertEqual(cfg_file, cfg.config_file)
+            self.assertIs(cfg, get_config_snapshot(cfg_file))
+            # File change
+            cfg_stat = os.stat(cfg_file)
+            os.utime(cfg_file, (cfg_stat.st_atime, cfg_stat.st_mtime + 10))
+            cfg_new = get_config_snapshot(cfg_file)
+            self.assertIsNot(cfg, cfg_new)
+            self.assertIs(cfg_new, get_config_snapshot(cfg_file))
+            # Reload request (SIGHUP)
+            reload_config_snapshots()
+            self.assertIsNot(cfg_new, get_config_snapshot(cfg_file))
+        finally:
+            os.remove(cfg_file)
+
 
 if __name__ == '__main__':
     print("----------------------------------\n"
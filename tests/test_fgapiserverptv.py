@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# Copyright (c) 2015:
+# Istituto Nazionale di Fisica Nucleare (INFN), Italy
+#
+# See http://www.infn.it  for details on the copyrigh holder
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import threading
+import socket
+import time
+import json
+import os
+import fgapiserver_ptv
+from werkzeug.serving import make_server
+from fgapiserverptv import FGAPIServerPTV, ptv_cache, get_ptv, get_ptv_map
+
+__author__ = 'Riccardo Bruno'
+__copyright__ = '2019'
+__license__ = 'Apache'
+__version__ = 'v0.0.10'
+__maintainer__ = 'Riccardo Bruno'
+__email__ = 'riccardo.bruno@ct.infn.it'
+__status__ = 'devel'
+__update__ = '2019-10-18 15:19:14'
+
+# Number of calls received by the stand-in portal
+portal_calls = []
+
+
+@fgapiserver_ptv.app.before_request
+def count_portal_calls():
+    portal_calls.append(time.time())
+    # Slow down the portal so that concurrent validations overlap
+    time.sleep(0.2)
+
+
+class TestFGAPIServerPTV(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Stand-in portal served by fgapiserver_ptv.py
+        cls.server = make_server('localhost', 0, fgapiserver_ptv.app,
+                                 threaded=True)
+        cls.server_thread = threading.Thread(target=cls.server.serve_forever)
+        cls.server_thread.daemon = True
+        cls.server_thread.start()
+        cls.endpoint = 'http://localhost:%s' % cls.server.server_port
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server_thread.join()
+
+    def setUp(self):
+        ptv_cache.clear()
+        del portal_calls[:]
+
+    @staticmethod
+    def banner(test_name):
+        print("\n"
+              "------------------------------------------------\n"
+              " Testing: %s\n"
+              "------------------------------------------------\n"
+              % test_name)
+
+    def ptv(self, path, **kwargs):
+        cfg = fgapiserver_ptv.fg_config
+        return FGAPIServerPTV(endpoint=self.endpoint + path,
+                              tv_user=cfg['fgapisrv_ptvuser'],
+                              tv_password=cfg['fgapisrv_ptvpass'],
+                              **kwargs)
+
+    def test_validate_token_cache(self):
+        self.banner("PTV validate_token cache")
+        ptv = self.ptv('/checktoken')
+        result = ptv.validate_token('PTV_TOKEN')
+        print("Result: %s" % result)
+        self.assertTrue(result['portal_validate'])
+        self.assertEqual(1, len(portal_calls))
+        # Cached results must not be altered by callers
+        result['portal_groups'].append('test_group')
+        cached_result = self.ptv('/checktoken').validate_token('PTV_TOKEN')
+        self.assertEqual(1, len(portal_calls))
+        self.assertNotIn('test_group', cached_result['portal_groups'])
+        self.assertEqual(fgapiserver_ptv.default_subject,
+                         cached_result['portal_subject'])
+        # Other tokens are validated by the portal
+        self.ptv('/checktoken').validate_token('PTV@TOKEN')
+        self.assertEqual(2, len(portal_calls))
+        # Results of other portals are never reused
+        result = self.ptv('/get-token').validate_token('PTV_TOKEN')
+        self.assertFalse(result['portal_validate'])
+        self.assertEqual(3, len(portal_calls))
+        # Results are not stored in the shared PTV object
+        self.assertFalse(hasattr(ptv, 'portal_validate'))
+
+    def test_validate_token_negative_cache(self):
+        self.banner("PTV validate_token negative cache")
+        # The get-token endpoint does not return any subject when it is
+        # not given, the token is then considered invalid
+        ptv = self.ptv('/get-token', negative_ttl=1)
+        self.assertFalse(ptv.validate_token('PTV_TOKEN')['portal_validate'])
+        self.assertFalse(ptv.validate_token('PTV_TOKEN')['portal_validate'])
+        self.assertEqual(1, len(portal_calls))
+        time.sleep(1.1)
+        self.assertFalse(ptv.validate_token('PTV_TOKEN')['portal_validate'])
+        self.assertEqual(2, len(portal_calls))
+
+    def test_validate_token_single_flight(self):
+        self.banner("PTV validate_token single flight")
+        results = []
+
+        def validate():
+            results.append(
+                self.ptv('/checktoken').validate_token('PTV_TOKEN'))
+
+        threads = [threading.Thread(target=validate) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(1, len(portal_calls))
+        self.assertEqual(5, len(results))
+        for result in results:
+            self.assertTrue(result['portal_validate'])
+
+    def test_get_ptv(self):
+        self.banner("PTV shared objects")
+        ptv = get_ptv(endpoint=self.endpoint + '/checktoken')
+        self.assertIs(ptv, get_ptv(endpoint=self.endpoint + '/checktoken'))
+        self.assertIsNot(ptv, get_ptv(endpoint=self.endpoint + '/get-token'))
+        # Kept alive connections are reused by subsequent calls
+        cfg = fgapiserver_ptv.fg_config
+        ptv = get_ptv(endpoint=self.endpoint + '/checktoken',
+                      tv_user=cfg['fgapisrv_ptvuser'],
+                      tv_password=cfg['fgapisrv_ptvpass'])
+        ptv.validate_token('PTV_TOKEN')
+        ptv.validate_token('PTV@TOKEN')
+        stats = ptv.get_stats()
+        print("PTV stats: %s" % stats)
+        self.assertEqual(2, stats['calls'])
+        self.assertEqual(0, stats['failures'])
+        self.assertEqual(1, stats['pools'])
+        self.assertGreater(stats['latency_avg'], 0)
+
+    def test_validate_token_timeout_retries(self):
+        self.banner("PTV validate_token timeout and retries")
+        ptv = self.ptv('/checktoken', read_timeout=0.05, retries=1, backoff=0)
+        result = ptv.validate_token('PTV_TOKEN')
+        stats = ptv.get_stats()
+        print("PTV stats: %s" % stats)
+        self.assertFalse(result['portal_validate'])
+        self.assertEqual(2, stats['calls'])
+        self.assertEqual(1, stats['retries'])
+        self.assertEqual(2, stats['failures'])
+        # Failures are not cached
+        self.assertEqual(0, ptv_cache.get_stats()['size'])
+
+    def test_validate_token_breaker(self):
+        self.banner("PTV validate_token circuit breaker")
+        # Find a closed port
+        sock = socket.socket()
+        sock.bind(('localhost', 0))
+        closed_port = sock.getsockname()[1]
+        sock.close()
+        ptv = FGAPIServerPTV(endpoint='http://localhost:%s/checktoken'
+                                      % closed_port,
+                             retries=0,
+                             breaker_failures=2,
+                             breaker_reset=0.5)
+        for i in range(3):
+            result = ptv.validate_token('PTV_TOKEN')
+            self.assertFalse(result['portal_validate'])
+        stats = ptv.get_stats()
+        print("PTV stats: %s" % stats)
+        self.assertEqual(2, stats['calls'])
+        self.assertEqual(1, stats['short_circuits'])
+        self.assertTrue(stats['breaker_open'])
+        # After the reset time a new call is allowed
+        time.sleep(0.6)
+        ptv.validate_token('PTV_TOKEN')
+        stats = ptv.get_stats()
+        self.assertEqual(3, stats['calls'])
+        self.assertEqual(1, stats['breaker_opened'])
+
+    def test_ptv_map(self):
+        self.banner("PTV user map")
+        ptvmap_file = 'fgapiserver_ptvmap_test.json'
+        with open(ptvmap_file, 'w') as ptvmap_fd:
+            ptvmap_fd.write('{"futuregateway": ["admin", "Users"],'
+                            ' "test": ["users", "Users", "test_user"],'
+                            ' "brunor": []}')
+        try:
+            ptvmap = get_ptv_map(ptvmap_file)
+            self.assertIs(ptvmap, get_ptv_map(ptvmap_file))
+            # First APIServer user in the file wins
+            self.assertEqual('futuregateway',
+                             ptvmap.map_user('', 'Users', []))
+            # Portal user has precedence over groups
+            self.assertEqual('test',
+                             ptvmap.map_user('test_user', 'admin', []))
+            # Portal group has precedence over portal groups
+            self.assertEqual('futuregateway',
+                             ptvmap.map_user('', 'admin', ['users']))
+            # Portal groups are checked in their order
+            self.assertEqual('test',
+                             ptvmap.map_user('', '', ['none', 'users',
+                                                      'admin']))
+            self.assertIsNone(ptvmap.map_user('', '', ['none']))
+            self.assertIsNone(ptvmap.map_user('', '', None))
+            # Changed map files are loaded again
+            with open(ptvmap_file, 'w') as ptvmap_fd:
+                json.dump({'test': ['admin']}, ptvmap_fd)
+            ptvmap_stat = os.stat(ptvmap_file)
+            os.utime(ptvmap_file, (ptvmap_stat.st_atime,
+                                   ptvmap_stat.st_mtime + 10))
+            ptvmap_new = get_ptv_map(ptvmap_file)
+            self.assertIsNot(ptvmap, ptvmap_new)
+            self.assertEqual('test', ptvmap_new.map_user('', 'admin', []))
+        finally:
+            os.remove(ptvmap_file)
+
+
+if __name__ == '__main__':
+    print("----------------------------------\n"
+          "Starting unit tests ...\n"
+          "----------------------------------\n")
+    unittest.main(failfast=True)
+    print("Tests completed")
@@ -20,6 +20,7 @@
 
 import unittest
 import fgapiserver
+import fgapiserver_tools
 import hashlib
 import json
 import os
@@ -49,6 +50,8 @@ class TestUsersAPIs(unittest.TestCase):
         self.app = app.test_client()
         self.app.testing = True
         self.app.debug = True
+        # Expected results are readable JSON outputs
+        fgapiserver_tools.fg_config['fgjson_compact'] = False
 
     @staticmethod
     def banner(test_name):
@@ -267,6 +270,38 @@ class TestUsersAPIs(unittest.TestCase):
         self.assertEqual("30661885dc0cdeb44de575468597f446",
                          self.md5sum_str(result.data))
 
+    def test_get_user_tasks(self):
+        self.banner("GET /v1.0/users/test/tasks")
+        headers = {
+            'Authorization': 'TEST_ACCESS_TOKEN',
+        }
+        url = '/v1.0/users/test/tasks'
+        result = self.app.get(url,
+                              headers=headers)
+        print(result.data)
+        self.assertEqual(200, result.status_code)
+        tasks = json.loads(result.data)['tasks']
+        self.assertEqual([u'1'], [task['id'] for task in tasks])
+
+    def test_get_user_tasks_after(self):
+        self.banner("GET /v1.0/users/test/tasks?after=2&per_page=1")
+        headers = {
+            'Authorization': 'TEST_ACCESS_TOKEN',
+        }
+        url = '/v1.0/users/test/tasks?after=2&per_page=1'
+        result = self.app.get(url,
+                              headers=headers)
+        print(result.data)
+        self.assertEqual(200, result.status_code)
+        response = json.loads(result.data)
+        self.assertEqual([u'1'], [task['id'] for task in response['tasks']])
+        self.assertEqual(['first', 'self'],
+                         [link['rel'] for link in response['_links']])
+        url = '/v1.0/users/test/tasks?per_page=abc'
+        result = self.app.get(url,
+                              headers=headers)
+        self.assertEqual(400, result.status_code)
+
     def test_post_user_groups(self):
         self.banner("POST /v1.0/users/test/groups")
         headers = {
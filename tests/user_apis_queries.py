@@ -278,6 +278,19 @@ user_apis_queries = [
                  'TEST_DATA_TYPE',
                  '01-01-1970',
                  '01-01-1970'], ]},
+    {'id': 22,
+     'query': 'select t.id\n'
+              'from task t,\n'
+              '     fg_user u,\n'
+              '     application a\n'
+              'where u.id=%s\n'
+              '  and t.status != \'PURGED\'\n'
+              '  and t.user=u.name\n'
+              '  and t.app_id=a.id\n'
+              '  and t.id < %s\n'
+              'order by t.id desc\n'
+              'limit %s;',
+     'result': [[1, ], ]},
 ]
 
 # user_apis tests queries